@@ -0,0 +1,89 @@
+"""Benchmark: requisições avulsas vs sessão keep-alive com pool.
+
+Sobe um servidor HTTP local que imita a API do TMDb e mede a latência por
+chamada usando `requests.get` (conexão nova a cada chamada, como era antes)
+e a sessão do `SessionHolder` usada pelos serviços de catálogo.
+
+Localmente só entra no custo o handshake TCP; contra api.themoviedb.org e
+api.igdb.com a diferença é maior porque cada conexão nova também paga o
+handshake TLS.
+
+Uso:
+    python benchmarks/bench_http_sessions.py [--calls 500]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.http_client import SessionHolder  # noqa: E402
+
+PAYLOAD = json.dumps({
+    'results': [{'id': i, 'title': f'Filme {i}', 'vote_average': 7.5} for i in range(20)]
+}).encode('utf-8')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Evita o atraso de ~40ms do Nagle + delayed ACK em conexões keep-alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(label, call, calls):
+    # Aquecimento
+    for _ in range(5):
+        call()
+
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    p50 = statistics.median(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{label:<28} média {statistics.mean(samples):7.3f} ms   p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+    return statistics.mean(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/3/movie/popular"
+
+    holder = SessionHolder()
+
+    try:
+        before = measure('requests.get (sem pool)', lambda: requests.get(url, timeout=10).json(), args.calls)
+        after = measure('SessionHolder (keep-alive)', lambda: holder.get().get(url, timeout=holder.timeout).json(), args.calls)
+        print(f"\nRedução de latência por chamada: {(1 - after / before) * 100:.1f}%")
+    finally:
+        holder.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
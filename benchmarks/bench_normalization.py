@@ -0,0 +1,174 @@
+"""Benchmark: normalização item a item (dicts) vs em lote (CatalogRecord).
+
+Gera respostas sintéticas do TMDb e do IGDB com N itens e compara a
+implementação anterior (um dict por item, tabela de gêneros recriada a cada
+item, import de datetime dentro do laço) com `normalize_tmdb_results` e
+`normalize_igdb_results`. Mede o tempo de CPU da normalização, o pico de
+alocação durante ela e a memória retida pelos resultados (tracemalloc), além
+do tempo de serialização em JSON.
+
+Uso:
+    python benchmarks/bench_normalization.py [--items 10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.igdb_service import normalize_igdb_results  # noqa: E402
+from src.services.records import CatalogRecord  # noqa: E402
+from src.services.tmdb_service import MOVIE_GENRE_IDS, normalize_tmdb_results  # noqa: E402
+
+IMAGE_BASE_URL = 'https://image.tmdb.org/t/p/w500'
+
+def tmdb_payload(items):
+    genre_ids = list(MOVIE_GENRE_IDS.values())
+    rng = random.Random(1)
+    return [{
+        'id': i,
+        'title': f'Filme {i}',
+        'overview': 'Sinopse do filme. ' * 5,
+        'release_date': '2020-01-01',
+        'poster_path': f'/poster{i}.jpg',
+        'vote_average': rng.uniform(0, 10),
+        'genre_ids': rng.sample(genre_ids, rng.randint(1, 3))
+    } for i in range(items)]
+
+def igdb_payload(items):
+    genres = ['Adventure', 'Shooter', 'Role-playing (RPG)', 'Indie', 'Simulator']
+    platforms = ['PC (Microsoft Windows)', 'PlayStation 4', 'PlayStation 5', 'Xbox One',
+                 'Xbox Series X|S', 'Nintendo Switch', 'Android']
+    rng = random.Random(2)
+    return [{
+        'id': i,
+        'name': f'Jogo {i}',
+        'summary': 'Resumo do jogo. ' * 5,
+        'first_release_date': 1289779200 + i * 3600,
+        'cover': {'url': f'//images.igdb.com/igdb/image/upload/t_thumb/co{i}.jpg'},
+        'rating': rng.uniform(50, 100),
+        'genres': [{'name': name} for name in rng.sample(genres, 2)],
+        'platforms': [{'name': name} for name in rng.sample(platforms, 6)]
+    } for i in range(items)]
+
+# Implementação anterior, mantida aqui apenas como referência de comparação
+
+def legacy_genre_names(genre_ids, media_type):
+    movie_genres = {
+        28: 'Action', 12: 'Adventure', 16: 'Animation', 35: 'Comedy',
+        80: 'Crime', 99: 'Documentary', 18: 'Drama', 10751: 'Family',
+        14: 'Fantasy', 36: 'History', 27: 'Horror', 10402: 'Music',
+        9648: 'Mystery', 10749: 'Romance', 878: 'Science Fiction',
+        10770: 'TV Movie', 53: 'Thriller', 10752: 'War', 37: 'Western'
+    }
+    tv_genres = {
+        10759: 'Action & Adventure', 16: 'Animation', 35: 'Comedy',
+        80: 'Crime', 99: 'Documentary', 18: 'Drama', 10751: 'Family',
+        10762: 'Kids', 9648: 'Mystery', 10763: 'News', 10764: 'Reality',
+        10765: 'Sci-Fi & Fantasy', 10766: 'Soap', 10767: 'Talk',
+        10768: 'War & Politics', 37: 'Western'
+    }
+    genre_map = movie_genres if media_type == 'movie' else tv_genres
+    return [genre_map.get(genre_id, 'Unknown') for genre_id in genre_ids if genre_id in genre_map]
+
+def legacy_tmdb(results):
+    movies = []
+    for movie in results:
+        movies.append({
+            'id': movie['id'],
+            'type': 'movie',
+            'title': movie['title'],
+            'overview': movie.get('overview', ''),
+            'release_date': movie.get('release_date', ''),
+            'poster_url': f"{IMAGE_BASE_URL}{movie['poster_path']}" if movie.get('poster_path') else None,
+            'rating': round(movie.get('vote_average', 0), 1),
+            'genres': legacy_genre_names(movie.get('genre_ids', []), 'movie')
+        })
+    return movies
+
+def legacy_igdb(data):
+    games = []
+    for game in data:
+        release_date = ''
+        if game.get('first_release_date'):
+            from datetime import datetime
+            release_date = datetime.fromtimestamp(game['first_release_date']).strftime('%Y-%m-%d')
+        cover_url = None
+        if game.get('cover') and game['cover'].get('url'):
+            cover_url = f"https:{game['cover']['url'].replace('t_thumb', 't_cover_big')}"
+        genres = []
+        if game.get('genres'):
+            genres = [genre['name'] for genre in game['genres']]
+        platforms = []
+        if game.get('platforms'):
+            platforms = [platform['name'] for platform in game['platforms'][:5]]
+        games.append({
+            'id': game['id'],
+            'type': 'game',
+            'title': game['name'],
+            'overview': game.get('summary', ''),
+            'release_date': release_date,
+            'poster_url': cover_url,
+            'rating': round(game.get('rating', 0) / 10, 1) if game.get('rating') else 0,
+            'genres': genres,
+            'platforms': platforms
+        })
+    return games
+
+def json_default(o):
+    if isinstance(o, CatalogRecord):
+        return o.to_dict()
+    raise TypeError(type(o))
+
+def measure(label, normalize, payload, repeat):
+    cpu_times = []
+    for _ in range(repeat):
+        start = time.process_time()
+        normalize(payload)
+        cpu_times.append(time.process_time() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = normalize(payload)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    json.dumps(result, default=json_default)
+    serialize = time.perf_counter() - start
+
+    print(f'{label:<28} cpu {min(cpu_times) * 1000:8.2f}ms   '
+          f'pico {(peak - before) / 1024:9.1f}KiB   '
+          f'retido {(retained - before) / 1024:9.1f}KiB   '
+          f'json {serialize * 1000:7.2f}ms')
+    return min(cpu_times), peak - before
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmdb = tmdb_payload(args.items)
+    igdb = igdb_payload(args.items)
+
+    # Aquecimento (tabelas de gêneros compartilhadas, imports)
+    normalize_tmdb_results(tmdb[:100], 'movie', IMAGE_BASE_URL)
+    normalize_igdb_results(igdb[:100])
+
+    print(f'{args.items} itens por resposta, melhor de {args.repeat} execuções\n')
+    for provider, legacy, batch, payload in (
+        ('TMDb', legacy_tmdb, lambda data: normalize_tmdb_results(data, 'movie', IMAGE_BASE_URL), tmdb),
+        ('IGDB', legacy_igdb, normalize_igdb_results, igdb),
+    ):
+        legacy_cpu, legacy_peak = measure(f'{provider} item a item (dict)', legacy, payload, args.repeat)
+        batch_cpu, batch_peak = measure(f'{provider} em lote (registro)', batch, payload, args.repeat)
+        print(f'{"":<28} CPU -{(1 - batch_cpu / legacy_cpu) * 100:.0f}%   '
+              f'alocação -{(1 - batch_peak / legacy_peak) * 100:.0f}%\n')
+
+if __name__ == '__main__':
+    main()
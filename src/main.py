@@ -4,10 +4,14 @@ from flask_cors import CORS
 from sqlalchemy import text
 from datetime import timedelta
 from src.extensions import db, jwt
+from src.services.records import CatalogJSONProvider
 
 def create_app():
     app = Flask(__name__)
     
+    # JSON que serializa os registros de catálogo (CatalogRecord) diretamente
+    app.json = CatalogJSONProvider(app)
+    
     # Configurações básicas
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-myverse-2024')
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-key-myverse-2024')
@@ -28,17 +32,20 @@ def create_app():
         f"{os.environ.get('DB_NAME', 'postgres')}?sslmode=require"
     
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-        'pool_timeout': 20,
-        'pool_size': 5,
-        'max_overflow': 10,
-        'connect_args': {
-            'sslmode': 'require',
-            'connect_timeout': 30
+    
+    # Opções de pool/SSL valem só para o PostgreSQL (SQLite é usado em testes locais)
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_pre_ping': True,
+            'pool_recycle': 300,
+            'pool_timeout': 20,
+            'pool_size': 5,
+            'max_overflow': 10,
+            'connect_args': {
+                'sslmode': 'require',
+                'connect_timeout': 30
+            }
         }
-    }
 
     # Configuração CORS (mantida igual)
     CORS(app, resources={
@@ -62,6 +69,24 @@ def create_app():
     # Inicialização ÚNICA das extensões
     db.init_app(app)
     jwt.init_app(app)
+    
+    from src.services.catalog_service import catalog_service
+    catalog_service.init_app(app)
+    
+    from src.services.recommendation_service import recommendation_service
+    recommendation_service.init_app(app)
+    
+    from src.services.taste_index import taste_index
+    taste_index.init_app(app)
+    
+    from src.services.item_similarity import item_similarity_command
+    app.cli.add_command(item_similarity_command)
+    from src.services.user_counters import counters_reconcile_command
+    app.cli.add_command(counters_reconcile_command)
+    from src.services.forum_ranking import forum_decay_command
+    app.cli.add_command(forum_decay_command)
+    from src.services.activity_rollup import activity_repair_command
+    app.cli.add_command(activity_repair_command)
 
     # Registrar blueprints
     from src.routes.auth import auth_bp
@@ -161,6 +186,15 @@ def create_app():
             print("✅ Tabelas criadas com sucesso!")
         except Exception as e:
             print(f"❌ Erro ao criar tabelas: {e}")
+        
+        # Aplicar migrações pendentes (índices, colunas novas e backfills)
+        try:
+            from src.models.migrations import run_migrations
+            executed = run_migrations()
+            if executed:
+                print(f"✅ Migrações aplicadas: {', '.join(executed)}")
+        except Exception as e:
+            print(f"❌ Erro ao aplicar migrações: {e}")
     
     return app
 
@@ -88,9 +88,19 @@ class Favorite(db.Model):
     release_date = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Gêneros normalizados (uma linha por gênero), usados nas agregações
+    genre_rows = db.relationship('FavoriteGenre', backref='favorite', lazy=True, cascade='all, delete-orphan')
+    
     # Índice único para evitar duplicatas
     __table_args__ = (db.UniqueConstraint('user_id', 'content_type', 'content_id'),)
     
+    def set_genres(self, genres):
+        """Gravar os gêneros no JSON e na tabela favorite_genres"""
+        genres = genres or []
+        self.genres = json.dumps(genres)
+        names = dict.fromkeys(genre[:100] for genre in genres if isinstance(genre, str) and genre)
+        self.genre_rows = [FavoriteGenre(user_id=self.user_id, genre=genre) for genre in names]
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -105,6 +115,30 @@ class Favorite(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class FavoriteGenre(db.Model):
+    __tablename__ = 'favorite_genres'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    favorite_id = db.Column(db.Integer, db.ForeignKey('favorites.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Copiado do favorito para agrupar por usuário
+    genre = db.Column(db.String(100), nullable=False)
+    
+    # Contagem de gêneros por usuário direto do índice
+    __table_args__ = (db.Index('ix_favorite_genres_user_genre', 'user_id', 'genre'),)
+
+# Tamanho máximo do resumo (excerpt) dos posts mostrado nas listagens
+EXCERPT_LENGTH = 280
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    """Resumo do conteúdo: espaços normalizados e corte no fim de uma palavra"""
+    text = ' '.join((content or '').split())
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut.rstrip(' .,;:!?') + '…'
+
 class ForumPost(db.Model):
     __tablename__ = 'forum_posts'
     
@@ -116,25 +150,52 @@ class ForumPost(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    reply_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # Replies ativos
+    last_reply_at = db.Column(db.DateTime)  # Data do reply ativo mais recente
+    hot_score = db.Column(db.Float, default=0, server_default='0', nullable=False)  # Ordenação "hot"
+    trending_score = db.Column(db.Float, default=0, server_default='0', nullable=False)  # Atividade com decaimento
+    trending_updated_at = db.Column(db.DateTime)  # Momento em que o trending_score foi medido
+    excerpt = db.Column(db.String(EXCERPT_LENGTH), nullable=False, default='', server_default='')  # Resumo do content
+    
+    # Campos aceitos em to_dict(fields=...)
+    FIELDS = ('id', 'title', 'content', 'excerpt', 'category', 'author', 'created_at', 'updated_at',
+              'replies_count', 'last_reply_at', 'is_active')
     
     # Relacionamentos
     replies = db.relationship('ForumReply', backref='post', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        return {
+    def set_content(self, content):
+        """Gravar o conteúdo e o resumo usado nas listagens"""
+        self.content = content
+        self.excerpt = make_excerpt(content)
+    
+    def to_dict(self, fields=None):
+        """Dicionário do post; `fields` restringe aos campos pedidos.
+        
+        content e author só são lidos quando pedidos, então listagens que os
+        deixam fora (com a coluna adiada na query) não os carregam do banco.
+        """
+        data = {
             'id': self.id,
             'title': self.title,
-            'content': self.content,
+            'excerpt': self.excerpt,
             'category': self.category,
-            'author': {
-                'id': self.author.id,
-                'username': self.author.username
-            } if self.author else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'replies_count': len(self.replies),
+            'replies_count': self.reply_count or 0,
+            'last_reply_at': self.last_reply_at.isoformat() if self.last_reply_at else None,
             'is_active': self.is_active
         }
+        if fields is None or 'content' in fields:
+            data['content'] = self.content
+        if fields is None or 'author' in fields:
+            data['author'] = {
+                'id': self.author.id,
+                'username': self.author.username
+            } if self.author else None
+        if fields is None:
+            return data
+        return {field: data[field] for field in fields}
 
 class ForumReply(db.Model):
     __tablename__ = 'forum_replies'
@@ -190,3 +251,110 @@ class Friendship(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class CatalogItem(db.Model):
+    __tablename__ = 'catalog_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content_type = db.Column(db.String(20), nullable=False)  # 'movie', 'tv', 'game'
+    content_id = db.Column(db.String(50), nullable=False)  # ID do TMDb/IGDB
+    title = db.Column(db.String(255), nullable=False)
+    search_title = db.Column(db.String(255), nullable=False)  # Título normalizado (sem acentos, minúsculo)
+    overview = db.Column(db.Text)
+    poster_url = db.Column(db.Text)
+    rating = db.Column(db.Float)
+    genres = db.Column(db.Text)  # JSON string
+    platforms = db.Column(db.Text)  # JSON string (apenas jogos)
+    release_date = db.Column(db.String(20))
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow)  # Última vez que veio do TMDb/IGDB
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Índice único para evitar duplicatas
+    __table_args__ = (db.UniqueConstraint('content_type', 'content_id'),)
+    
+    def to_dict(self):
+        data = {
+            'id': int(self.content_id) if self.content_id.isdigit() else self.content_id,
+            'type': self.content_type,
+            'title': self.title,
+            'overview': self.overview or '',
+            'release_date': self.release_date or '',
+            'poster_url': self.poster_url,
+            'rating': self.rating or 0,
+            'genres': json.loads(self.genres) if self.genres else []
+        }
+        if self.content_type == 'game':
+            data['platforms'] = json.loads(self.platforms) if self.platforms else []
+        return data
+
+class UserRecommendation(db.Model):
+    __tablename__ = 'user_recommendations'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    payload = db.Column(db.Text, nullable=False)  # JSON com recomendações, base e gêneros
+    genre_signature = db.Column(db.String(40))  # Hash dos gêneros favoritos usados no cálculo
+    dirty = db.Column(db.Boolean, default=False, nullable=False)  # Favoritos mudaram desde o cálculo
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        data = json.loads(self.payload)
+        data['computed_at'] = self.computed_at.isoformat() if self.computed_at else None
+        return data
+
+class ItemNeighbors(db.Model):
+    __tablename__ = 'item_neighbors'
+    
+    content_type = db.Column(db.String(20), primary_key=True)  # 'movie', 'tv', 'game'
+    content_id = db.Column(db.String(50), primary_key=True)  # ID do TMDb/IGDB
+    neighbors = db.Column(db.Text, nullable=False)  # JSON: itens similares com score, em ordem
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'content_type': self.content_type,
+            'content_id': self.content_id,
+            'neighbors': json.loads(self.neighbors),
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+
+class UserCounters(db.Model):
+    __tablename__ = 'user_counters'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    favorites_movies = db.Column(db.Integer, default=0, nullable=False)
+    favorites_tv = db.Column(db.Integer, default=0, nullable=False)
+    favorites_games = db.Column(db.Integer, default=0, nullable=False)
+    posts = db.Column(db.Integer, default=0, nullable=False)  # Posts ativos no fórum
+    friends = db.Column(db.Integer, default=0, nullable=False)  # Amizades aceitas
+    pending_requests = db.Column(db.Integer, default=0, nullable=False)  # Solicitações recebidas pendentes
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    @property
+    def favorites(self):
+        return self.favorites_movies + self.favorites_tv + self.favorites_games
+    
+    def favorites_by_type(self):
+        return {
+            'movies': self.favorites_movies,
+            'tv': self.favorites_tv,
+            'games': self.favorites_games
+        }
+    
+    def to_dict(self):
+        return {
+            'favorites': self.favorites,
+            'favorites_by_type': self.favorites_by_type(),
+            'posts': self.posts,
+            'friends': self.friends,
+            'pending_requests': self.pending_requests
+        }
+
+class UserActivityDaily(db.Model):
+    __tablename__ = 'user_activity_daily'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # Dia em UTC
+    favorites_added = db.Column(db.Integer, default=0, nullable=False)
+    favorites_removed = db.Column(db.Integer, default=0, nullable=False)
+    posts = db.Column(db.Integer, default=0, nullable=False)  # Posts criados
+    replies = db.Column(db.Integer, default=0, nullable=False)  # Respostas criadas
+    friendships_accepted = db.Column(db.Integer, default=0, nullable=False)
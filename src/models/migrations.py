@@ -0,0 +1,262 @@
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, inspect, text
+from src.extensions import db
+
+# Migrações registradas, na ordem em que devem ser aplicadas.
+# O projeto cria as tabelas com db.create_all(); aqui ficam apenas os passos
+# que o create_all não cobre (índices específicos do banco, colunas novas em
+# tabelas existentes e backfills). Cada passo roda uma única vez.
+MIGRATIONS = []
+
+def migration(name):
+    """Registrar uma função como migração"""
+    def decorator(fn):
+        MIGRATIONS.append((name, fn))
+        return fn
+    return decorator
+
+def dialect_name():
+    """Nome do dialeto do banco atual ('postgresql', 'sqlite', ...)"""
+    return db.engine.dialect.name
+
+def run_migrations():
+    """Aplicar as migrações pendentes, cada uma em sua própria transação"""
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'name VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)'
+        ))
+        applied = {row[0] for row in conn.execute(text('SELECT name FROM schema_migrations'))}
+
+    executed = []
+    for name, fn in MIGRATIONS:
+        if name in applied:
+            continue
+
+        with db.engine.begin() as conn:
+            fn(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (name, applied_at) VALUES (:name, :applied_at)'),
+                {'name': name, 'applied_at': datetime.utcnow()}
+            )
+        executed.append(name)
+
+    return executed
+
+@migration('0001_catalog_items_search_index')
+def create_catalog_search_index(conn):
+    """Índice de busca textual e por prefixo do catálogo local"""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_catalog_items_search "
+            "ON catalog_items USING GIN (to_tsvector('simple', search_title))"
+        ))
+    elif conn.dialect.name == 'sqlite':
+        # FTS5 com conteúdo externo, sincronizado por triggers
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_items_fts USING fts5("
+            "search_title, content='catalog_items', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS catalog_items_fts_ai AFTER INSERT ON catalog_items BEGIN "
+            "INSERT INTO catalog_items_fts (rowid, search_title) VALUES (new.id, new.search_title); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS catalog_items_fts_ad AFTER DELETE ON catalog_items BEGIN "
+            "INSERT INTO catalog_items_fts (catalog_items_fts, rowid, search_title) "
+            "VALUES ('delete', old.id, old.search_title); END"
+        ))
+        conn.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS catalog_items_fts_au AFTER UPDATE ON catalog_items BEGIN "
+            "INSERT INTO catalog_items_fts (catalog_items_fts, rowid, search_title) "
+            "VALUES ('delete', old.id, old.search_title); "
+            "INSERT INTO catalog_items_fts (rowid, search_title) VALUES (new.id, new.search_title); END"
+        ))
+        conn.execute(text("INSERT INTO catalog_items_fts (catalog_items_fts) VALUES ('rebuild')"))
+
+@migration('0002_friendships_graph_indexes')
+def create_friendship_graph_indexes(conn):
+    """Índices para percorrer amizades aceitas a partir de cada lado"""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_friendships_requester_status "
+        "ON friendships (requester_id, status, requested_id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_friendships_requested_status "
+        "ON friendships (requested_id, status, requester_id)"
+    ))
+
+@migration('0003_favorite_genres_backfill')
+def backfill_favorite_genres(conn):
+    """Preencher favorite_genres a partir da coluna JSON dos favoritos existentes"""
+    from src.services.favorite_genres import parse_genres
+
+    conn.execute(text('DELETE FROM favorite_genres'))
+    last_id = 0
+    while True:
+        favorites = conn.execute(
+            text('SELECT id, user_id, genres FROM favorites WHERE id > :last_id ORDER BY id LIMIT 5000'),
+            {'last_id': last_id}
+        ).fetchall()
+        if not favorites:
+            break
+
+        rows = [
+            {'favorite_id': favorite_id, 'user_id': user_id, 'genre': genre}
+            for favorite_id, user_id, genres in favorites
+            for genre in parse_genres(genres)
+        ]
+        if rows:
+            conn.execute(
+                text('INSERT INTO favorite_genres (favorite_id, user_id, genre) VALUES (:favorite_id, :user_id, :genre)'),
+                rows
+            )
+        last_id = favorites[-1][0]
+
+@migration('0004_user_activity_daily_backfill')
+def backfill_user_activity_daily(conn):
+    """Preencher a atividade diária por usuário a partir do histórico"""
+    from src.services.activity_rollup import backfill
+
+    backfill(conn)
+
+@migration('0005_forum_posts_reply_counts')
+def add_forum_post_reply_counts(conn):
+    """Colunas reply_count e last_reply_at nos posts, preenchidas a partir dos replies ativos"""
+    columns = {column['name'] for column in inspect(conn).get_columns('forum_posts')}
+    if 'reply_count' not in columns:
+        conn.execute(text('ALTER TABLE forum_posts ADD COLUMN reply_count INTEGER NOT NULL DEFAULT 0'))
+    if 'last_reply_at' not in columns:
+        conn.execute(text('ALTER TABLE forum_posts ADD COLUMN last_reply_at TIMESTAMP'))
+
+    conn.execute(text(
+        "UPDATE forum_posts SET "
+        "reply_count = (SELECT COUNT(*) FROM forum_replies r "
+        "WHERE r.post_id = forum_posts.id AND r.is_active = :active), "
+        "last_reply_at = (SELECT MAX(r.created_at) FROM forum_replies r "
+        "WHERE r.post_id = forum_posts.id AND r.is_active = :active)"
+    ), {'active': True})
+
+@migration('0006_forum_posts_listing_indexes')
+def create_forum_listing_indexes(conn):
+    """Índices da listagem do fórum por cursor (com e sem filtro de categoria)"""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_forum_posts_listing "
+        "ON forum_posts (is_active, category, created_at DESC, id DESC)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_forum_posts_active_created "
+        "ON forum_posts (is_active, created_at DESC, id DESC)"
+    ))
+
+@migration('0007_forum_search_index')
+def create_forum_search_index(conn):
+    """Índice de busca textual de posts e replies do fórum"""
+    if conn.dialect.name == 'postgresql':
+        from src.services.forum_search import _POST_VECTOR, _REPLY_VECTOR
+
+        conn.execute(text("ALTER TABLE forum_posts ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+        conn.execute(text("ALTER TABLE forum_replies ADD COLUMN IF NOT EXISTS search_vector tsvector"))
+        conn.execute(text(f"UPDATE forum_posts SET search_vector = {_POST_VECTOR}"))
+        conn.execute(text(f"UPDATE forum_replies SET search_vector = {_REPLY_VECTOR}"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_forum_posts_search ON forum_posts USING GIN (search_vector)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_forum_replies_search ON forum_replies USING GIN (search_vector)"
+        ))
+    elif conn.dialect.name == 'sqlite':
+        # Uma tabela FTS5 para posts (rowid = id * 2) e replies (rowid = id * 2 + 1)
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS forum_search_fts USING fts5("
+            "title, content, tokenize='unicode61 remove_diacritics 2')"
+        ))
+        conn.execute(text("DELETE FROM forum_search_fts"))
+        conn.execute(text(
+            "INSERT INTO forum_search_fts (rowid, title, content) SELECT id * 2, title, content FROM forum_posts"
+        ))
+        conn.execute(text(
+            "INSERT INTO forum_search_fts (rowid, title, content) SELECT id * 2 + 1, '', content FROM forum_replies"
+        ))
+
+@migration('0008_forum_replies_thread_index')
+def create_forum_replies_thread_index(conn):
+    """Índice das janelas de replies de uma thread, em ordem cronológica"""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_forum_replies_thread "
+        "ON forum_replies (post_id, is_active, created_at, id)"
+    ))
+
+@migration('0009_forum_posts_rankings')
+def add_forum_post_rankings(conn):
+    """Scores hot/trending dos posts, preenchidos a partir dos replies, e seus índices"""
+    from src.services.forum_ranking import POST_WEIGHT, REPLY_WEIGHT, TRENDING_HALF_LIFE, decayed, hot_score
+
+    columns = {column['name'] for column in inspect(conn).get_columns('forum_posts')}
+    if 'hot_score' not in columns:
+        conn.execute(text('ALTER TABLE forum_posts ADD COLUMN hot_score FLOAT NOT NULL DEFAULT 0'))
+    if 'trending_score' not in columns:
+        conn.execute(text('ALTER TABLE forum_posts ADD COLUMN trending_score FLOAT NOT NULL DEFAULT 0'))
+    if 'trending_updated_at' not in columns:
+        conn.execute(text('ALTER TABLE forum_posts ADD COLUMN trending_updated_at TIMESTAMP'))
+
+    # Trending: criação do post e replies ainda relevantes (10 meias-vidas)
+    now = datetime.utcnow()
+    since = now - timedelta(seconds=10 * TRENDING_HALF_LIFE)
+    trending = {}
+    for post_id, created_at in conn.execute(text(
+        'SELECT post_id, created_at FROM forum_replies WHERE is_active = :active AND created_at >= :since'
+    ), {'active': True, 'since': since}):
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        trending[post_id] = trending.get(post_id, 0.0) + decayed(REPLY_WEIGHT, created_at, now)
+
+    updates = []
+    for post_id, reply_count, created_at in conn.execute(text(
+        'SELECT id, reply_count, created_at FROM forum_posts'
+    )):
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        updates.append({
+            'post_id': post_id,
+            'hot': hot_score(reply_count, created_at),
+            'trending': trending.get(post_id, 0.0) + decayed(POST_WEIGHT, created_at, now),
+            'now': now
+        })
+    if updates:
+        conn.execute(text(
+            'UPDATE forum_posts SET hot_score = :hot, trending_score = :trending, trending_updated_at = :now '
+            'WHERE id = :post_id'
+        ).bindparams(bindparam('now', type_=db.DateTime)), updates)
+
+    for name, columns in (
+        ('ix_forum_posts_hot', 'is_active, hot_score DESC, id DESC'),
+        ('ix_forum_posts_category_hot', 'is_active, category, hot_score DESC, id DESC'),
+        ('ix_forum_posts_trending', 'is_active, trending_score DESC, id DESC'),
+        ('ix_forum_posts_category_trending', 'is_active, category, trending_score DESC, id DESC')
+    ):
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON forum_posts ({columns})'))
+
+@migration('0010_forum_posts_excerpt')
+def add_forum_post_excerpt(conn):
+    """Coluna excerpt (resumo usado nas listagens), preenchida a partir do content"""
+    from src.models.database import EXCERPT_LENGTH, make_excerpt
+
+    columns = {column['name'] for column in inspect(conn).get_columns('forum_posts')}
+    if 'excerpt' not in columns:
+        conn.execute(text(f"ALTER TABLE forum_posts ADD COLUMN excerpt VARCHAR({EXCERPT_LENGTH}) NOT NULL DEFAULT ''"))
+
+    # Em lotes por id, para não trazer todos os conteúdos de uma vez
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            'SELECT id, content FROM forum_posts WHERE id > :last_id ORDER BY id LIMIT 1000'
+        ), {'last_id': last_id}).fetchall()
+        if not rows:
+            break
+        conn.execute(
+            text('UPDATE forum_posts SET excerpt = :excerpt WHERE id = :post_id'),
+            [{'post_id': post_id, 'excerpt': make_excerpt(content)} for post_id, content in rows]
+        )
+        last_id = rows[-1][0]
@@ -1,10 +1,24 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.database import User, Favorite
 from src.extensions import db
 from src.services.tmdb_service import TMDbService
 from src.services.igdb_service import IGDBService
-import json
+from src.services.cache import response_cache
+from src.services.singleflight import catalog_flight
+from src.services.catalog_service import catalog_service
+from src.services.list_store import catalog_lists
+from src.services.autocomplete import title_index
+from src.services.recommendation_service import recommendation_service
+from src.services.item_similarity import neighbors_for
+from src.services.taste_index import taste_index
+from src.services import activity_rollup, user_counters
+from src.services.rate_limiter import limiter_stats
+from src.services.circuit_breaker import breaker_stats
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed, wait
+import hmac
+import time
+import os
 
 content_bp = Blueprint('content', __name__)
 
@@ -12,6 +26,66 @@ content_bp = Blueprint('content', __name__)
 tmdb_service = TMDbService()
 igdb_service = IGDBService()
 
+# Resultados das APIs alimentam o catálogo local
+tmdb_service.add_result_listener(catalog_service.record)
+igdb_service.add_result_listener(catalog_service.record)
+
+# ... e o índice de autocomplete do worker
+tmdb_service.add_result_listener(title_index.add_items)
+igdb_service.add_result_listener(title_index.add_items)
+
+# Prazo total (em segundos) para a busca nos provedores externos
+SEARCH_DEADLINE_SECONDS = float(os.environ.get('SEARCH_DEADLINE_SECONDS', '4'))
+
+# Token exigido (header X-Metrics-Token) para ler /metrics; sem ele a rota fica desativada
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Provedores consultados na busca, executados em paralelo
+SEARCH_PROVIDERS = {
+    'tmdb_movies': tmdb_service.search_movies,
+    'tmdb_tv': tmdb_service.search_tv_shows,
+    'igdb_games': igdb_service.search_games
+}
+
+# As threads só são criadas no primeiro uso, ou seja, depois do fork do gunicorn.
+# Há folga para provedores lentos que continuam rodando após o prazo.
+search_executor = ThreadPoolExecutor(
+    max_workers=len(SEARCH_PROVIDERS) * 4,
+    thread_name_prefix='search-provider'
+)
+
+def _submit_providers(query):
+    """Disparar a busca em todos os provedores; retorna {future: provedor}"""
+    return {
+        search_executor.submit(search, query): name
+        for name, search in SEARCH_PROVIDERS.items()
+    }
+
+def _search_providers(query):
+    """Consultar todos os provedores em paralelo respeitando o prazo total.
+    
+    Retorna os resultados dos provedores que responderam a tempo e a lista
+    dos provedores ignorados por terem estourado o prazo.
+    """
+    futures = _submit_providers(query)
+    done, not_done = wait(futures, timeout=SEARCH_DEADLINE_SECONDS)
+    
+    results = []
+    for future in futures:
+        if future not in done:
+            continue
+        try:
+            results.extend(future.result())
+        except Exception as e:
+            print(f"Erro ao buscar em {futures[future]}: {e}")
+    
+    # Quem não respondeu a tempo continua rodando em segundo plano e é descartado
+    skipped_providers = sorted(futures[future] for future in not_done)
+    for future in not_done:
+        future.cancel()
+    
+    return results, skipped_providers
+
 @content_bp.route('/search', methods=['GET'])
 def search_content():
     try:
@@ -23,28 +97,25 @@ def search_content():
         if len(query) < 2:
             return jsonify({'error': 'Busca deve ter pelo menos 2 caracteres'}), 400
         
-        results = []
-        
-        # Buscar filmes
+        # Responder pelo catálogo local quando ele tem resultados suficientes e recentes
         try:
-            movies = tmdb_service.search_movies(query)
-            results.extend(movies)
+            local_items, sufficient = catalog_service.search(query, limit=50)
         except Exception as e:
-            print(f"Erro ao buscar filmes: {e}")
+            print(f"Erro na busca local: {e}")
+            local_items, sufficient = [], False
         
-        # Buscar séries
-        try:
-            tv_shows = tmdb_service.search_tv_shows(query)
-            results.extend(tv_shows)
-        except Exception as e:
-            print(f"Erro ao buscar séries: {e}")
+        if sufficient:
+            # Mesma ordem da resposta dos provedores (rating)
+            local_items = sorted(local_items, key=lambda item: item.rating or 0, reverse=True)
+            return jsonify({
+                'results': [item.to_dict() for item in local_items],
+                'total': len(local_items),
+                'query': query,
+                'skipped_providers': [],
+                'source': 'local'
+            }), 200
         
-        # Buscar jogos
-        try:
-            games = igdb_service.search_games(query)
-            results.extend(games)
-        except Exception as e:
-            print(f"Erro ao buscar jogos: {e}")
+        results, skipped_providers = _search_providers(query)
         
         # Ordenar por relevância (rating/popularity)
         results.sort(key=lambda x: x.get('rating', 0), reverse=True)
@@ -52,12 +123,132 @@ def search_content():
         return jsonify({
             'results': results[:50],  # Limitar a 50 resultados
             'total': len(results),
-            'query': query
+            'query': query,
+            'skipped_providers': skipped_providers,
+            'source': 'upstream'
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Erro na busca: {str(e)}'}), 500
 
+@content_bp.route('/search/stream', methods=['GET'])
+def search_content_stream():
+    """Busca em streaming: envia os resultados de cada provedor assim que chegam.
+    
+    Formatos: NDJSON (padrão) ou Server-Sent Events (`format=sse`). Cada
+    provedor gera um frame `provider`; o último frame (`done`) traz a
+    lista final ordenada, como em /search.
+    """
+    query = request.args.get('q', '').strip()
+    stream_format = request.args.get('format', 'ndjson').strip().lower()
+    
+    if not query:
+        return jsonify({'error': 'Parâmetro de busca é obrigatório'}), 400
+    
+    if len(query) < 2:
+        return jsonify({'error': 'Busca deve ter pelo menos 2 caracteres'}), 400
+    
+    if stream_format not in ['ndjson', 'sse']:
+        return jsonify({'error': 'format deve ser ndjson ou sse'}), 400
+    
+    def encode(event, payload):
+        payload = dict(payload, event=event)
+        data = current_app.json.dumps(payload)
+        if stream_format == 'sse':
+            return f"event: {event}\ndata: {data}\n\n"
+        return f"{data}\n"
+    
+    try:
+        local_items, sufficient = catalog_service.search(query, limit=50)
+    except Exception as e:
+        print(f"Erro na busca local: {e}")
+        local_items, sufficient = [], False
+    
+    def generate():
+        if sufficient:
+            results = [item.to_dict() for item in local_items]
+            yield encode('provider', {'provider': 'local', 'results': results})
+            yield encode('done', {
+                'results': results,
+                'total': len(results),
+                'query': query,
+                'skipped_providers': [],
+                'source': 'local'
+            })
+            return
+        
+        futures = _submit_providers(query)
+        started = time.monotonic()
+        pending = set(futures)
+        results = []
+        
+        try:
+            for future in as_completed(futures, timeout=SEARCH_DEADLINE_SECONDS):
+                pending.discard(future)
+                provider = futures[future]
+                try:
+                    batch = future.result()
+                except Exception as e:
+                    print(f"Erro ao buscar em {provider}: {e}")
+                    continue
+                
+                batch = sorted(batch, key=lambda x: x.get('rating', 0), reverse=True)
+                results.extend(batch)
+                yield encode('provider', {
+                    'provider': provider,
+                    'results': batch,
+                    'elapsed_ms': round((time.monotonic() - started) * 1000)
+                })
+        except TimeoutError:
+            # Provedores que não responderam a tempo ficam de fora
+            for future in pending:
+                future.cancel()
+        
+        results.sort(key=lambda x: x.get('rating', 0), reverse=True)
+        yield encode('done', {
+            'results': results[:50],
+            'total': len(results),
+            'query': query,
+            'skipped_providers': sorted(futures[future] for future in pending),
+            'source': 'upstream'
+        })
+    
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={
+            'Cache-Control': 'no-cache',
+            # Evita que proxies (nginx) segurem os frames em buffer
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@content_bp.route('/autocomplete', methods=['GET'])
+def autocomplete():
+    """Sugestões de títulos enquanto o usuário digita (sem chamadas externas)"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+        content_type = request.args.get('type', '').strip() or None
+        
+        if not query:
+            return jsonify({'error': 'Parâmetro de busca é obrigatório'}), 400
+        
+        if content_type and content_type not in ['movie', 'tv', 'game']:
+            return jsonify({'error': 'type deve ser movie, tv ou game'}), 400
+        
+        title_index.ensure_synced()
+        suggestions = title_index.suggest(query, limit=limit, content_type=content_type)
+        
+        return jsonify({
+            'suggestions': suggestions,
+            'query': query
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro no autocomplete: {str(e)}'}), 500
+
 @content_bp.route('/favorites', methods=['GET'])
 @jwt_required()
 def get_favorites():
@@ -113,13 +304,20 @@ def add_favorite():
             title=title,
             poster_url=data.get('poster_url'),
             rating=data.get('rating'),
-            genres=json.dumps(data.get('genres', [])),
             release_date=data.get('release_date')
         )
+        favorite.set_genres(data.get('genres', []))
         
         db.session.add(favorite)
+        user_counters.adjust(user_id, **{user_counters.favorite_column(content_type): 1})
+        activity_rollup.record(user_id, favorites_added=1)
+        recommendation_service.mark_dirty(user_id)
         db.session.commit()
         
+        recommendation_service.schedule(user_id)
+        taste_index.add_favorite(favorite.id, user_id, favorite.genres)
+        title_index.add_items([{'id': data['content_id'], 'type': content_type, 'title': title}])
+        
         return jsonify({
             'message': 'Adicionado aos favoritos!',
             'favorite': favorite.to_dict()
@@ -141,9 +339,16 @@ def remove_favorite(favorite_id):
         if not favorite:
             return jsonify({'error': 'Favorito não encontrado'}), 404
         
+        favorite_genres = favorite.genres
         db.session.delete(favorite)
+        user_counters.adjust(user_id, **{user_counters.favorite_column(favorite.content_type): -1})
+        activity_rollup.record(user_id, favorites_removed=1)
+        recommendation_service.mark_dirty(user_id)
         db.session.commit()
         
+        recommendation_service.schedule(user_id)
+        taste_index.remove_favorite(favorite_id, user_id, favorite_genres)
+        
         return jsonify({
             'message': 'Removido dos favoritos!'
         }), 200
@@ -185,86 +390,83 @@ def check_favorite():
 def get_recommendations():
     try:
         user_id = get_jwt_identity()
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true')
         
-        # Buscar favoritos do usuário para gerar recomendações
-        favorites = Favorite.query.filter_by(user_id=user_id).all()
-        
-        if not favorites:
-            # Se não tem favoritos, retornar conteúdo popular
-            recommendations = []
-            
-            try:
-                popular_movies = tmdb_service.get_popular_movies()
-                recommendations.extend(popular_movies[:10])
-            except:
-                pass
-            
-            try:
-                popular_tv = tmdb_service.get_popular_tv_shows()
-                recommendations.extend(popular_tv[:10])
-            except:
-                pass
-            
-            try:
-                popular_games = igdb_service.get_popular_games()
-                recommendations.extend(popular_games[:10])
-            except:
-                pass
-            
-            return jsonify({
-                'recommendations': recommendations,
-                'based_on': 'popular_content'
-            }), 200
-        
-        # Gerar recomendações baseadas nos favoritos
-        recommendations = []
-        favorite_genres = []
+        # Recomendações materializadas (recalculadas quando os favoritos mudam)
+        return jsonify(recommendation_service.get(user_id, refresh=refresh)), 200
         
-        # Extrair gêneros dos favoritos
-        for fav in favorites:
-            if fav.genres:
-                try:
-                    genres = json.loads(fav.genres)
-                    favorite_genres.extend(genres)
-                except:
-                    pass
-        
-        # Contar gêneros mais frequentes
-        from collections import Counter
-        genre_counts = Counter(favorite_genres)
-        top_genres = [genre for genre, count in genre_counts.most_common(3)]
-        
-        # Buscar conteúdo similar
-        for genre in top_genres:
-            try:
-                similar_movies = tmdb_service.get_movies_by_genre(genre)
-                recommendations.extend(similar_movies[:5])
-            except:
-                pass
-            
-            try:
-                similar_tv = tmdb_service.get_tv_shows_by_genre(genre)
-                recommendations.extend(similar_tv[:5])
-            except:
-                pass
-        
-        # Remover duplicatas e favoritos já existentes
-        favorite_ids = {f"{fav.content_type}_{fav.content_id}" for fav in favorites}
-        unique_recommendations = []
-        seen_ids = set()
-        
-        for rec in recommendations:
-            rec_id = f"{rec['type']}_{rec['id']}"
-            if rec_id not in favorite_ids and rec_id not in seen_ids:
-                unique_recommendations.append(rec)
-                seen_ids.add(rec_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Erro ao gerar recomendações: {str(e)}'}), 500
+
+@content_bp.route('/recommendations/because-you-liked', methods=['GET'])
+@jwt_required()
+def get_because_you_liked():
+    """Itens similares aos favoritos ("porque você curtiu X").
+    
+    Usa os vizinhos pré-calculados pelo comando `flask item-similarity`.
+    Com `content_type` e `content_id` retorna os similares a esse item; sem
+    eles, os similares aos favoritos mais recentes do usuário.
+    """
+    try:
+        user_id = get_jwt_identity()
+        limit = max(1, min(request.args.get('limit', 10, type=int), 20))
+        
+        content_type = request.args.get('content_type')
+        content_id = request.args.get('content_id')
+        if content_type and content_id:
+            seeds = [(content_type, str(content_id), None)]
+        else:
+            seeds = db.session.query(
+                Favorite.content_type, Favorite.content_id, Favorite.title
+            ).filter_by(user_id=user_id).order_by(Favorite.created_at.desc()).limit(3).all()
+        
+        neighbors = neighbors_for([(seed_type, seed_id) for seed_type, seed_id, _ in seeds])
+        
+        # Excluir só os vizinhos retornados que já são favoritos (custo limitado
+        # pelo número de vizinhos, não pelo de favoritos do usuário)
+        candidates = {(item['type'], str(item['id'])) for items in neighbors.values() for item in items}
+        favorite_ids = set(db.session.query(Favorite.content_type, Favorite.content_id).filter(
+            Favorite.user_id == user_id,
+            db.tuple_(Favorite.content_type, Favorite.content_id).in_(candidates)
+        ).all()) if candidates else set()
+        
+        groups = []
+        for seed_type, seed_id, seed_title in seeds:
+            items = [
+                item for item in neighbors.get((seed_type, seed_id), [])
+                if (item['type'], str(item['id'])) not in favorite_ids
+            ][:limit]
+            if items:
+                groups.append({
+                    'because_you_liked': {
+                        'id': int(seed_id) if seed_id.isdigit() else seed_id,
+                        'type': seed_type,
+                        'title': seed_title
+                    },
+                    'recommendations': items
+                })
         
         return jsonify({
-            'recommendations': unique_recommendations[:20],
-            'based_on': 'user_preferences',
-            'favorite_genres': top_genres
+            'groups': groups,
+            'based_on': 'item_similarity'
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Erro ao gerar recomendações: {str(e)}'}), 500
 
+@content_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Métricas internas das integrações de catálogo (protegidas por METRICS_TOKEN)"""
+    token = request.headers.get('X-Metrics-Token', '')
+    if not METRICS_TOKEN or not hmac.compare_digest(token.encode('utf-8'), METRICS_TOKEN.encode('utf-8')):
+        return jsonify({'error': 'Não encontrado'}), 404
+    
+    return jsonify({
+        'cache': response_cache.stats(),
+        'coalescing': catalog_flight.stats(),
+        'lists': catalog_lists.stats(),
+        'autocomplete': {'titles': title_index.size()},
+        'rate_limits': limiter_stats(),
+        'circuits': breaker_stats()
+    }), 200
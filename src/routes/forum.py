@@ -2,7 +2,12 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.database import User, ForumPost, ForumReply
 from src.extensions import db
+from src.services import activity_rollup, forum_ranking, forum_search, user_counters
+from src.services.cursors import decode_cursor, encode_cursor
 from datetime import datetime
+from sqlalchemy.orm import defer, joinedload
+import os
+import time
 
 forum_bp = Blueprint('forum', __name__)
 
@@ -17,6 +22,26 @@ CATEGORIES = [
     'noticias'
 ]
 
+# Validade (em segundos) dos totais aproximados da listagem, por processo
+TOTALS_TTL = int(os.environ.get('FORUM_TOTALS_TTL', '60'))
+
+# categoria -> (total, momento da contagem)
+_totals_cache = {}
+
+# Modos de ordenação da listagem: coluna e tipo do valor no cursor
+SORT_COLUMNS = {
+    'new': ('created_at', datetime),
+    'hot': ('hot_score', float),
+    'trending': ('trending_score', float)
+}
+
+# Campos da listagem quando o cliente não pede `fields` (o resumo no lugar do content)
+LIST_FIELDS = tuple(field for field in ForumPost.FIELDS if field != 'content')
+
+# Replies por janela na visualização de uma thread
+REPLIES_PER_PAGE = 50
+MAX_REPLIES_PER_PAGE = 100
+
 @forum_bp.route('/categories', methods=['GET'])
 def get_categories():
     """Retorna categorias disponíveis do fórum"""
@@ -26,47 +51,126 @@ def get_categories():
 
 @forum_bp.route('/posts', methods=['GET'])
 def get_posts():
-    """Lista posts do fórum com paginação"""
+    """Lista posts do fórum (new, hot ou trending) com paginação por cursor"""
     try:
-        page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         category = request.args.get('category', '').strip()
+        sort = request.args.get('sort', 'new').strip().lower()
+        cursor = request.args.get('cursor', '').strip()
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        fields = request.args.get('fields', '').strip()
+        
+        # Campos pedidos pelo cliente (sparse fieldset)
+        if fields:
+            fields = list(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+            unknown = [field for field in fields if field not in ForumPost.FIELDS]
+            if unknown or not fields:
+                return jsonify({'error': f'fields deve conter apenas: {", ".join(ForumPost.FIELDS)}'}), 400
+        else:
+            fields = LIST_FIELDS
         
         # Limitar per_page
-        per_page = min(per_page, 50)
+        per_page = max(1, min(per_page, 50))
+        
+        if sort not in SORT_COLUMNS:
+            return jsonify({'error': f'sort deve ser um dos: {", ".join(SORT_COLUMNS)}'}), 400
+        column_name, cursor_type = SORT_COLUMNS[sort]
+        sort_column = getattr(ForumPost, column_name)
         
-        # Query base
+        # Query base: content só é lido se pedido; autores no mesmo SELECT
         query = ForumPost.query.filter_by(is_active=True)
+        if 'content' not in fields:
+            query = query.options(defer(ForumPost.content))
+        if 'author' in fields:
+            query = query.options(joinedload(ForumPost.author))
         
         # Filtrar por categoria se especificada
         if category and category in CATEGORIES:
             query = query.filter_by(category=category)
+        else:
+            category = ''
+        
+        # Continuar depois do último post da página anterior (sem OFFSET)
+        if cursor:
+            try:
+                value, post_id = decode_cursor(cursor, cursor_type, int)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            query = query.filter(db.tuple_(sort_column, ForumPost.id) < db.tuple_(value, post_id))
+        
+        # Ordenar pela coluna do modo (valor já calculado), usando o índice
+        posts = query.order_by(sort_column.desc(), ForumPost.id.desc()).limit(per_page + 1).all()
+        
+        has_next = len(posts) > per_page
+        posts = posts[:per_page]
+        
+        pagination = {
+            'per_page': per_page,
+            'has_next': has_next,
+            'next_cursor': encode_cursor(getattr(posts[-1], column_name), posts[-1].id) if has_next else None
+        }
+        if include_total:
+            pagination['total'] = _approximate_total(category)
+            pagination['total_is_approximate'] = True
         
-        # Ordenar por data de criação (mais recentes primeiro)
-        query = query.order_by(ForumPost.created_at.desc())
+        return jsonify({
+            'posts': [post.to_dict(fields) for post in posts],
+            'pagination': pagination,
+            'category': category if category else 'all',
+            'sort': sort
+        }), 200
         
-        # Paginação
-        posts = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+    except Exception as e:
+        return jsonify({'error': f'Erro ao buscar posts: {str(e)}'}), 500
+
+def _approximate_total(category):
+    """Total de posts ativos (da categoria), contado no máximo uma vez a cada TOTALS_TTL"""
+    now = time.time()
+    cached = _totals_cache.get(category)
+    if cached and now - cached[1] < TOTALS_TTL:
+        return cached[0]
+    
+    query = db.session.query(db.func.count(ForumPost.id)).filter(ForumPost.is_active == True)
+    if category:
+        query = query.filter(ForumPost.category == category)
+    total = query.scalar()
+    
+    _totals_cache[category] = (total, now)
+    return total
+
+@forum_bp.route('/search', methods=['GET'])
+def search_forum():
+    """Busca textual em posts e replies, por relevância, com paginação por cursor"""
+    try:
+        query = request.args.get('q', '').strip()
+        category = request.args.get('category', '').strip()
+        cursor = request.args.get('cursor', '').strip()
+        per_page = max(1, min(request.args.get('per_page', 20, type=int), 50))
+        
+        if len(query) < 2:
+            return jsonify({'error': 'Query deve ter pelo menos 2 caracteres'}), 400
+        
+        if category and category not in CATEGORIES:
+            return jsonify({'error': f'Categoria deve ser uma das: {", ".join(CATEGORIES)}'}), 400
+        
+        try:
+            results, next_cursor = forum_search.search(query, category or None, cursor or None, per_page)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
-            'posts': [post.to_dict() for post in posts.items],
+            'results': results,
             'pagination': {
-                'page': page,
                 'per_page': per_page,
-                'total': posts.total,
-                'pages': posts.pages,
-                'has_next': posts.has_next,
-                'has_prev': posts.has_prev
+                'has_next': next_cursor is not None,
+                'next_cursor': next_cursor
             },
+            'query': query,
             'category': category if category else 'all'
         }), 200
         
     except Exception as e:
-        return jsonify({'error': f'Erro ao buscar posts: {str(e)}'}), 500
+        return jsonify({'error': f'Erro ao buscar no fórum: {str(e)}'}), 500
 
 @forum_bp.route('/posts', methods=['POST'])
 @jwt_required()
@@ -108,12 +212,16 @@ def create_post():
         # Criar post
         post = ForumPost(
             title=title,
-            content=content,
             category=category,
             author_id=user_id
         )
+        post.set_content(content)
+        forum_ranking.init_post(post, datetime.utcnow())
         
         db.session.add(post)
+        forum_search.index_post(post)
+        user_counters.adjust(user_id, posts=1)
+        activity_rollup.record(user_id, posts=1)
         db.session.commit()
         
         return jsonify({
@@ -127,21 +235,24 @@ def create_post():
 
 @forum_bp.route('/posts/<int:post_id>', methods=['GET'])
 def get_post(post_id):
-    """Buscar post específico com replies"""
+    """Buscar post específico com a primeira (ou última) janela de replies"""
     try:
-        post = ForumPost.query.filter_by(id=post_id, is_active=True).first()
+        post = ForumPost.query.options(joinedload(ForumPost.author)).filter_by(id=post_id, is_active=True).first()
         
         if not post:
             return jsonify({'error': 'Post não encontrado'}), 404
         
-        # Buscar replies
-        replies = ForumReply.query.filter_by(
-            post_id=post_id, 
-            is_active=True
-        ).order_by(ForumReply.created_at.asc()).all()
+        # Buscar replies (uma janela, não a thread inteira)
+        position = request.args.get('replies', 'first').strip().lower()
+        per_page = max(1, min(request.args.get('replies_per_page', REPLIES_PER_PAGE, type=int), MAX_REPLIES_PER_PAGE))
+        if position not in ('first', 'latest'):
+            return jsonify({'error': 'replies deve ser first ou latest'}), 400
+        
+        replies, pagination = _reply_window(post_id, per_page, position=position)
         
         post_dict = post.to_dict()
         post_dict['replies'] = [reply.to_dict() for reply in replies]
+        post_dict['replies_pagination'] = pagination
         
         return jsonify({
             'post': post_dict
@@ -150,6 +261,97 @@ def get_post(post_id):
     except Exception as e:
         return jsonify({'error': f'Erro ao buscar post: {str(e)}'}), 500
 
+@forum_bp.route('/posts/<int:post_id>/replies', methods=['GET'])
+def get_replies(post_id):
+    """Janela de replies do post: first, latest, after=<cursor> ou before=<cursor>"""
+    try:
+        if not db.session.query(ForumPost.query.filter_by(id=post_id, is_active=True).exists()).scalar():
+            return jsonify({'error': 'Post não encontrado'}), 404
+        
+        per_page = max(1, min(request.args.get('per_page', REPLIES_PER_PAGE, type=int), MAX_REPLIES_PER_PAGE))
+        after = request.args.get('after', '').strip()
+        before = request.args.get('before', '').strip()
+        position = request.args.get('position', 'first').strip().lower()
+        
+        if after and before:
+            return jsonify({'error': 'Use after ou before, não ambos'}), 400
+        if position not in ('first', 'latest'):
+            return jsonify({'error': 'position deve ser first ou latest'}), 400
+        
+        try:
+            replies, pagination = _reply_window(post_id, per_page, position=position, after=after, before=before)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'replies': [reply.to_dict() for reply in replies],
+            'pagination': pagination
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao buscar replies: {str(e)}'}), 500
+
+def _reply_window(post_id, per_page, position='first', after='', before=''):
+    """Replies ativos em ordem cronológica, paginados por (created_at, id).
+    
+    Sem cursor, devolve o início (first) ou o fim (latest) da thread. Os
+    autores vêm no mesmo SELECT.
+    """
+    query = ForumReply.query.options(joinedload(ForumReply.author)).filter(
+        ForumReply.post_id == post_id,
+        ForumReply.is_active == True
+    )
+    key = db.tuple_(ForumReply.created_at, ForumReply.id)
+    
+    # Lendo do fim para o começo (latest ou before): consulta decrescente, depois invertida
+    backwards = bool(before) or (position == 'latest' and not after)
+    cursor = None
+    if after:
+        cursor = tuple(decode_cursor(after, datetime, int))
+        query = query.filter(key > db.tuple_(*cursor))
+    elif before:
+        cursor = tuple(decode_cursor(before, datetime, int))
+        query = query.filter(key < db.tuple_(*cursor))
+    
+    if backwards:
+        query = query.order_by(ForumReply.created_at.desc(), ForumReply.id.desc())
+    else:
+        query = query.order_by(ForumReply.created_at.asc(), ForumReply.id.asc())
+    
+    replies = query.limit(per_page + 1).all()
+    has_more = len(replies) > per_page
+    replies = replies[:per_page]
+    if backwards:
+        replies.reverse()
+    
+    # Limites da janela; vazia, vale o cursor recebido
+    first_key = (replies[0].created_at, replies[0].id) if replies else cursor
+    last_key = (replies[-1].created_at, replies[-1].id) if replies else cursor
+    
+    # O lado de onde se veio pode ter ficado vazio (replies removidos): um EXISTS confere
+    if backwards:
+        has_before = has_more
+        has_after = cursor is not None and _replies_exist(post_id, key > db.tuple_(*last_key))
+    else:
+        has_before = cursor is not None and _replies_exist(post_id, key < db.tuple_(*first_key))
+        has_after = has_more
+    
+    return replies, {
+        'per_page': per_page,
+        'has_before': has_before,
+        'has_after': has_after,
+        'before_cursor': encode_cursor(*first_key) if has_before else None,
+        'after_cursor': encode_cursor(*last_key) if has_after else None
+    }
+
+def _replies_exist(post_id, condition):
+    """Se há replies ativos do post que atendem à condição"""
+    return db.session.query(ForumReply.query.filter(
+        ForumReply.post_id == post_id,
+        ForumReply.is_active == True,
+        condition
+    ).exists()).scalar()
+
 @forum_bp.route('/posts/<int:post_id>/replies', methods=['POST'])
 @jwt_required()
 def create_reply(post_id):
@@ -171,8 +373,8 @@ def create_reply(post_id):
         if len(content) > 5000:
             return jsonify({'error': 'Reply deve ter no máximo 5.000 caracteres'}), 400
         
-        # Verificar se post existe
-        post = ForumPost.query.filter_by(id=post_id, is_active=True).first()
+        # Verificar se post existe (travando a linha: os scores dependem do valor atual)
+        post = ForumPost.query.filter_by(id=post_id, is_active=True).with_for_update().first()
         if not post:
             return jsonify({'error': 'Post não encontrado'}), 404
         
@@ -182,13 +384,25 @@ def create_reply(post_id):
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
         # Criar reply
+        now = datetime.utcnow()
         reply = ForumReply(
             content=content,
             post_id=post_id,
-            author_id=user_id
+            author_id=user_id,
+            created_at=now
         )
         
         db.session.add(reply)
+        forum_search.index_reply(reply)
+        
+        # Contador do post atualizado no banco (sem sobrescrever replies concorrentes)
+        ForumPost.query.filter_by(id=post_id).update({
+            'reply_count': ForumPost.reply_count + 1,
+            'last_reply_at': now,
+            'updated_at': ForumPost.updated_at,
+            **forum_ranking.reply_added(post, now)
+        }, synchronize_session=False)
+        activity_rollup.record(user_id, replies=1)
         db.session.commit()
         
         return jsonify({
@@ -228,7 +442,7 @@ def update_post(post_id):
             content = data['content'].strip()
             if len(content) < 10 or len(content) > 10000:
                 return jsonify({'error': 'Conteúdo deve ter entre 10 e 10.000 caracteres'}), 400
-            post.content = content
+            post.set_content(content)
         
         if 'category' in data:
             category = data['category'].strip()
@@ -237,6 +451,7 @@ def update_post(post_id):
             post.category = category
         
         post.updated_at = datetime.utcnow()
+        forum_search.index_post(post)
         db.session.commit()
         
         return jsonify({
@@ -264,9 +479,17 @@ def delete_post(post_id):
         if post.author_id != user_id:
             return jsonify({'error': 'Apenas o autor pode deletar o post'}), 403
         
-        # Soft delete
-        post.is_active = False
-        post.updated_at = datetime.utcnow()
+        # Soft delete condicional: entre DELETEs concorrentes do mesmo post
+        # só um altera a linha e desconta do contador
+        deleted = ForumPost.query.filter_by(id=post.id, is_active=True).update({
+            'is_active': False,
+            'updated_at': datetime.utcnow()
+        }, synchronize_session=False)
+        if deleted != 1:
+            db.session.rollback()
+            return jsonify({'error': 'Post não encontrado'}), 404
+        
+        user_counters.adjust(user_id, posts=-1)
         db.session.commit()
         
         return jsonify({
@@ -304,6 +527,7 @@ def update_reply(reply_id):
         
         reply.content = content
         reply.updated_at = datetime.utcnow()
+        forum_search.index_reply(reply)
         db.session.commit()
         
         return jsonify({
@@ -331,9 +555,29 @@ def delete_reply(reply_id):
         if reply.author_id != user_id:
             return jsonify({'error': 'Apenas o autor pode deletar o reply'}), 403
         
-        # Soft delete
-        reply.is_active = False
-        reply.updated_at = datetime.utcnow()
+        # Soft delete condicional: entre DELETEs concorrentes do mesmo reply
+        # (ex.: clique duplo) só um altera a linha e desconta do post
+        deleted = ForumReply.query.filter_by(id=reply.id, is_active=True).update({
+            'is_active': False,
+            'updated_at': datetime.utcnow()
+        }, synchronize_session=False)
+        if deleted != 1:
+            db.session.rollback()
+            return jsonify({'error': 'Reply não encontrado'}), 404
+        
+        # Descontar do post e recalcular a última atividade sem este reply
+        last_reply_at = db.session.query(db.func.max(ForumReply.created_at)).filter(
+            ForumReply.post_id == reply.post_id,
+            ForumReply.is_active == True,
+            ForumReply.id != reply.id
+        ).scalar_subquery()
+        post = ForumPost.query.filter_by(id=reply.post_id).with_for_update().first()
+        ForumPost.query.filter_by(id=reply.post_id).update({
+            'reply_count': db.case((ForumPost.reply_count > 0, ForumPost.reply_count - 1), else_=0),
+            'last_reply_at': last_reply_at,
+            'updated_at': ForumPost.updated_at,
+            **forum_ranking.reply_removed(post)
+        }, synchronize_session=False)
         db.session.commit()
         
         return jsonify({
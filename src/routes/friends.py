@@ -2,11 +2,18 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.database import User, Friendship, Favorite
 from src.extensions import db
+from src.services import activity_rollup, favorite_genres, user_counters
+from src.services.taste_index import taste_index
 from datetime import datetime
-import json
+from sqlalchemy import text
+import os
 
 friends_bp = Blueprint('friends', __name__)
 
+# Amigos do usuário considerados, no máximo, nas sugestões de amigos de
+# amigos (os mais recentes), para limitar o custo em quem tem milhares
+MUTUAL_MAX_FRIENDS = int(os.environ.get('FRIENDS_MUTUAL_MAX_FRIENDS', '1000'))
+
 @friends_bp.route('/search', methods=['GET'])
 @jwt_required()
 def search_users():
@@ -106,8 +113,11 @@ def send_friend_request():
         )
         
         db.session.add(friendship)
+        user_counters.adjust(requested_id, pending_requests=1)
         db.session.commit()
         
+        taste_index.add_connection(friendship.id, friendship.requester_id, friendship.requested_id)
+        
         return jsonify({
             'message': 'Solicitação de amizade enviada!',
             'friendship': friendship.to_dict()
@@ -138,6 +148,21 @@ def get_friend_requests():
     except Exception as e:
         return jsonify({'error': f'Erro ao buscar solicitações: {str(e)}'}), 500
 
+def _resolve_request(friendship, user_id, status):
+    """Mudar o status de uma solicitação ainda pendente.
+    
+    Retorna False (e desfaz a transação) se outra requisição já a resolveu.
+    """
+    updated = Friendship.query.filter_by(
+        id=friendship.id,
+        requested_id=int(user_id),
+        status='pending'
+    ).update({'status': status, 'updated_at': datetime.utcnow()})
+    if updated != 1:
+        db.session.rollback()
+        return False
+    return True
+
 @friends_bp.route('/requests/<int:friendship_id>/accept', methods=['POST'])
 @jwt_required()
 def accept_friend_request(friendship_id):
@@ -155,9 +180,15 @@ def accept_friend_request(friendship_id):
         if not friendship:
             return jsonify({'error': 'Solicitação não encontrada'}), 404
         
-        # Aceitar solicitação
-        friendship.status = 'accepted'
-        friendship.updated_at = datetime.utcnow()
+        # Aceitar solicitação: UPDATE condicional, então entre requisições
+        # concorrentes só uma muda o status e ajusta os contadores
+        if not _resolve_request(friendship, user_id, 'accepted'):
+            return jsonify({'error': 'Solicitação não encontrada'}), 404
+        
+        user_counters.adjust(friendship.requested_id, pending_requests=-1, friends=1)
+        user_counters.adjust(friendship.requester_id, friends=1)
+        activity_rollup.record(friendship.requested_id, friendships_accepted=1)
+        activity_rollup.record(friendship.requester_id, friendships_accepted=1)
         db.session.commit()
         
         return jsonify({
@@ -186,9 +217,11 @@ def reject_friend_request(friendship_id):
         if not friendship:
             return jsonify({'error': 'Solicitação não encontrada'}), 404
         
-        # Rejeitar solicitação
-        friendship.status = 'rejected'
-        friendship.updated_at = datetime.utcnow()
+        # Rejeitar solicitação (UPDATE condicional, como no aceite)
+        if not _resolve_request(friendship, user_id, 'rejected'):
+            return jsonify({'error': 'Solicitação não encontrada'}), 404
+        
+        user_counters.adjust(friendship.requested_id, pending_requests=-1)
         db.session.commit()
         
         return jsonify({
@@ -257,8 +290,12 @@ def remove_friend(friendship_id):
         
         # Remover amizade
         db.session.delete(friendship)
+        user_counters.adjust(friendship.requester_id, friends=-1)
+        user_counters.adjust(friendship.requested_id, friends=-1)
         db.session.commit()
         
+        taste_index.remove_connection(friendship.id, friendship.requester_id, friendship.requested_id)
+        
         return jsonify({
             'message': 'Amigo removido com sucesso.'
         }), 200
@@ -277,8 +314,8 @@ def get_friend_profile(friend_id):
         # Verificar se são amigos
         friendship = Friendship.query.filter(
             db.or_(
-                db.and__(Friendship.requester_id == user_id, Friendship.requested_id == friend_id),
-                db.and__(Friendship.requester_id == friend_id, Friendship.requested_id == user_id)
+                db.and_(Friendship.requester_id == user_id, Friendship.requested_id == friend_id),
+                db.and_(Friendship.requester_id == friend_id, Friendship.requested_id == user_id)
             ),
             Friendship.status == 'accepted'
         ).first()
@@ -313,18 +350,10 @@ def get_friend_profile(friend_id):
             'games_count': len(favorites_by_type['games'])
         }
         
-        # Gêneros favoritos
-        all_genres = []
-        for fav in favorites:
-            if fav.genres:
-                try:
-                    genres = json.loads(fav.genres)
-                    all_genres.extend(genres)
-                except:
-                    pass
-        
-        from collections import Counter
-        top_genres = [genre for genre, count in Counter(all_genres).most_common(5)]
+        # Gêneros favoritos (dos mesmos favoritos recentes), agregados no banco
+        top_genres = [
+            genre for genre, count in favorite_genres.top_genres(friend_id, 5, [fav.id for fav in favorites])
+        ] if favorites else []
         
         return jsonify({
             'profile': friend.to_dict(),
@@ -337,100 +366,133 @@ def get_friend_profile(friend_id):
     except Exception as e:
         return jsonify({'error': f'Erro ao buscar perfil: {str(e)}'}), 500
 
+# Amigos de amigos em uma única consulta: amigos aceitos do usuário (os
+# mais recentes, até :max_friends), os amigos aceitos deles e a contagem de
+# amigos em comum, sem quem já tem amizade ou solicitação com o usuário
+MUTUAL_FRIENDS_SQL = text("""
+    WITH friends AS (
+        SELECT requested_id AS friend_id, updated_at FROM friendships
+        WHERE requester_id = :user_id AND status = 'accepted'
+        UNION ALL
+        SELECT requester_id AS friend_id, updated_at FROM friendships
+        WHERE requested_id = :user_id AND status = 'accepted'
+    ),
+    scanned AS (
+        SELECT friend_id FROM friends ORDER BY updated_at DESC LIMIT :max_friends
+    ),
+    two_hop AS (
+        SELECT f.requested_id AS candidate_id FROM scanned s
+        JOIN friendships f ON f.requester_id = s.friend_id AND f.status = 'accepted'
+        UNION ALL
+        SELECT f.requester_id AS candidate_id FROM scanned s
+        JOIN friendships f ON f.requested_id = s.friend_id AND f.status = 'accepted'
+    )
+    SELECT t.candidate_id, COUNT(*) AS mutual_friends
+    FROM two_hop t
+    JOIN users u ON u.id = t.candidate_id AND u.is_active = :active
+    WHERE t.candidate_id <> :user_id
+      AND NOT EXISTS (
+          SELECT 1 FROM friendships x
+          WHERE (x.requester_id = :user_id AND x.requested_id = t.candidate_id)
+             OR (x.requester_id = t.candidate_id AND x.requested_id = :user_id)
+      )
+    GROUP BY t.candidate_id
+    ORDER BY mutual_friends DESC, t.candidate_id
+    LIMIT :limit OFFSET :offset
+""")
+
+def _mutual_friend_suggestions(user_id):
+    """Sugestões de amigos de amigos, paginadas por limit/offset"""
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    
+    # Uma linha a mais indica se há próxima página
+    rows = db.session.execute(MUTUAL_FRIENDS_SQL, {
+        'user_id': int(user_id),
+        'active': True,
+        'max_friends': MUTUAL_MAX_FRIENDS,
+        'limit': limit + 1,
+        'offset': offset
+    }).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    users = {
+        user.id: user for user in User.query.filter(User.id.in_([row[0] for row in rows])).all()
+    } if rows else {}
+    
+    suggestions = []
+    for candidate_id, mutual_friends in rows:
+        user = users.get(candidate_id)
+        if not user:
+            continue
+        user_dict = user.to_dict()
+        user_dict['mutual_friends'] = mutual_friends
+        suggestions.append(user_dict)
+    
+    return jsonify({
+        'suggestions': suggestions,
+        'mode': 'mutual',
+        'limit': limit,
+        'offset': offset,
+        'has_more': has_more,
+        'next_offset': offset + limit if has_more else None
+    }), 200
+
 @friends_bp.route('/suggestions', methods=['GET'])
 @jwt_required()
 def get_friend_suggestions():
-    """Sugerir amigos baseado em gostos similares"""
+    """Sugerir amigos baseado em gostos similares.
+    
+    Com `mode=mutual` sugere amigos de amigos ("pessoas que você talvez
+    conheça"), ordenados pelo número de amigos em comum.
+    """
     try:
         user_id = get_jwt_identity()
         
-        # Buscar favoritos do usuário
-        user_favorites = Favorite.query.filter_by(user_id=user_id).all()
+        if request.args.get('mode') == 'mutual':
+            return _mutual_friend_suggestions(user_id)
+        
+        # Favoritos e gêneros do usuário, a partir do índice de gostos em memória
+        total_favorites, top_user_genres = taste_index.profile(user_id)
         
-        if not user_favorites:
+        if not total_favorites:
             return jsonify({
                 'suggestions': [],
                 'message': 'Adicione alguns favoritos para receber sugestões de amigos!'
             }), 200
         
-        # Extrair gêneros dos favoritos do usuário
-        user_genres = []
-        for fav in user_favorites:
-            if fav.genres:
-                try:
-                    genres = json.loads(fav.genres)
-                    user_genres.extend(genres)
-                except:
-                    pass
-        
-        if not user_genres:
+        if not top_user_genres:
             return jsonify({
                 'suggestions': [],
                 'message': 'Não foi possível encontrar sugestões no momento.'
             }), 200
         
-        # Buscar usuários com gostos similares
-        from collections import Counter
-        user_genre_counts = Counter(user_genres)
-        top_user_genres = set([genre for genre, count in user_genre_counts.most_common(10)])
+        # Jaccard contra todos os usuários de uma vez, sem quem já tem amizade
+        # ou solicitação com o usuário
+        matches, total = taste_index.similar_users(user_id, top_user_genres, limit=10)
         
-        # Buscar outros usuários
-        other_users = User.query.filter(
-            User.id != user_id,
-            User.is_active == True
-        ).all()
+        users = {
+            user.id: user for user in User.query.filter(
+                User.id.in_([match['user_id'] for match in matches]),
+                User.is_active == True
+            ).all()
+        } if matches else {}
         
         suggestions = []
-        
-        for other_user in other_users:
-            # Verificar se já são amigos ou há solicitação
-            existing = Friendship.query.filter(
-                db.or_(
-                    db.and__(Friendship.requester_id == user_id, Friendship.requested_id == other_user.id),
-                    db.and__(Friendship.requester_id == other_user.id, Friendship.requested_id == user_id)
-                )
-            ).first()
-            
-            if existing:
-                continue  # Pular se já são amigos ou há solicitação
-            
-            # Buscar favoritos do outro usuário
-            other_favorites = Favorite.query.filter_by(user_id=other_user.id).all()
-            
-            if not other_favorites:
-                continue
-            
-            # Extrair gêneros do outro usuário
-            other_genres = []
-            for fav in other_favorites:
-                if fav.genres:
-                    try:
-                        genres = json.loads(fav.genres)
-                        other_genres.extend(genres)
-                    except:
-                        pass
-            
-            if not other_genres:
+        for match in matches:
+            other_user = users.get(match['user_id'])
+            if not other_user:
                 continue
-            
-            # Calcular similaridade
-            other_genre_set = set(other_genres)
-            common_genres = top_user_genres.intersection(other_genre_set)
-            similarity_score = len(common_genres) / len(top_user_genres.union(other_genre_set))
-            
-            if similarity_score > 0.2:  # Pelo menos 20% de similaridade
-                user_dict = other_user.to_dict()
-                user_dict['similarity_score'] = round(similarity_score * 100, 1)
-                user_dict['common_genres'] = list(common_genres)
-                user_dict['total_favorites'] = len(other_favorites)
-                suggestions.append(user_dict)
-        
-        # Ordenar por similaridade
-        suggestions.sort(key=lambda x: x['similarity_score'], reverse=True)
+            user_dict = other_user.to_dict()
+            user_dict['similarity_score'] = round(match['score'] * 100, 1)
+            user_dict['common_genres'] = match['common_genres']
+            user_dict['total_favorites'] = match['total_favorites']
+            suggestions.append(user_dict)
         
         return jsonify({
-            'suggestions': suggestions[:10],  # Limitar a 10 sugestões
-            'total': len(suggestions)
+            'suggestions': suggestions,
+            'total': total
         }), 200
         
     except Exception as e:
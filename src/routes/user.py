@@ -1,9 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.database import User, Favorite, ForumPost, Friendship
+from src.models.database import User, Favorite
 from src.extensions import db
-from datetime import datetime
-import json
+from src.services import activity_rollup, favorite_genres, user_counters
+from datetime import date, datetime
 
 user_bp = Blueprint('user', __name__)
 
@@ -18,51 +18,23 @@ def get_profile():
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        # Buscar estatísticas
-        favorites_count = Favorite.query.filter_by(user_id=user_id).count()
-        posts_count = ForumPost.query.filter_by(author_id=user_id, is_active=True).count()
-        friends_count = Friendship.query.filter(
-            db.or_(
-                db.and_(Friendship.requester_id == user_id, Friendship.status == 'accepted'),
-                db.and_(Friendship.requested_id == user_id, Friendship.status == 'accepted')
-            )
-        ).count()
+        # Estatísticas mantidas a cada escrita (uma leitura pela chave primária)
+        counters = user_counters.get(user_id)
         
         # Buscar favoritos recentes
         recent_favorites = Favorite.query.filter_by(user_id=user_id).order_by(Favorite.created_at.desc()).limit(10).all()
         
-        # Agrupar favoritos por tipo
-        favorites_by_type = {
-            'movies': 0,
-            'tv': 0,
-            'games': 0
-        }
-        
-        all_favorites = Favorite.query.filter_by(user_id=user_id).all()
-        for fav in all_favorites:
-            if fav.content_type in favorites_by_type:
-                favorites_by_type[fav.content_type] += 1
-        
-        # Gêneros favoritos
-        all_genres = []
-        for fav in all_favorites:
-            if fav.genres:
-                try:
-                    genres = json.loads(fav.genres)
-                    all_genres.extend(genres)
-                except:
-                    pass
-        
-        from collections import Counter
-        top_genres = [genre for genre, count in Counter(all_genres).most_common(5)]
+        # Gêneros favoritos, agregados no banco
+        top_genres = [genre for genre, count in favorite_genres.top_genres(user_id, 5)]
         
         profile_data = user.to_dict()
         profile_data.update({
             'stats': {
-                'favorites_count': favorites_count,
-                'posts_count': posts_count,
-                'friends_count': friends_count,
-                'favorites_by_type': favorites_by_type
+                'favorites_count': counters.favorites,
+                'posts_count': counters.posts,
+                'friends_count': counters.friends,
+                'pending_requests': counters.pending_requests,
+                'favorites_by_type': counters.favorites_by_type()
             },
             'recent_favorites': [fav.to_dict() for fav in recent_favorites],
             'top_genres': top_genres
@@ -188,81 +160,54 @@ def get_user_stats():
     try:
         user_id = get_jwt_identity()
         
-        # Estatísticas básicas
-        favorites_count = Favorite.query.filter_by(user_id=user_id).count()
-        posts_count = ForumPost.query.filter_by(author_id=user_id, is_active=True).count()
-        friends_count = Friendship.query.filter(
-            db.or_(
-                db.and_(Friendship.requester_id == user_id, Friendship.status == 'accepted'),
-                db.and_(Friendship.requested_id == user_id, Friendship.status == 'accepted')
-            )
-        ).count()
-        
-        # Favoritos por tipo
-        favorites_by_type = {
-            'movies': Favorite.query.filter_by(user_id=user_id, content_type='movie').count(),
-            'tv': Favorite.query.filter_by(user_id=user_id, content_type='tv').count(),
-            'games': Favorite.query.filter_by(user_id=user_id, content_type='game').count()
-        }
-        
-        # Favoritos por mês (últimos 12 meses)
-        from sqlalchemy import func, extract
-        favorites_by_month = db.session.query(
-            extract('month', Favorite.created_at).label('month'),
-            func.count(Favorite.id).label('count')
-        ).filter(
-            Favorite.user_id == user_id,
-            Favorite.created_at >= datetime.utcnow().replace(month=1, day=1)  # Ano atual
-        ).group_by(extract('month', Favorite.created_at)).all()
+        # Estatísticas básicas e favoritos por tipo
+        counters = user_counters.get(user_id)
         
+        # Favoritos e posts por mês do ano atual (formato anterior)
+        today = datetime.utcnow().date()
         monthly_data = {str(month): 0 for month in range(1, 13)}
-        for month, count in favorites_by_month:
-            monthly_data[str(int(month))] = count
+        forum_monthly_data = {str(month): 0 for month in range(1, 13)}
+        for period in activity_rollup.series(user_id, today.replace(month=1, day=1), today, 'month'):
+            month = str(int(period['period'][5:]))
+            monthly_data[month] = period['favorites_added']
+            forum_monthly_data[month] = period['posts']
+        
+        # Série de atividade no intervalo e granularidade pedidos
+        try:
+            range_start = date.fromisoformat(request.args.get('from') or today.replace(month=1, day=1).isoformat())
+            range_end = date.fromisoformat(request.args.get('to') or today.isoformat())
+        except ValueError:
+            return jsonify({'error': 'from e to devem estar no formato AAAA-MM-DD'}), 400
+        
+        granularity = request.args.get('granularity', 'month').strip().lower()
+        try:
+            activity = activity_rollup.series(user_id, range_start, range_end, granularity)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Top gêneros
-        all_favorites = Favorite.query.filter_by(user_id=user_id).all()
-        all_genres = []
-        
-        for fav in all_favorites:
-            if fav.genres:
-                try:
-                    genres = json.loads(fav.genres)
-                    all_genres.extend(genres)
-                except:
-                    pass
-        
-        from collections import Counter
-        genre_counts = Counter(all_genres)
         top_genres = [
             {'genre': genre, 'count': count}
-            for genre, count in genre_counts.most_common(10)
+            for genre, count in favorite_genres.top_genres(user_id, 10)
         ]
         
-        # Atividade no fórum por mês
-        forum_by_month = db.session.query(
-            extract('month', ForumPost.created_at).label('month'),
-            func.count(ForumPost.id).label('count')
-        ).filter(
-            ForumPost.author_id == user_id,
-            ForumPost.is_active == True,
-            ForumPost.created_at >= datetime.utcnow().replace(month=1, day=1)
-        ).group_by(extract('month', ForumPost.created_at)).all()
-        
-        forum_monthly_data = {str(month): 0 for month in range(1, 13)}
-        for month, count in forum_by_month:
-            forum_monthly_data[str(int(month))] = count
-        
         return jsonify({
             'stats': {
                 'totals': {
-                    'favorites': favorites_count,
-                    'posts': posts_count,
-                    'friends': friends_count
+                    'favorites': counters.favorites,
+                    'posts': counters.posts,
+                    'friends': counters.friends
                 },
-                'favorites_by_type': favorites_by_type,
+                'favorites_by_type': counters.favorites_by_type(),
                 'favorites_by_month': monthly_data,
                 'forum_by_month': forum_monthly_data,
-                'top_genres': top_genres
+                'top_genres': top_genres,
+                'activity': {
+                    'from': range_start.isoformat(),
+                    'to': range_end.isoformat(),
+                    'granularity': granularity,
+                    'series': activity
+                }
             }
         }), 200
         
@@ -0,0 +1,179 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import click
+from sqlalchemy import insert, text
+from sqlalchemy.dialects import postgresql, sqlite
+from src.extensions import db
+from src.models.database import UserActivityDaily
+
+ACTIVITY_COLUMNS = ('favorites_added', 'favorites_removed', 'posts', 'replies', 'friendships_accepted')
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+
+# Períodos devolvidos no máximo por consulta (ex.: ~1 ano e 1 mês por dia)
+MAX_BUCKETS = 400
+
+INSERT_BATCH_SIZE = 1000
+
+def record(user_id: int, **deltas: int) -> None:
+    """Somar eventos ao dia atual do usuário, na transação atual.
+
+    Um único upsert (INSERT ... ON CONFLICT DO UPDATE coluna = coluna +
+    delta), então escritas concorrentes no mesmo dia não se sobrescrevem.
+    """
+    values = {'user_id': int(user_id), 'day': datetime.utcnow().date()}
+    values.update({column: deltas.get(column, 0) for column in ACTIVITY_COLUMNS})
+    columns = UserActivityDaily.__table__.c
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        module = postgresql if dialect == 'postgresql' else sqlite
+        statement = module.insert(UserActivityDaily.__table__).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id', 'day'],
+            set_={column: columns[column] + statement.excluded[column] for column in deltas}
+        )
+        db.session.execute(statement)
+        return
+
+    updated = UserActivityDaily.query.filter_by(user_id=values['user_id'], day=values['day']).update(
+        {column: columns[column] + delta for column, delta in deltas.items()}, synchronize_session=False
+    )
+    if not updated:
+        db.session.execute(insert(UserActivityDaily.__table__).values(**values))
+
+def period_start(day: date, granularity: str) -> date:
+    """Primeiro dia do período (semana começando na segunda-feira)"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+def _next_period(start: date, granularity: str) -> date:
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return date(start.year + 1, 1, 1)
+
+def _period_label(start: date, granularity: str) -> str:
+    if granularity == 'month':
+        return start.strftime('%Y-%m')
+    if granularity == 'year':
+        return str(start.year)
+    return start.isoformat()
+
+def series(user_id: int, start: date, end: date, granularity: str = 'month') -> List[Dict]:
+    """Atividade do usuário por período entre `start` e `end` (inclusive).
+
+    Lê só as linhas diárias pré-agregadas do intervalo e soma por período;
+    períodos sem atividade aparecem zerados.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity deve ser uma das: {", ".join(GRANULARITIES)}')
+    if start > end:
+        raise ValueError('from deve ser anterior ou igual a to')
+
+    buckets = {}
+    current = period_start(start, granularity)
+    while current <= end:
+        if len(buckets) >= MAX_BUCKETS:
+            raise ValueError(f'Intervalo muito longo para granularity={granularity} (máximo de {MAX_BUCKETS} períodos)')
+        buckets[current] = dict.fromkeys(ACTIVITY_COLUMNS, 0)
+        current = _next_period(current, granularity)
+
+    rows = UserActivityDaily.query.filter(
+        UserActivityDaily.user_id == int(user_id),
+        UserActivityDaily.day >= start,
+        UserActivityDaily.day <= end
+    ).all()
+    for row in rows:
+        totals = buckets[period_start(row.day, granularity)]
+        for column in ACTIVITY_COLUMNS:
+            totals[column] += getattr(row, column)
+
+    return [{'period': _period_label(period, granularity), **totals} for period, totals in buckets.items()]
+
+# Eventos recuperáveis do histórico (remoções de favoritos não ficam registradas)
+BACKFILL_QUERIES = {
+    'favorites_added': "SELECT user_id, date(created_at), COUNT(*) FROM favorites "
+                       "WHERE created_at IS NOT NULL GROUP BY user_id, date(created_at)",
+    'posts': "SELECT author_id, date(created_at), COUNT(*) FROM forum_posts "
+             "WHERE created_at IS NOT NULL GROUP BY author_id, date(created_at)",
+    'replies': "SELECT author_id, date(created_at), COUNT(*) FROM forum_replies "
+               "WHERE created_at IS NOT NULL GROUP BY author_id, date(created_at)",
+    'friendships_accepted': "SELECT user_id, day, COUNT(*) FROM ("
+                            "SELECT requester_id AS user_id, date(updated_at) AS day FROM friendships "
+                            "WHERE status = 'accepted' AND updated_at IS NOT NULL "
+                            "UNION ALL "
+                            "SELECT requested_id AS user_id, date(updated_at) AS day FROM friendships "
+                            "WHERE status = 'accepted' AND updated_at IS NOT NULL"
+                            ") accepted GROUP BY user_id, day"
+}
+
+def backfill(conn) -> int:
+    """Recriar a tabela diária a partir do histórico das tabelas de origem"""
+    days = defaultdict(lambda: dict.fromkeys(ACTIVITY_COLUMNS, 0))
+    for column, query in BACKFILL_QUERIES.items():
+        for user_id, day, total in conn.execute(text(query)):
+            if day is None:
+                continue
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            days[(user_id, day)][column] += total
+
+    conn.execute(text('DELETE FROM user_activity_daily'))
+    rows = [{'user_id': user_id, 'day': day, **totals} for (user_id, day), totals in days.items()]
+    for offset in range(0, len(rows), INSERT_BATCH_SIZE):
+        conn.execute(insert(UserActivityDaily.__table__), rows[offset:offset + INSERT_BATCH_SIZE])
+    return len(rows)
+
+def repair_friendships() -> int:
+    """Recontar friendships_accepted a partir das amizades aceitas.
+
+    As demais colunas não são tocadas (remoções de favoritos, por exemplo,
+    não podem ser recuperadas do histórico). Retorna quantos dias mudaram.
+    """
+    expected = {}
+    for user_id, day, total in db.session.execute(text(BACKFILL_QUERIES['friendships_accepted'])):
+        if day is None:
+            continue
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        expected[(user_id, day)] = total
+
+    repaired = 0
+    rows = db.session.query(UserActivityDaily).filter(
+        UserActivityDaily.friendships_accepted != 0
+    ).all()
+    for row in rows:
+        total = expected.pop((row.user_id, row.day), 0)
+        if row.friendships_accepted != total:
+            row.friendships_accepted = total
+            repaired += 1
+
+    for (user_id, day), total in expected.items():
+        row = db.session.get(UserActivityDaily, (user_id, day))
+        if row is None:
+            values = dict.fromkeys(ACTIVITY_COLUMNS, 0)
+            values['friendships_accepted'] = total
+            db.session.add(UserActivityDaily(user_id=user_id, day=day, **values))
+        else:
+            row.friendships_accepted = total
+        repaired += 1
+
+    db.session.commit()
+    return repaired
+
+@click.command('activity-repair')
+def activity_repair_command():
+    """Corrigir as amizades aceitas na atividade diária a partir da tabela friendships"""
+    repaired = repair_friendships()
+    click.echo(f"✅ Atividade diária: {repaired} dias corrigidos")
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.extensions import db
+from src.models.database import CatalogItem, Favorite
+from src.services.catalog_service import normalize_title
+
+# Intervalo (em segundos) entre as sincronizações incrementais com o banco
+SYNC_INTERVAL = int(os.environ.get('AUTOCOMPLETE_SYNC_INTERVAL', '30'))
+
+# Quantas entradas do índice são examinadas, no máximo, por consulta
+MAX_SCAN = 200
+
+class PrefixIndex:
+    """Índice de prefixos de títulos em memória, com busca por bisect.
+
+    Cada título é indexado pelo início de cada palavra (já normalizado, sem
+    acentos), então "cavaleiro" encontra "O Cavaleiro das Trevas". As chaves
+    ficam em uma lista ordenada e a consulta é uma busca binária seguida de
+    uma varredura curta.
+    """
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._refs: List[Tuple[Tuple[str, str], bool]] = []
+        self._items: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+
+        self._pid = os.getpid()
+        self._built = False
+        self._synced_at = 0.0
+        self._last_favorite_id = 0
+        self._last_catalog_id = 0
+
+    def add_items(self, items: Iterable[Dict]) -> int:
+        """Adicionar (ou atualizar) itens no índice; retorna quantos mudaram"""
+        added = 0
+        with self._lock:
+            for item in items:
+                title = item.get('title')
+                if not title:
+                    continue
+                key = (item['type'], str(item['id']))
+                current = self._items.get(key)
+                if current is not None and current['title'] == title:
+                    continue
+                if current is not None:
+                    self._remove_keys(key, current['title'])
+
+                self._items[key] = {'id': self._parse_id(key[1]), 'type': item['type'], 'title': title}
+                for entry, ref in self._entries_for(key, title):
+                    position = bisect_left(self._keys, entry)
+                    self._keys.insert(position, entry)
+                    self._refs.insert(position, ref)
+                added += 1
+        return added
+
+    def suggest(self, query: str, limit: int = 8, content_type: Optional[str] = None) -> List[Dict]:
+        """Sugestões cujo título (ou alguma palavra dele) começa com a consulta"""
+        prefix = normalize_title(query)
+        if not prefix:
+            return []
+
+        starts, others = [], []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, prefix)
+            end = min(len(self._keys), position + MAX_SCAN)
+            while position < end and self._keys[position].startswith(prefix):
+                key, title_start = self._refs[position]
+                position += 1
+                if key in seen or (content_type and key[0] != content_type):
+                    continue
+                seen.add(key)
+                (starts if title_start else others).append(self._items[key])
+                if len(starts) >= limit:
+                    break
+
+        return (starts + others)[:limit]
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def ensure_synced(self) -> None:
+        """Construir o índice no primeiro uso do processo e sincronizar aos poucos"""
+        pid = os.getpid()
+        if self._pid != pid:
+            # Depois do fork cada worker mantém o próprio índice
+            with self._lock:
+                if self._pid != pid:
+                    self._keys, self._refs, self._items = [], [], {}
+                    self._built = False
+                    self._last_favorite_id = 0
+                    self._last_catalog_id = 0
+                    self._pid = pid
+
+        if self._built and time.time() - self._synced_at < SYNC_INTERVAL:
+            return
+        self._synced_at = time.time()
+
+        favorites = db.session.query(
+            Favorite.id, Favorite.content_type, Favorite.content_id, Favorite.title
+        ).filter(Favorite.id > self._last_favorite_id).order_by(Favorite.id).all()
+
+        catalog = db.session.query(
+            CatalogItem.id, CatalogItem.content_type, CatalogItem.content_id, CatalogItem.title
+        ).filter(CatalogItem.id > self._last_catalog_id).order_by(CatalogItem.id).all()
+
+        rows = [{'id': self._parse_id(c_id), 'type': c_type, 'title': title}
+                for _, c_type, c_id, title in favorites + catalog]
+
+        if not self._built:
+            self._bulk_load(rows)
+            self._built = True
+        else:
+            self.add_items(rows)
+
+        if favorites:
+            self._last_favorite_id = favorites[-1][0]
+        if catalog:
+            self._last_catalog_id = catalog[-1][0]
+
+    def _bulk_load(self, rows: List[Dict]) -> None:
+        """Carga inicial: monta as listas e ordena uma única vez"""
+        items = {}
+        for row in rows:
+            if row.get('title'):
+                items[(row['type'], str(row['id']))] = row
+
+        entries = []
+        for key, item in items.items():
+            entries.extend(self._entries_for(key, item['title']))
+        entries.sort(key=lambda entry: entry[0])
+
+        with self._lock:
+            # Itens adicionados por add_items antes da carga (ex.: resultados
+            # de busca) continuam no índice; o sort aproveita a parte que já
+            # está ordenada
+            extra = {key: item for key, item in self._items.items() if key not in items}
+            if extra:
+                items.update(extra)
+                for key, item in extra.items():
+                    entries.extend(self._entries_for(key, item['title']))
+                entries.sort(key=lambda entry: entry[0])
+
+            self._items = items
+            self._keys = [entry for entry, _ in entries]
+            self._refs = [ref for _, ref in entries]
+
+    @staticmethod
+    def _entries_for(key, title):
+        words = normalize_title(title).split()
+        entries = []
+        for index in range(len(words)):
+            entries.append((' '.join(words[index:]), (key, index == 0)))
+        return entries
+
+    def _remove_keys(self, key, title):
+        for entry, ref in self._entries_for(key, title):
+            position = bisect_left(self._keys, entry)
+            while position < len(self._keys) and self._keys[position] == entry:
+                if self._refs[position] == ref:
+                    del self._keys[position]
+                    del self._refs[position]
+                    break
+                position += 1
+
+    @staticmethod
+    def _parse_id(content_id):
+        return int(content_id) if content_id.isdigit() else content_id
+
+# Instância compartilhada pelas rotas de conteúdo
+title_index = PrefixIndex()
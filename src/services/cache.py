@@ -0,0 +1,317 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+# Tamanho máximo do cache local (por processo)
+LOCAL_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_LOCAL_MAX_ENTRIES', '1024'))
+
+# Tempo máximo que uma entrada fica no cache local. Limita por quanto tempo um
+# worker continua servindo uma resposta invalidada por outro worker.
+LOCAL_MAX_TTL = int(os.environ.get('CATALOG_CACHE_LOCAL_MAX_TTL', '60'))
+
+# Arquivo SQLite compartilhado por todos os workers do gunicorn no mesmo host
+SHARED_PATH = os.environ.get(
+    'CATALOG_CACHE_PATH',
+    os.path.join(tempfile.gettempdir(), 'myverse_catalog_cache.sqlite3')
+)
+
+# A cada quantas gravações as entradas expiradas do SQLite são descartadas
+SHARED_PURGE_EVERY = 500
+
+# Por quanto tempo após expirar uma resposta ainda pode ser servida como
+# antiga, quando o provedor está fora (circuito aberto ou falha)
+STALE_GRACE = int(os.environ.get('CATALOG_CACHE_STALE_GRACE', str(24 * 3600)))
+
+
+class ResponseCache:
+    """Cache de respostas das APIs externas em dois níveis.
+
+    O primeiro nível é um LRU em memória, limitado e exclusivo do processo.
+    O segundo é um arquivo SQLite compartilhado pelos workers do mesmo host.
+    """
+
+    def __init__(self, shared_path: Optional[str] = SHARED_PATH,
+                 local_max_entries: int = LOCAL_MAX_ENTRIES,
+                 local_max_ttl: int = LOCAL_MAX_TTL):
+        self.shared_path = shared_path
+        self.local_max_entries = local_max_entries
+        self.local_max_ttl = local_max_ttl
+
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread_state = threading.local()
+        self._sets_since_purge = 0
+        self._stats = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'stale_hits': 0,
+            'sets': 0,
+            'invalidations': 0
+        }
+
+    @staticmethod
+    def make_key(namespace: str, endpoint: str, params: Dict = None, body: str = None) -> str:
+        """Gerar a chave do cache a partir do endpoint, parâmetros e corpo"""
+        raw = json.dumps([namespace, endpoint, params or {}, body or ''], sort_keys=True)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, namespace: str, endpoint: str, params: Dict = None, body: str = None) -> Optional[Any]:
+        """Buscar uma resposta válida no cache (local e depois compartilhado)"""
+        if getattr(self._thread_state, 'bypass_reads', False):
+            return None
+        
+        key = self.make_key(namespace, endpoint, params, body)
+        now = time.time()
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                if entry['expires_at'] > now:
+                    self._local.move_to_end(key)
+                    self._stats['local_hits'] += 1
+                    return entry['value']
+                del self._local[key]
+
+        row = self._shared_get(key, now)
+        if row is not None:
+            value, expires_at = row
+            self._set_local(key, namespace, endpoint, value, expires_at, now)
+            with self._lock:
+                self._stats['shared_hits'] += 1
+            return value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def get_stale(self, namespace: str, endpoint: str, params: Dict = None, body: str = None) -> Optional[Any]:
+        """Buscar uma resposta mesmo expirada (até STALE_GRACE), no nível compartilhado"""
+        if getattr(self._thread_state, 'bypass_reads', False):
+            return None
+
+        key = self.make_key(namespace, endpoint, params, body)
+        row = self._shared_get(key, time.time() - STALE_GRACE)
+        if row is None:
+            return None
+
+        with self._lock:
+            self._stats['stale_hits'] += 1
+        return row[0]
+
+    def set(self, namespace: str, endpoint: str, value: Any, ttl: int,
+            params: Dict = None, body: str = None) -> None:
+        """Guardar uma resposta nos dois níveis do cache"""
+        if ttl <= 0:
+            return
+
+        key = self.make_key(namespace, endpoint, params, body)
+        now = time.time()
+        expires_at = now + ttl
+
+        self._set_local(key, namespace, endpoint, value, expires_at, now)
+        self._shared_set(key, namespace, endpoint, value, expires_at)
+
+        with self._lock:
+            self._stats['sets'] += 1
+            self._sets_since_purge += 1
+            purge = self._sets_since_purge >= SHARED_PURGE_EVERY
+            if purge:
+                self._sets_since_purge = 0
+
+        if purge:
+            self._shared_purge_expired()
+
+    def invalidate(self, namespace: Optional[str] = None, endpoint_prefix: Optional[str] = None) -> int:
+        """Remover entradas do cache.
+
+        Sem argumentos limpa tudo; com namespace e/ou prefixo de endpoint
+        remove apenas as entradas correspondentes. Retorna quantas entradas
+        foram removidas do nível compartilhado.
+        """
+        def matches(entry):
+            if namespace is not None and entry['namespace'] != namespace:
+                return False
+            if endpoint_prefix is not None and not entry['endpoint'].startswith(endpoint_prefix):
+                return False
+            return True
+
+        with self._lock:
+            for key in [k for k, entry in self._local.items() if matches(entry)]:
+                del self._local[key]
+            self._stats['invalidations'] += 1
+
+        return self._shared_delete(namespace, endpoint_prefix)
+
+    @contextmanager
+    def bypass_reads(self):
+        """Ignorar leituras do cache na thread atual (as gravações continuam).
+
+        Usado por quem precisa buscar dados novos na API e repassá-los aos
+        outros workers, como o refresh em segundo plano das listas.
+        """
+        previous = getattr(self._thread_state, 'bypass_reads', False)
+        self._thread_state.bypass_reads = True
+        try:
+            yield
+        finally:
+            self._thread_state.bypass_reads = previous
+
+    def acquire_lease(self, name: str, ttl: float) -> bool:
+        """Tentar obter um lease exclusivo entre os workers do host.
+
+        Retorna True se este processo ficou com o lease (ou já o tinha) e
+        False se outro processo o detém e ele ainda não expirou.
+        """
+        owner = f'{socket.gethostname()}:{os.getpid()}'
+        now = time.time()
+        try:
+            conn = self._connection()
+            if conn is None:
+                return True
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT owner, expires_at FROM leases WHERE name = ?', (name,)).fetchone()
+                if row is not None and row[0] != owner and row[1] > now:
+                    conn.execute('COMMIT')
+                    return False
+                conn.execute(
+                    'INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)',
+                    (name, owner, now + ttl)
+                )
+                conn.execute('COMMIT')
+                return True
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except Exception as e:
+            print(f"Erro ao obter lease {name}: {e}")
+            return False
+
+    def stats(self) -> Dict:
+        """Contadores de acertos e falhas do cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_entries'] = len(self._local)
+
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['local_hits'] + stats['shared_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _set_local(self, key, namespace, endpoint, value, expires_at, now):
+        entry = {
+            'namespace': namespace,
+            'endpoint': endpoint,
+            'value': value,
+            'expires_at': min(expires_at, now + self.local_max_ttl)
+        }
+        with self._lock:
+            self._local[key] = entry
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Conexão SQLite da thread atual.
+
+        A conexão é aberta sob demanda e reaberta se o processo mudou, para
+        nunca compartilhar conexões entre o master e os workers do gunicorn.
+        """
+        if not self.shared_path:
+            return None
+
+        state = self._thread_state
+        if getattr(state, 'pid', None) != os.getpid():
+            state.pid = os.getpid()
+            state.conn = None
+
+        if state.conn is None:
+            conn = sqlite3.connect(self.shared_path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            state.conn = conn
+
+        return state.conn
+
+    def _shared_get(self, key, now):
+        try:
+            conn = self._connection()
+            if conn is None:
+                return None
+            row = conn.execute(
+                'SELECT value, expires_at FROM response_cache WHERE key = ? AND expires_at > ?',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            return json.loads(row[0]), row[1]
+        except Exception as e:
+            print(f"Erro ao ler cache compartilhado: {e}")
+            return None
+
+    def _shared_set(self, key, namespace, endpoint, value, expires_at):
+        try:
+            conn = self._connection()
+            if conn is None:
+                return
+            conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, namespace, endpoint, value, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, namespace, endpoint, json.dumps(value), expires_at)
+            )
+        except Exception as e:
+            print(f"Erro ao gravar cache compartilhado: {e}")
+
+    def _shared_delete(self, namespace, endpoint_prefix) -> int:
+        try:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            sql = 'DELETE FROM response_cache WHERE 1 = 1'
+            args = []
+            if namespace is not None:
+                sql += ' AND namespace = ?'
+                args.append(namespace)
+            if endpoint_prefix is not None:
+                sql += " AND substr(endpoint, 1, ?) = ?"
+                args.extend([len(endpoint_prefix), endpoint_prefix])
+            return conn.execute(sql, args).rowcount
+        except Exception as e:
+            print(f"Erro ao invalidar cache compartilhado: {e}")
+            return 0
+
+    def _shared_purge_expired(self):
+        try:
+            conn = self._connection()
+            if conn is not None:
+                conn.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time() - STALE_GRACE,))
+        except Exception as e:
+            print(f"Erro ao limpar cache compartilhado: {e}")
+
+
+# Instância compartilhada pelos serviços de catálogo
+response_cache = ResponseCache()
@@ -0,0 +1,269 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import click
+from sqlalchemy import text
+from src.extensions import db
+from src.models.database import CatalogItem
+from src.models.migrations import dialect_name
+
+# Resultados locais mínimos para responder a busca sem consultar TMDb/IGDB
+MIN_LOCAL_RESULTS = int(os.environ.get('CATALOG_MIN_LOCAL_RESULTS', '5'))
+
+# Idade máxima (em segundos) dos dados locais antes de consultar de novo
+STALE_AFTER = int(os.environ.get('CATALOG_STALE_AFTER', str(24 * 3600)))
+
+# Intervalo mínimo entre gravações do mesmo item vindo das APIs
+RECORD_INTERVAL = int(os.environ.get('CATALOG_RECORD_INTERVAL', '3600'))
+
+# Tamanho da fila de gravação em segundo plano e do lote de upsert
+RECORD_QUEUE_SIZE = 5000
+RECORD_BATCH_SIZE = 200
+
+# Limite de itens lembrados para evitar regravações frequentes
+RECORDED_KEYS_LIMIT = 100000
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+def normalize_title(title: str) -> str:
+    """Normalizar um título para busca: minúsculo, sem acentos e pontuação"""
+    decomposed = unicodedata.normalize('NFKD', title or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_WORD.sub(' ', stripped.lower()).strip()
+
+def _item_key(item) -> Tuple[str, str]:
+    return item['type'], str(item['id'])
+
+class CatalogService:
+    """Espelho local do catálogo de filmes, séries e jogos.
+
+    É preenchido com os resultados que passam pelo TMDbService/IGDBService
+    (gravados em segundo plano) e pelo comando `flask catalog-ingest`, e
+    indexado para busca textual e por prefixo (GIN no Postgres, FTS5 no
+    SQLite).
+    """
+
+    def __init__(self):
+        self.app = None
+        self._queue = None
+        self._writer_pid = None
+        self._lock = threading.Lock()
+        self._recorded_at: Dict[Tuple[str, str], float] = {}
+
+    def init_app(self, app):
+        self.app = app
+        app.cli.add_command(catalog_ingest_command)
+
+    def record(self, items: Iterable[Dict]) -> None:
+        """Agendar a gravação de itens vindos das APIs, sem bloquear o chamador"""
+        if self.app is None:
+            return
+
+        now = time.time()
+        pending = []
+        with self._lock:
+            if len(self._recorded_at) > RECORDED_KEYS_LIMIT:
+                self._recorded_at.clear()
+            for item in items:
+                key = _item_key(item)
+                if now - self._recorded_at.get(key, 0) < RECORD_INTERVAL:
+                    continue
+                self._recorded_at[key] = now
+                pending.append(item)
+
+        if not pending:
+            return
+
+        try:
+            self._writer_queue().put_nowait(pending)
+        except queue.Full:
+            # Sob carga é melhor perder a gravação do que atrasar a resposta
+            with self._lock:
+                for item in pending:
+                    self._recorded_at.pop(_item_key(item), None)
+
+    def _writer_queue(self) -> queue.Queue:
+        """Fila e thread de gravação, criadas sob demanda em cada processo"""
+        pid = os.getpid()
+        if self._writer_pid != pid:
+            with self._lock:
+                if self._writer_pid != pid:
+                    self._queue = queue.Queue(maxsize=RECORD_QUEUE_SIZE)
+                    self._recorded_at.clear()
+                    threading.Thread(
+                        target=self._writer_loop,
+                        args=(self._queue,),
+                        name='catalog-writer',
+                        daemon=True
+                    ).start()
+                    self._writer_pid = pid
+        return self._queue
+
+    def _writer_loop(self, pending_queue: queue.Queue) -> None:
+        while True:
+            batch = list(pending_queue.get())
+            while len(batch) < RECORD_BATCH_SIZE:
+                try:
+                    batch.extend(pending_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with self.app.app_context():
+                    self.upsert_items(batch)
+            except Exception as e:
+                print(f"Erro ao gravar catálogo local: {e}")
+
+    def upsert_items(self, items: Iterable[Dict]) -> int:
+        """Inserir ou atualizar itens do catálogo em um único comando"""
+        now = datetime.utcnow()
+        rows = {}
+        for item in items:
+            if not item.get('title'):
+                continue
+            content_type, content_id = _item_key(item)
+            rows[(content_type, content_id)] = {
+                'content_type': content_type,
+                'content_id': content_id,
+                'title': item['title'][:255],
+                'search_title': normalize_title(item['title'])[:255],
+                'overview': item.get('overview') or '',
+                'poster_url': item.get('poster_url'),
+                'rating': item.get('rating') or 0,
+                'genres': json.dumps(list(item.get('genres') or [])),
+                'platforms': json.dumps(list(item.get('platforms') or [])),
+                'release_date': item.get('release_date') or '',
+                'fetched_at': now,
+                'created_at': now
+            }
+
+        if not rows:
+            return 0
+
+        dialect = dialect_name()
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            raise RuntimeError(f'Upsert do catálogo não suportado em {dialect}')
+
+        statement = insert(CatalogItem.__table__).values(list(rows.values()))
+        statement = statement.on_conflict_do_update(
+            index_elements=['content_type', 'content_id'],
+            set_={
+                column: statement.excluded[column]
+                for column in ('title', 'search_title', 'overview', 'poster_url',
+                               'rating', 'genres', 'platforms', 'release_date', 'fetched_at')
+            }
+        )
+        db.session.execute(statement)
+        db.session.commit()
+
+        return len(rows)
+
+    def search(self, query: str, limit: int = 50) -> Tuple[List[CatalogItem], bool]:
+        """Buscar no catálogo local por texto e prefixo.
+
+        Retorna os itens encontrados e se eles bastam para responder a busca
+        (quantidade mínima atingida e dados recentes).
+        """
+        tokens = normalize_title(query).split()
+        if not tokens:
+            return [], False
+
+        dialect = dialect_name()
+        if dialect == 'postgresql':
+            ts_query = ' & '.join(f'{token}:*' for token in tokens)
+            rows = db.session.execute(text(
+                "SELECT id FROM catalog_items "
+                "WHERE to_tsvector('simple', search_title) @@ to_tsquery('simple', :q) "
+                "ORDER BY ts_rank(to_tsvector('simple', search_title), to_tsquery('simple', :q)) DESC, "
+                "rating DESC NULLS LAST "
+                "LIMIT :limit"
+            ), {'q': ts_query, 'limit': limit})
+        elif dialect == 'sqlite':
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            rows = db.session.execute(text(
+                "SELECT rowid FROM catalog_items_fts WHERE catalog_items_fts MATCH :q "
+                "ORDER BY rank LIMIT :limit"
+            ), {'q': match, 'limit': limit})
+        else:
+            return [], False
+
+        ids = [row[0] for row in rows]
+        if not ids:
+            return [], False
+
+        by_id = {item.id: item for item in CatalogItem.query.filter(CatalogItem.id.in_(ids)).all()}
+        items = [by_id[item_id] for item_id in ids if item_id in by_id]
+
+        # Recente só se todos os itens forem: vale o fetched_at mais antigo
+        fetched = [item.fetched_at for item in items]
+        fresh = None not in fetched and min(fetched) >= datetime.utcnow() - timedelta(seconds=STALE_AFTER)
+
+        return items, fresh and len(items) >= MIN_LOCAL_RESULTS
+
+# Instância compartilhada
+catalog_service = CatalogService()
+
+@click.command('catalog-ingest')
+@click.option('--file', 'path', type=click.Path(exists=True, dir_okay=False),
+              help='Arquivo JSON Lines com itens já normalizados para importar.')
+@click.option('--skip-upstream', is_flag=True, help='Não consultar TMDb/IGDB.')
+def catalog_ingest_command(path: Optional[str], skip_upstream: bool):
+    """Preencher o catálogo local em lote (listas populares, gêneros e arquivo)"""
+    from src.routes.content import tmdb_service, igdb_service
+    from src.services.tmdb_service import MOVIE_GENRE_IDS, TV_GENRE_IDS
+    from src.services.igdb_service import GENRE_NAMES
+
+    total = 0
+
+    if not skip_upstream:
+        loaders = [
+            tmdb_service.get_popular_movies,
+            tmdb_service.get_popular_tv_shows,
+            igdb_service.get_popular_games
+        ]
+        loaders += [
+            lambda genre=genre: tmdb_service.get_movies_by_genre(genre)
+            for genre in MOVIE_GENRE_IDS
+        ]
+        loaders += [
+            lambda genre=genre: tmdb_service.get_tv_shows_by_genre(genre)
+            for genre in TV_GENRE_IDS
+        ]
+        # Jogos de todos os gêneros em uma única requisição ao /multiquery
+        loaders += [
+            lambda: [game for games in igdb_service.get_games_by_genres(GENRE_NAMES).values() for game in games]
+        ]
+
+        for loader in loaders:
+            try:
+                total += catalog_service.upsert_items(loader())
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erro ao importar lista: {e}")
+
+    if path:
+        batch = []
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                batch.append(json.loads(line))
+                if len(batch) >= RECORD_BATCH_SIZE:
+                    total += catalog_service.upsert_items(batch)
+                    batch = []
+        if batch:
+            total += catalog_service.upsert_items(batch)
+
+    click.echo(f'✅ {total} itens gravados no catálogo local')
@@ -0,0 +1,255 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# Janela (em segundos) usada para calcular a taxa de erros
+WINDOW_SECONDS = int(os.environ.get('CIRCUIT_WINDOW_SECONDS', '30'))
+
+# Chamadas mínimas na janela antes de avaliar a taxa de erros
+MIN_CALLS = int(os.environ.get('CIRCUIT_MIN_CALLS', '10'))
+
+# Taxa de erros que abre o circuito, e falhas seguidas que o abrem mesmo com
+# pouco tráfego
+ERROR_THRESHOLD = float(os.environ.get('CIRCUIT_ERROR_THRESHOLD', '0.5'))
+CONSECUTIVE_FAILURES = int(os.environ.get('CIRCUIT_CONSECUTIVE_FAILURES', '5'))
+
+# Tempo aberto antes da primeira sondagem; dobra a cada sondagem que falha
+OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', '5'))
+MAX_OPEN_SECONDS = float(os.environ.get('CIRCUIT_MAX_OPEN_SECONDS', '60'))
+
+# Sondagens bem-sucedidas seguidas para fechar o circuito
+HALF_OPEN_PROBES = 2
+
+# Timeout de leitura adaptativo: p99 das latências observadas vezes o fator,
+# entre o mínimo e o timeout configurado
+LATENCY_SAMPLES = 200
+MIN_LATENCY_SAMPLES = 20
+TIMEOUT_FACTOR = float(os.environ.get('CIRCUIT_TIMEOUT_FACTOR', '1.5'))
+MIN_READ_TIMEOUT = float(os.environ.get('CIRCUIT_MIN_READ_TIMEOUT', '1.0'))
+
+# Intervalo da thread que sonda os circuitos abertos
+PROBE_TICK_SECONDS = 1
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class ProbeSkipped(Exception):
+    """A sondagem não pôde ser feita agora (ex.: sem token no rate limiter)"""
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class CircuitBreaker:
+    """Circuito de um provedor e família de endpoints (ex.: tmdb:search).
+
+    Fechado, deixa as chamadas passarem e registra erros e latências. Abre
+    quando a taxa de erros na janela passa do limite (ou após falhas
+    seguidas); aberto, recusa as chamadas na hora. A sondagem (meio aberto)
+    é feita em segundo plano repetindo a última chamada que falhou, sem
+    usar requisições de usuários.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._consecutive_failures = 0
+        self._open_seconds = OPEN_SECONDS
+        self._open_until = 0.0
+        self._probe: Optional[Callable[[], object]] = None
+        self._probe_successes = 0
+        self._stats = {
+            'opened': 0,
+            'rejected': 0,
+            'probes': 0,
+            'probe_failures': 0,
+            'probes_skipped': 0
+        }
+
+    def allow(self) -> bool:
+        """Se uma chamada pode ser feita agora"""
+        if self.state == CLOSED:
+            return True
+        with self._lock:
+            self._stats['rejected'] += 1
+        return False
+
+    def read_timeout(self, configured: float) -> float:
+        """Timeout de leitura a usar, adaptado ao p99 observado"""
+        with self._lock:
+            if len(self._latencies) < MIN_LATENCY_SAMPLES:
+                return configured
+            p99 = _percentile(self._latencies, 0.99)
+        return round(min(configured, max(MIN_READ_TIMEOUT, p99 * TIMEOUT_FACTOR)), 3)
+
+    def record_success(self, duration: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._calls.append((now, True))
+            self._latencies.append(duration)
+            self._consecutive_failures = 0
+            self._prune(now)
+
+    def record_failure(self, duration: float, probe: Callable[[], object] = None) -> None:
+        """Registrar uma falha; `probe` repete a chamada para sondar o provedor"""
+        now = time.time()
+        with self._lock:
+            self._calls.append((now, False))
+            self._consecutive_failures += 1
+            self._prune(now)
+            if probe is not None:
+                self._probe = probe
+
+            if self.state != CLOSED:
+                return
+            failures = sum(1 for _, ok in self._calls if not ok)
+            too_many_errors = len(self._calls) >= MIN_CALLS and failures / len(self._calls) >= ERROR_THRESHOLD
+            if too_many_errors or self._consecutive_failures >= CONSECUTIVE_FAILURES:
+                self._open(now)
+
+        _prober.ensure_running()
+
+    def probe_due(self, now: float) -> bool:
+        return self.state != CLOSED and self._open_until <= now
+
+    def run_probe(self) -> None:
+        """Sondar o provedor (meio aberto); fecha ou reabre o circuito"""
+        with self._lock:
+            probe = self._probe
+            self.state = HALF_OPEN
+            self._stats['probes'] += 1
+
+        if probe is None:
+            # Nada para repetir: deixar o tráfego normal testar o provedor
+            self._close()
+            return
+
+        started = time.time()
+        try:
+            probe()
+        except ProbeSkipped as e:
+            # Não conta como falha: o circuito continua aberto e a sondagem
+            # é tentada de novo no próximo ciclo
+            print(f"Sondagem do circuito {self.name} adiada: {e}")
+            with self._lock:
+                self._stats['probes_skipped'] += 1
+                self.state = OPEN
+                self._open_until = time.time() + PROBE_TICK_SECONDS
+            return
+        except Exception as e:
+            print(f"Sondagem do circuito {self.name} falhou: {e}")
+            with self._lock:
+                self._stats['probe_failures'] += 1
+                self._probe_successes = 0
+                self._open_seconds = min(MAX_OPEN_SECONDS, self._open_seconds * 2)
+                self._open(time.time())
+            return
+
+        with self._lock:
+            self._latencies.append(time.time() - started)
+            self._probe_successes += 1
+            done = self._probe_successes >= HALF_OPEN_PROBES
+        if done:
+            self._close()
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            calls = len(self._calls)
+            failures = sum(1 for _, ok in self._calls if not ok)
+            latencies = list(self._latencies)
+            stats = dict(self._stats)
+            stats['open_remaining_seconds'] = round(max(0.0, self._open_until - now), 1) if self.state != CLOSED else 0.0
+
+        stats['state'] = self.state
+        stats['calls_in_window'] = calls
+        stats['error_rate'] = round(failures / calls, 4) if calls else 0.0
+        stats['p50_ms'] = round(_percentile(latencies, 0.5) * 1000, 1) if latencies else None
+        stats['p99_ms'] = round(_percentile(latencies, 0.99) * 1000, 1) if latencies else None
+        return stats
+
+    def _open(self, now: float) -> None:
+        if self.state == CLOSED:
+            self._stats['opened'] += 1
+            print(f"Circuito {self.name} aberto")
+        self.state = OPEN
+        self._open_until = now + self._open_seconds
+
+    def _close(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self._calls.clear()
+            self._consecutive_failures = 0
+            self._open_seconds = OPEN_SECONDS
+            self._probe = None
+            self._probe_successes = 0
+        print(f"Circuito {self.name} fechado")
+
+    def _prune(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - WINDOW_SECONDS:
+            self._calls.popleft()
+
+class _Prober:
+    """Thread que sonda os circuitos abertos, uma por processo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_running(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            threading.Thread(target=self._loop, name='circuit-prober', daemon=True).start()
+            self._pid = pid
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(PROBE_TICK_SECONDS)
+            now = time.time()
+            with _breakers_lock:
+                due = [breaker for breaker in _breakers.values() if breaker.probe_due(now)]
+            for breaker in due:
+                try:
+                    breaker.run_probe()
+                except Exception as e:
+                    print(f"Erro ao sondar circuito {breaker.name}: {e}")
+
+_prober = _Prober()
+
+# Circuitos por "provedor:família", criados sob demanda e mantidos por processo
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(provider: str, family: str) -> CircuitBreaker:
+    name = f'{provider}:{family}'
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+def is_provider_failure(error: Exception) -> bool:
+    """Se o erro indica falha do provedor (timeout, conexão ou 5xx).
+
+    Erros 4xx, inclusive 429, não contam: são problemas da requisição ou do
+    limite de uso, tratados pelo rate limiter.
+    """
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status is None or status >= 500
+
+def breaker_stats() -> Dict:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
@@ -0,0 +1,29 @@
+import base64
+import json
+from datetime import datetime
+from typing import List
+
+def encode_cursor(*values) -> str:
+    """Cursor opaco (base64 URL-safe) com a chave de ordenação do último item"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, *types) -> List:
+    """Valores do cursor convertidos para `types` (datetime, int, float ou str).
+
+    Levanta ValueError para cursores malformados.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError('Cursor inválido') from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError('Cursor inválido')
+
+    decoded = []
+    for value, kind in zip(values, types):
+        try:
+            decoded.append(datetime.fromisoformat(value) if kind is datetime else kind(value))
+        except (TypeError, ValueError) as e:
+            raise ValueError('Cursor inválido') from e
+    return decoded
@@ -0,0 +1,30 @@
+import json
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from src.extensions import db
+from src.models.database import FavoriteGenre
+
+def parse_genres(value) -> List[str]:
+    """Gêneros válidos (strings, sem repetição) de um JSON de favorito"""
+    try:
+        genres = json.loads(value) if value else []
+    except (TypeError, ValueError):
+        return []
+    if not isinstance(genres, list):
+        return []
+    return list(dict.fromkeys(genre[:100] for genre in genres if isinstance(genre, str) and genre))
+
+def top_genres(user_id: int, limit: int, favorite_ids: Optional[Iterable[int]] = None) -> List[Tuple[str, int]]:
+    """Gêneros mais frequentes do usuário, agregados no banco.
+
+    Retorna pares (gênero, quantidade) em ordem decrescente; `favorite_ids`
+    restringe a contagem a um subconjunto dos favoritos.
+    """
+    count = func.count(FavoriteGenre.id)
+    query = db.session.query(FavoriteGenre.genre, count).filter(FavoriteGenre.user_id == int(user_id))
+    if favorite_ids is not None:
+        query = query.filter(FavoriteGenre.favorite_id.in_(favorite_ids))
+
+    rows = query.group_by(FavoriteGenre.genre).order_by(count.desc(), FavoriteGenre.genre).limit(limit).all()
+    return [(genre, total) for genre, total in rows]
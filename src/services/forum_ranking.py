@@ -0,0 +1,109 @@
+import math
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import click
+from sqlalchemy import bindparam
+from src.extensions import db
+from src.models.database import ForumPost
+
+# Idade (em segundos) que vale tanto quanto multiplicar a atividade por 10 no
+# "hot": posts novos com pouca atividade competem com antigos muito ativos
+HOT_TIME_SCALE = int(os.environ.get('FORUM_HOT_TIME_SCALE', '45000'))
+
+# Meia-vida (em segundos) da atividade no "trending"
+TRENDING_HALF_LIFE = int(os.environ.get('FORUM_TRENDING_HALF_LIFE', str(12 * 3600)))
+
+# Peso de cada evento no trending
+POST_WEIGHT = 1.0
+REPLY_WEIGHT = 1.0
+
+# Abaixo disso o trending é zerado e o post sai do job de decaimento
+MIN_TRENDING = 0.01
+
+# Referência fixa para o componente de tempo do hot
+HOT_EPOCH = datetime(2024, 1, 1)
+
+DECAY_BATCH_SIZE = 1000
+
+def hot_score(reply_count: int, created_at: Optional[datetime]) -> float:
+    """Score "hot": log da atividade mais um termo que cresce com a data de criação.
+
+    Como o termo de tempo é absoluto, o score não precisa decair: posts mais
+    novos simplesmente começam acima.
+    """
+    created_at = created_at or datetime.utcnow()
+    return math.log10(1 + max(reply_count or 0, 0)) + (created_at - HOT_EPOCH).total_seconds() / HOT_TIME_SCALE
+
+def decayed(score: float, since: Optional[datetime], now: datetime) -> float:
+    """Valor do trending `score` (medido em `since`) decaído até `now`"""
+    if not score or since is None:
+        return score or 0.0
+    return score * 0.5 ** (max((now - since).total_seconds(), 0) / TRENDING_HALF_LIFE)
+
+def init_post(post: ForumPost, now: datetime) -> None:
+    """Scores iniciais de um post novo"""
+    post.created_at = post.created_at or now
+    post.hot_score = hot_score(0, post.created_at)
+    post.trending_score = POST_WEIGHT
+    post.trending_updated_at = now
+
+def reply_added(post: ForumPost, now: datetime) -> Dict:
+    """Valores de hot/trending após um novo reply (para o UPDATE do post)"""
+    return {
+        'hot_score': hot_score((post.reply_count or 0) + 1, post.created_at),
+        'trending_score': decayed(post.trending_score, post.trending_updated_at, now) + REPLY_WEIGHT,
+        'trending_updated_at': now
+    }
+
+def reply_removed(post: ForumPost) -> Dict:
+    """Hot após a remoção de um reply (o trending guarda a atividade que houve)"""
+    return {'hot_score': hot_score((post.reply_count or 0) - 1, post.created_at)}
+
+def decay_trending() -> Dict[str, int]:
+    """Aplicar o decaimento ao trending de todos os posts com atividade recente.
+
+    Só grava o post se ele não recebeu atividade desde a leitura
+    (trending_updated_at inalterado), então não apaga replies concorrentes.
+    """
+    started = time.time()
+    now = datetime.utcnow()
+    table = ForumPost.__table__
+    statement = table.update().where(
+        table.c.id == bindparam('post_id'),
+        table.c.trending_updated_at == bindparam('read_at')
+    ).values(trending_score=bindparam('score'), trending_updated_at=bindparam('now'))
+
+    stats = {'posts': 0, 'zeroed': 0}
+    last_id = 0
+    while True:
+        rows = db.session.query(ForumPost.id, ForumPost.trending_score, ForumPost.trending_updated_at).filter(
+            ForumPost.id > last_id,
+            ForumPost.trending_score > 0
+        ).order_by(ForumPost.id).limit(DECAY_BATCH_SIZE).all()
+        if not rows:
+            break
+
+        updates = []
+        for post_id, score, updated_at in rows:
+            value = decayed(score, updated_at, now)
+            if value < MIN_TRENDING:
+                value = 0.0
+                stats['zeroed'] += 1
+            updates.append({'post_id': post_id, 'read_at': updated_at, 'score': value, 'now': now})
+
+        db.session.execute(statement, updates)
+        db.session.commit()
+        stats['posts'] += len(rows)
+        last_id = rows[-1][0]
+
+    stats['seconds'] = round(time.time() - started, 2)
+    return stats
+
+@click.command('forum-decay')
+def forum_decay_command():
+    """Decair o trending do fórum (rodar periodicamente, ex.: a cada 15 minutos)"""
+    stats = decay_trending()
+    click.echo(f"✅ Trending atualizado em {stats['posts']} posts ({stats['zeroed']} zerados, {stats['seconds']}s)")
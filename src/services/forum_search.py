@@ -0,0 +1,194 @@
+import html
+import os
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+from src.extensions import db
+from src.models.database import ForumPost, ForumReply
+from src.models.migrations import dialect_name
+from src.services.catalog_service import normalize_title
+from src.services.cursors import decode_cursor, encode_cursor
+
+# Ocorrências mais recentes consideradas por tabela antes do ranking (limita
+# o custo de termos muito comuns a um valor fixo)
+MAX_CANDIDATES = int(os.environ.get('FORUM_SEARCH_MAX_CANDIDATES', '2000'))
+
+# Configuração de texto do Postgres (stemming em português)
+TS_CONFIG = 'portuguese'
+
+# Marcadores do destaque: trocados por <mark> depois de escapar o HTML do texto
+_START, _STOP = '\x01', '\x02'
+
+_POST_VECTOR = (
+    f"setweight(to_tsvector('{TS_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{TS_CONFIG}', coalesce(content, '')), 'B')"
+)
+_REPLY_VECTOR = f"to_tsvector('{TS_CONFIG}', coalesce(content, ''))"
+
+def post_rowid(post_id: int) -> int:
+    """Rowid do post na tabela FTS5 (posts pares, replies ímpares)"""
+    return post_id * 2
+
+def reply_rowid(reply_id: int) -> int:
+    return reply_id * 2 + 1
+
+def index_post(post: ForumPost) -> None:
+    """Atualizar o índice de busca do post, na transação atual"""
+    db.session.flush()
+    dialect = dialect_name()
+    if dialect == 'postgresql':
+        db.session.execute(text(f"UPDATE forum_posts SET search_vector = {_POST_VECTOR} WHERE id = :id"), {'id': post.id})
+    elif dialect == 'sqlite':
+        _replace_fts_row(post_rowid(post.id), post.title, post.content)
+
+def index_reply(reply: ForumReply) -> None:
+    """Atualizar o índice de busca do reply, na transação atual"""
+    db.session.flush()
+    dialect = dialect_name()
+    if dialect == 'postgresql':
+        db.session.execute(text(f"UPDATE forum_replies SET search_vector = {_REPLY_VECTOR} WHERE id = :id"), {'id': reply.id})
+    elif dialect == 'sqlite':
+        _replace_fts_row(reply_rowid(reply.id), '', reply.content)
+
+def _replace_fts_row(rowid: int, title: str, content: str) -> None:
+    db.session.execute(text("DELETE FROM forum_search_fts WHERE rowid = :rowid"), {'rowid': rowid})
+    db.session.execute(
+        text("INSERT INTO forum_search_fts (rowid, title, content) VALUES (:rowid, :title, :content)"),
+        {'rowid': rowid, 'title': title, 'content': content}
+    )
+
+_POSTGRES_SEARCH = """
+WITH q AS (SELECT websearch_to_tsquery('{config}', :q) AS query),
+hits AS (
+    (SELECT 'post' AS kind, p.id AS id, p.id AS post_id, ts_rank(p.search_vector, q.query)::float8 AS score
+     FROM forum_posts p, q
+     WHERE p.search_vector @@ q.query AND p.is_active = :active {category}
+     ORDER BY p.id DESC LIMIT :candidates)
+    UNION ALL
+    (SELECT 'reply' AS kind, r.id AS id, r.post_id AS post_id, ts_rank(r.search_vector, q.query)::float8 AS score
+     FROM forum_replies r JOIN forum_posts p ON p.id = r.post_id, q
+     WHERE r.search_vector @@ q.query AND r.is_active = :active AND p.is_active = :active {category}
+     ORDER BY r.id DESC LIMIT :candidates)
+),
+page AS (
+    SELECT * FROM hits {cursor}
+    ORDER BY score DESC, kind DESC, id DESC LIMIT :limit
+)
+SELECT page.kind, page.id, page.post_id, page.score,
+       CASE WHEN page.kind = 'post' THEN ts_headline('{config}', p.title, q.query, :title_options) END,
+       ts_headline('{config}', COALESCE(r.content, p.content), q.query, :content_options)
+FROM page
+JOIN forum_posts p ON p.id = page.post_id
+LEFT JOIN forum_replies r ON page.kind = 'reply' AND r.id = page.id, q
+ORDER BY page.score DESC, page.kind DESC, page.id DESC
+"""
+
+_SQLITE_SEARCH = """
+WITH matches AS (
+    SELECT rowid, CASE WHEN rowid % 2 = 0 THEN 'post' ELSE 'reply' END AS kind,
+           rowid / 2 AS id,
+           -bm25(forum_search_fts, 10.0, 1.0) AS score
+    FROM forum_search_fts WHERE forum_search_fts MATCH :q
+),
+hits AS (
+    SELECT matches.rowid, matches.kind, matches.id, p.id AS post_id, matches.score,
+           ROW_NUMBER() OVER (PARTITION BY matches.kind ORDER BY matches.id DESC) AS recency
+    FROM matches
+    LEFT JOIN forum_replies r ON matches.kind = 'reply' AND r.id = matches.id
+    JOIN forum_posts p ON p.id = COALESCE(r.post_id, matches.id)
+    WHERE p.is_active = :active AND (matches.kind = 'post' OR r.is_active = :active) {category}
+),
+page AS (
+    SELECT * FROM hits
+    WHERE recency <= :candidates {cursor}
+    ORDER BY score DESC, kind DESC, id DESC LIMIT :limit
+)
+SELECT page.kind, page.id, page.post_id, page.score,
+       highlight(forum_search_fts, 0, :start, :stop),
+       snippet(forum_search_fts, 1, :start, :stop, '…', 32)
+FROM page
+JOIN forum_search_fts ON forum_search_fts.rowid = page.rowid
+WHERE forum_search_fts MATCH :q
+ORDER BY page.score DESC, page.kind DESC, page.id DESC
+"""
+
+def search(query: str, category: Optional[str] = None, cursor: Optional[str] = None,
+           limit: int = 20) -> Tuple[List[Dict], Optional[str]]:
+    """Buscar posts e replies ativos, do mais relevante para o menos.
+
+    Retorna os resultados da página (com trechos destacados) e o cursor da
+    próxima página. Levanta ValueError para cursores inválidos.
+    """
+    params = {'active': True, 'limit': limit + 1, 'candidates': MAX_CANDIDATES}
+    filters = {'category': '', 'cursor': ''}
+
+    if category:
+        filters['category'] = 'AND p.category = :category'
+        params['category'] = category
+
+    dialect = dialect_name()
+    if cursor:
+        params['cursor_score'], params['cursor_kind'], params['cursor_id'] = decode_cursor(cursor, float, str, int)
+        keyword = 'WHERE' if dialect == 'postgresql' else 'AND'
+        filters['cursor'] = f'{keyword} (score, kind, id) < (:cursor_score, :cursor_kind, :cursor_id)'
+
+    if dialect == 'postgresql':
+        params.update({
+            'q': query,
+            'title_options': f'StartSel={_START}, StopSel={_STOP}, HighlightAll=true',
+            'content_options': f'StartSel={_START}, StopSel={_STOP}, MaxWords=35, MinWords=15'
+        })
+        statement = _POSTGRES_SEARCH.format(config=TS_CONFIG, **filters)
+    elif dialect == 'sqlite':
+        tokens = normalize_title(query).split()
+        if not tokens:
+            return [], None
+        params.update({'q': ' '.join(f'"{token}"' for token in tokens), 'start': _START, 'stop': _STOP})
+        statement = _SQLITE_SEARCH.format(**filters)
+    else:
+        return [], None
+
+    rows = db.session.execute(text(statement), params).fetchall()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    posts = {post.id: post for post in ForumPost.query.options(joinedload(ForumPost.author)).filter(
+        ForumPost.id.in_({row[2] for row in rows})
+    )} if rows else {}
+    reply_ids = [row[1] for row in rows if row[0] == 'reply']
+    replies = {reply.id: reply for reply in ForumReply.query.options(joinedload(ForumReply.author)).filter(
+        ForumReply.id.in_(reply_ids)
+    )} if reply_ids else {}
+
+    results = []
+    for kind, item_id, post_id, score, title_hl, content_hl in rows:
+        post = posts.get(post_id)
+        item = post if kind == 'post' else replies.get(item_id)
+        if post is None or item is None:
+            continue
+
+        results.append({
+            'type': kind,
+            'id': item_id,
+            'post_id': post_id,
+            'title': post.title,
+            'category': post.category,
+            'author': {'id': item.author.id, 'username': item.author.username} if item.author else None,
+            'created_at': item.created_at.isoformat() if item.created_at else None,
+            'score': score,
+            'highlight': {
+                'title': _highlight(title_hl) if kind == 'post' and title_hl else html.escape(post.title),
+                'content': _highlight(content_hl or '')
+            }
+        })
+
+    next_cursor = None
+    if has_next:
+        kind, item_id, _, score, _, _ = rows[-1]
+        next_cursor = encode_cursor(score, kind, item_id)
+    return results, next_cursor
+
+def _highlight(value: str) -> str:
+    """Escapar o HTML do texto e trocar os marcadores por <mark>"""
+    return html.escape(value).replace(_START, '<mark>').replace(_STOP, '</mark>')
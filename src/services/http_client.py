@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from typing import Callable, Optional, Tuple, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Conexões mantidas abertas por host em cada worker
+POOL_SIZE = int(os.environ.get('CATALOG_HTTP_POOL_SIZE', '10'))
+
+# Novas tentativas em falhas de conexão e respostas 429/5xx
+MAX_RETRIES = int(os.environ.get('CATALOG_HTTP_RETRIES', '2'))
+BACKOFF_FACTOR = float(os.environ.get('CATALOG_HTTP_BACKOFF', '0.3'))
+
+# Timeouts separados de conexão e de leitura (em segundos)
+CONNECT_TIMEOUT = float(os.environ.get('CATALOG_CONNECT_TIMEOUT', '3.05'))
+READ_TIMEOUT = float(os.environ.get('CATALOG_READ_TIMEOUT', '10'))
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Retry-After acima disso (em segundos) não é esperado: a tentativa é abandonada
+MAX_RETRY_AFTER = 2.0
+
+T = TypeVar('T')
+
+
+def build_session(pool_size: int = POOL_SIZE, max_retries: int = MAX_RETRIES,
+                  backoff_factor: float = BACKOFF_FACTOR) -> requests.Session:
+    """Criar uma sessão HTTP com pool de conexões keep-alive.
+
+    O adapter só repete falhas de conexão, em que a requisição não chegou ao
+    provedor. Respostas 429/5xx são repetidas por `SessionHolder.call`, que
+    passa cada nova tentativa pelo rate limiter.
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=backoff_factor,
+        # As consultas do IGDB são POSTs somente de leitura
+        allowed_methods=frozenset(['GET', 'POST']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class SessionHolder:
+    """Guarda a sessão HTTP de um serviço, criada sob demanda em cada processo.
+
+    O app roda com `gunicorn --preload`, então os serviços são instanciados no
+    master antes do fork. A sessão só é criada no primeiro uso dentro do
+    worker e é recriada se o PID mudar, para que os workers nunca dividam
+    sockets herdados do master.
+    """
+
+    def __init__(self, pool_size: int = POOL_SIZE, max_retries: int = MAX_RETRIES,
+                 backoff_factor: float = BACKOFF_FACTOR,
+                 connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self) -> requests.Session:
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = build_session(self.pool_size, self.max_retries, self.backoff_factor)
+                    self._pid = pid
+        return self._session
+
+    def call(self, request: Callable[[], T], acquire: Callable[[], object]) -> T:
+        """Executar `request`, repetindo em respostas 429/5xx.
+
+        `acquire` (o rate limiter do provedor) é chamado antes de cada nova
+        tentativa, então as repetições contam no limite como qualquer outra
+        requisição. O token da primeira tentativa é obtido por quem chama.
+        """
+        attempt = 0
+        while True:
+            try:
+                return request()
+            except requests.HTTPError as e:
+                delay = self._retry_delay(e.response, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                try:
+                    acquire()
+                except Exception:
+                    # Sem token para repetir: vale o erro original
+                    raise e
+
+    def _retry_delay(self, response, attempt: int) -> Optional[float]:
+        """Espera antes da próxima tentativa, ou None se não deve repetir"""
+        if attempt >= self.max_retries or response is None or response.status_code not in RETRY_STATUS_CODES:
+            return None
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            delay = float(retry_after)
+            return delay if delay <= MAX_RETRY_AFTER else None
+        return self.backoff_factor * (2 ** attempt)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None and self._pid == os.getpid():
+                self._session.close()
+            self._session = None
+            self._pid = None
@@ -1,6 +1,84 @@
-import requests
 import os
-from typing import List, Dict, Optional
+import re
+import threading
+import time
+from datetime import date
+from typing import List, Dict, Iterable, Optional, Tuple
+from src.services.cache import response_cache
+from src.services.circuit_breaker import ProbeSkipped, get_breaker, is_provider_failure
+from src.services.http_client import SessionHolder
+from src.services.rate_limiter import RateLimitExceeded, igdb_limiter
+from src.services.records import CatalogRecord
+from src.services.singleflight import coalesce
+
+# TTL (em segundos) das respostas em cache, por endpoint.
+# Buscas textuais usam SEARCH_CACHE_TTL, que é menor.
+CACHE_TTLS = {
+    'games': 3600,
+    'genres': 24 * 3600,
+    'platforms': 24 * 3600
+}
+DEFAULT_CACHE_TTL = 600
+SEARCH_CACHE_TTL = 600
+
+# Limite de subconsultas por chamada ao /multiquery do IGDB
+MULTIQUERY_LIMIT = 10
+
+# Tabelas de referência (IDs de gêneros e plataformas) mudam raramente
+REFERENCE_TTL = 24 * 3600
+REFERENCE_RETRY = 300
+
+GAME_FIELDS = 'fields name, summary, first_release_date, cover.url, rating, genres.name, platforms.name;'
+
+_MULTIQUERY_ENDPOINT = re.compile(r'query (\w+) "')
+
+# Mapear nomes de gêneros comuns para os nomes do IGDB
+GENRE_NAMES = {
+    'Action': 'Action',
+    'Adventure': 'Adventure',
+    'RPG': 'Role-playing (RPG)',
+    'Strategy': 'Strategy',
+    'Shooter': 'Shooter',
+    'Sports': 'Sport',
+    'Racing': 'Racing',
+    'Puzzle': 'Puzzle',
+    'Platform': 'Platform',
+    'Fighting': 'Fighting',
+    'Simulation': 'Simulator'
+}
+
+# Máximo de plataformas por jogo nos resultados
+MAX_PLATFORMS = 5
+
+def normalize_igdb_results(data: List[Dict]) -> List[CatalogRecord]:
+    """Converter uma lista de jogos do IGDB em registros, em uma passada"""
+    records = []
+    append = records.append
+    for game in data:
+        # Converter timestamp para data
+        timestamp = game.get('first_release_date')
+        release_date = date.fromtimestamp(timestamp).isoformat() if timestamp else ''
+        
+        # Processar URL da capa
+        cover = game.get('cover')
+        cover_url = None
+        if cover and cover.get('url'):
+            cover_url = 'https:' + cover['url'].replace('t_thumb', 't_cover_big')
+        
+        rating = game.get('rating')
+        append(CatalogRecord(
+            game['id'],
+            'game',
+            game['name'],
+            game.get('summary', ''),
+            release_date,
+            cover_url,
+            round(rating / 10, 1) if rating else 0,  # Converter de 0-100 para 0-10
+            tuple(genre['name'] for genre in game.get('genres') or ()),
+            tuple(platform['name'] for platform in (game.get('platforms') or ())[:MAX_PLATFORMS])
+        ))
+    
+    return records
 
 class IGDBService:
     def __init__(self):
@@ -8,31 +86,129 @@ class IGDBService:
         self.access_token = os.environ.get('IGDB_ACCESS_TOKEN')
         self.base_url = 'https://api.igdb.com/v4'
         
+        # Sessão keep-alive com pool de conexões, criada após o fork do gunicorn
+        self.http = SessionHolder()
+        
+        # Funções chamadas com cada lista de resultados normalizados
+        self.result_listeners = []
+        self._request_state = threading.local()
+        
+        # Tabelas de IDs de gêneros e plataformas (carregadas sob demanda)
+        self._reference = None
+        self._reference_loaded_at = 0.0
+        self._reference_lock = threading.Lock()
+        
     def _make_request(self, endpoint: str, query: str) -> Optional[List[Dict]]:
         """Fazer requisição para a API do IGDB"""
+        self._request_state.mock = False
+        
         if not self.client_id or not self.access_token:
             # Retornar dados mock se não houver credenciais
             return self._get_mock_data(endpoint, query)
         
+        cache_body = query.strip()
+        cached = response_cache.get('igdb', endpoint, body=cache_body)
+        if cached is not None:
+            return cached
+        
+        breaker = get_breaker('igdb', 'search' if 'search ' in query else endpoint)
+        if not breaker.allow():
+            # Circuito aberto: resposta antiga do cache ou vazia, sem esperar
+            return response_cache.get_stale('igdb', endpoint, body=cache_body)
+        
         try:
-            url = f"{self.base_url}/{endpoint}"
-            headers = {
-                'Client-ID': self.client_id,
-                'Authorization': f'Bearer {self.access_token}',
-                'Accept': 'application/json'
-            }
-            
-            response = requests.post(url, headers=headers, data=query, timeout=10)
-            response.raise_for_status()
-            
-            return response.json()
+            igdb_limiter.acquire()
+        except RateLimitExceeded as e:
+            # Sem token a tempo: resposta vazia em vez de dados mock
+            print(f"Requisição IGDB descartada: {e}")
+            return None
+        
+        started = time.time()
+        try:
+            read_timeout = breaker.read_timeout(self.http.timeout[1])
+            data = self.http.call(lambda: self._fetch(endpoint, query, read_timeout), igdb_limiter.acquire)
+            breaker.record_success(time.time() - started)
+            return data
             
         except Exception as e:
             print(f"Erro na requisição IGDB: {e}")
+            
+            if is_provider_failure(e):
+                breaker.record_failure(
+                    time.time() - started,
+                    probe=lambda: self._probe(endpoint, query)
+                )
+            
+            stale = response_cache.get_stale('igdb', endpoint, body=cache_body)
+            if stale is not None:
+                return stale
+            
+            # 429 mesmo após as novas tentativas: não mascarar com dados mock
+            if getattr(getattr(e, 'response', None), 'status_code', None) == 429:
+                return None
+            
             return self._get_mock_data(endpoint, query)
     
+    def _fetch(self, endpoint: str, query: str, read_timeout: float) -> List[Dict]:
+        """Chamar a API e guardar a resposta no cache (erros são propagados)"""
+        url = f"{self.base_url}/{endpoint}"
+        headers = {
+            'Client-ID': self.client_id,
+            'Authorization': f'Bearer {self.access_token}',
+            'Accept': 'application/json'
+        }
+        
+        response = self.http.get().post(url, headers=headers, data=query, timeout=(self.http.timeout[0], read_timeout))
+        response.raise_for_status()
+        
+        data = response.json()
+        response_cache.set('igdb', endpoint, data, self._cache_ttl(endpoint, query), body=query.strip())
+        
+        return data
+    
+    def _probe(self, endpoint: str, query: str) -> None:
+        """Sondagem do circuito: consome um token do rate limiter como as demais chamadas"""
+        try:
+            igdb_limiter.acquire()
+        except RateLimitExceeded as e:
+            raise ProbeSkipped(str(e)) from e
+        self._fetch(endpoint, query, self.http.timeout[1])
+    
+    def add_result_listener(self, listener) -> None:
+        """Registrar uma função que recebe os resultados normalizados"""
+        self.result_listeners.append(listener)
+    
+    def _publish(self, items: List[Dict]) -> None:
+        if getattr(self._request_state, 'mock', False):
+            return
+        for listener in self.result_listeners:
+            try:
+                listener(items)
+            except Exception as e:
+                print(f"Erro ao repassar resultados: {e}")
+    
+    def _cache_ttl(self, endpoint: str, query: str) -> int:
+        """TTL do cache para o endpoint e a consulta"""
+        if 'search ' in query:
+            return SEARCH_CACHE_TTL
+        if endpoint == 'multiquery':
+            # Vale o menor TTL entre as subconsultas
+            endpoints = _MULTIQUERY_ENDPOINT.findall(query)
+            return min((CACHE_TTLS.get(e, DEFAULT_CACHE_TTL) for e in endpoints), default=DEFAULT_CACHE_TTL)
+        return CACHE_TTLS.get(endpoint, DEFAULT_CACHE_TTL)
+    
+    def invalidate_cache(self, endpoint_prefix: str = None) -> int:
+        """Invalidar respostas do IGDB em cache (todas ou por prefixo)"""
+        return response_cache.invalidate('igdb', endpoint_prefix)
+    
     def _get_mock_data(self, endpoint: str, query: str) -> List[Dict]:
         """Retornar dados mock quando API não está disponível"""
+        # Dados mock nunca são repassados aos listeners (ex.: catálogo local)
+        self._request_state.mock = True
+        
+        if endpoint == 'multiquery':
+            return []
+        
         if 'search' in query.lower() or 'batman' in query.lower():
             return [
                 {
@@ -89,11 +265,111 @@ class IGDBService:
         else:
             return []
     
-    def search_games(self, query: str) -> List[Dict]:
+    def multiquery(self, queries: Dict[str, Tuple[str, str]]) -> Dict[str, List[Dict]]:
+        """Executar várias consultas em uma única requisição ao /multiquery.
+        
+        Recebe {nome: (endpoint, consulta)} e retorna {nome: resultados}.
+        Acima de MULTIQUERY_LIMIT subconsultas, são feitas requisições em lotes.
+        """
+        results = {name: [] for name in queries}
+        items = list(queries.items())
+        
+        for start in range(0, len(items), MULTIQUERY_LIMIT):
+            body = '\n'.join(
+                f'query {endpoint} "{name}" {{ {" ".join(query.split())} }};'
+                for name, (endpoint, query) in items[start:start + MULTIQUERY_LIMIT]
+            )
+            data = self._make_request('multiquery', body)
+            
+            for entry in data or []:
+                if isinstance(entry, dict) and entry.get('name') in results:
+                    results[entry['name']] = entry.get('result') or []
+        
+        return results
+    
+    def _reference_tables(self) -> Dict[str, Dict[str, int]]:
+        """Tabelas nome -> ID de gêneros e plataformas do IGDB.
+        
+        Carregadas com um único /multiquery e mantidas em memória (e no cache
+        compartilhado) por REFERENCE_TTL.
+        """
+        if self._reference is not None and time.time() - self._reference_loaded_at < REFERENCE_TTL:
+            return self._reference
+        
+        with self._reference_lock:
+            now = time.time()
+            if self._reference is not None and now - self._reference_loaded_at < REFERENCE_TTL:
+                return self._reference
+            
+            data = self.multiquery({
+                'genres': ('genres', 'fields id, name, slug; limit 500;'),
+                'platforms': ('platforms', 'fields id, name, abbreviation; limit 500;')
+            })
+            
+            genres = {}
+            for genre in data['genres']:
+                genres[genre['name'].lower()] = genre['id']
+                if genre.get('slug'):
+                    genres[genre['slug'].lower()] = genre['id']
+            
+            platforms = {}
+            for platform in data['platforms']:
+                platforms[platform['name'].lower()] = platform['id']
+                if platform.get('abbreviation'):
+                    platforms[platform['abbreviation'].lower()] = platform['id']
+            
+            if genres or platforms or self._reference is None:
+                self._reference = {'genres': genres, 'platforms': platforms}
+            
+            if genres and platforms:
+                self._reference_loaded_at = now
+            else:
+                # Tentar de novo em alguns minutos se a API falhou
+                self._reference_loaded_at = now - REFERENCE_TTL + REFERENCE_RETRY
+            
+            return self._reference
+    
+    def genre_id(self, genre_name: str) -> Optional[int]:
+        """ID do IGDB para um nome de gênero (aceita os nomes de GENRE_NAMES)"""
+        mapped_genre = GENRE_NAMES.get(genre_name, genre_name)
+        return self._reference_tables()['genres'].get(mapped_genre.lower())
+    
+    def platform_id(self, platform_name: str) -> Optional[int]:
+        """ID do IGDB para um nome ou abreviação de plataforma"""
+        return self._reference_tables()['platforms'].get(platform_name.lower())
+    
+    def _genre_query(self, genre_name: str, platform: Optional[str] = None) -> str:
+        """Consulta de jogos por gênero filtrando por IDs numéricos"""
+        filters = []
+        
+        genre_id = self.genre_id(genre_name)
+        if genre_id:
+            filters.append(f'genres = ({genre_id})')
+        else:
+            # Sem a tabela de IDs, filtrar pelo nome (mais lento no IGDB)
+            mapped_genre = GENRE_NAMES.get(genre_name, genre_name).replace('"', '')
+            filters.append(f'genres.name = "{mapped_genre}"')
+        
+        if platform:
+            platform_id = self.platform_id(platform)
+            if platform_id:
+                filters.append(f'platforms = ({platform_id})')
+        
+        filters.append('rating > 70')
+        
+        return f'''
+        {GAME_FIELDS}
+        where {' & '.join(filters)};
+        sort rating desc;
+        limit 10;
+        '''
+    
+    @coalesce
+    def search_games(self, query: str) -> List[CatalogRecord]:
         """Buscar jogos"""
         igdb_query = f'''
         search "{query}";
-        fields name, summary, first_release_date, cover.url, rating, genres.name, platforms.name;
+        {GAME_FIELDS}
         limit 10;
         '''
         
@@ -102,47 +378,16 @@ class IGDBService:
         if not data:
             return []
         
-        games = []
-        for game in data:
-            # Converter timestamp para data
-            release_date = ''
-            if game.get('first_release_date'):
-                from datetime import datetime
-                release_date = datetime.fromtimestamp(game['first_release_date']).strftime('%Y-%m-%d')
-            
-            # Processar URL da capa
-            cover_url = None
-            if game.get('cover') and game['cover'].get('url'):
-                cover_url = f"https:{game['cover']['url'].replace('t_thumb', 't_cover_big')}"
-            
-            # Processar gêneros
-            genres = []
-            if game.get('genres'):
-                genres = [genre['name'] for genre in game['genres']]
-            
-            # Processar plataformas
-            platforms = []
-            if game.get('platforms'):
-                platforms = [platform['name'] for platform in game['platforms'][:5]]  # Limitar a 5 plataformas
-            
-            games.append({
-                'id': game['id'],
-                'type': 'game',
-                'title': game['name'],
-                'overview': game.get('summary', ''),
-                'release_date': release_date,
-                'poster_url': cover_url,
-                'rating': round(game.get('rating', 0) / 10, 1) if game.get('rating') else 0,  # Converter de 0-100 para 0-10
-                'genres': genres,
-                'platforms': platforms
-            })
+        games = normalize_igdb_results(data)
         
+        self._publish(games)
         return games
     
-    def get_popular_games(self) -> List[Dict]:
+    @coalesce
+    def get_popular_games(self) -> List[CatalogRecord]:
         """Buscar jogos populares"""
-        igdb_query = '''
-        fields name, summary, first_release_date, cover.url, rating, genres.name, platforms.name;
+        igdb_query = f'''
+        {GAME_FIELDS}
         sort rating desc;
         where rating > 80 & first_release_date > 1420070400;
         limit 20;
@@ -153,108 +398,40 @@ class IGDBService:
         if not data:
             return []
         
-        games = []
-        for game in data:
-            # Converter timestamp para data
-            release_date = ''
-            if game.get('first_release_date'):
-                from datetime import datetime
-                release_date = datetime.fromtimestamp(game['first_release_date']).strftime('%Y-%m-%d')
-            
-            # Processar URL da capa
-            cover_url = None
-            if game.get('cover') and game['cover'].get('url'):
-                cover_url = f"https:{game['cover']['url'].replace('t_thumb', 't_cover_big')}"
-            
-            # Processar gêneros
-            genres = []
-            if game.get('genres'):
-                genres = [genre['name'] for genre in game['genres']]
-            
-            # Processar plataformas
-            platforms = []
-            if game.get('platforms'):
-                platforms = [platform['name'] for platform in game['platforms'][:5]]
-            
-            games.append({
-                'id': game['id'],
-                'type': 'game',
-                'title': game['name'],
-                'overview': game.get('summary', ''),
-                'release_date': release_date,
-                'poster_url': cover_url,
-                'rating': round(game.get('rating', 0) / 10, 1) if game.get('rating') else 0,
-                'genres': genres,
-                'platforms': platforms
-            })
+        games = normalize_igdb_results(data)
         
+        self._publish(games)
         return games
     
-    def get_games_by_genre(self, genre_name: str) -> List[Dict]:
-        """Buscar jogos por gênero"""
-        # Mapear nomes de gêneros comuns
-        genre_map = {
-            'Action': 'Action',
-            'Adventure': 'Adventure', 
-            'RPG': 'Role-playing (RPG)',
-            'Strategy': 'Strategy',
-            'Shooter': 'Shooter',
-            'Sports': 'Sport',
-            'Racing': 'Racing',
-            'Puzzle': 'Puzzle',
-            'Platform': 'Platform',
-            'Fighting': 'Fighting',
-            'Simulation': 'Simulator'
-        }
-        
-        mapped_genre = genre_map.get(genre_name, genre_name)
-        
-        igdb_query = f'''
-        fields name, summary, first_release_date, cover.url, rating, genres.name, platforms.name;
-        where genres.name = "{mapped_genre}" & rating > 70;
-        sort rating desc;
-        limit 10;
-        '''
+    @coalesce
+    def get_games_by_genre(self, genre_name: str, platform: Optional[str] = None) -> List[CatalogRecord]:
+        """Buscar jogos por gênero (e opcionalmente plataforma)"""
+        igdb_query = self._genre_query(genre_name, platform)
         
         data = self._make_request('games', igdb_query)
         
         if not data:
             return []
         
-        games = []
-        for game in data:
-            # Converter timestamp para data
-            release_date = ''
-            if game.get('first_release_date'):
-                from datetime import datetime
-                release_date = datetime.fromtimestamp(game['first_release_date']).strftime('%Y-%m-%d')
-            
-            # Processar URL da capa
-            cover_url = None
-            if game.get('cover') and game['cover'].get('url'):
-                cover_url = f"https:{game['cover']['url'].replace('t_thumb', 't_cover_big')}"
-            
-            # Processar gêneros
-            genres = []
-            if game.get('genres'):
-                genres = [genre['name'] for genre in game['genres']]
-            
-            # Processar plataformas
-            platforms = []
-            if game.get('platforms'):
-                platforms = [platform['name'] for platform in game['platforms'][:5]]
-            
-            games.append({
-                'id': game['id'],
-                'type': 'game',
-                'title': game['name'],
-                'overview': game.get('summary', ''),
-                'release_date': release_date,
-                'poster_url': cover_url,
-                'rating': round(game.get('rating', 0) / 10, 1) if game.get('rating') else 0,
-                'genres': genres,
-                'platforms': platforms
-            })
+        games = normalize_igdb_results(data)
         
+        self._publish(games)
         return games
-
+    
+    def get_games_by_genres(self, genre_names: Iterable[str]) -> Dict[str, List[CatalogRecord]]:
+        """Buscar jogos de vários gêneros em uma única requisição (/multiquery)"""
+        genre_names = list(dict.fromkeys(genre_names))
+        queries = {
+            genre_name.replace('"', ''): ('games', self._genre_query(genre_name))
+            for genre_name in genre_names
+        }
+        
+        data = self.multiquery(queries)
+        
+        results = {}
+        for genre_name in genre_names:
+            games = normalize_igdb_results(data.get(genre_name.replace('"', '')) or [])
+            self._publish(games)
+            results[genre_name] = games
+        
+        return results
@@ -0,0 +1,187 @@
+import json
+import os
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+import click
+import numpy as np
+from scipy import sparse
+from sqlalchemy import and_, delete, insert, or_
+from src.extensions import db
+from src.models.database import Favorite, ItemNeighbors
+
+# Vizinhos guardados por item
+TOP_K = int(os.environ.get('ITEM_SIMILARITY_TOP_K', '20'))
+
+# Usuários em comum mínimos para dois itens serem considerados similares
+MIN_COOCCURRENCE = int(os.environ.get('ITEM_SIMILARITY_MIN_COOCCURRENCE', '1'))
+
+# Usuários com mais favoritos que isso são ignorados (custo quadrático e
+# pouco sinal, ex.: contas que favoritam tudo)
+MAX_USER_ITEMS = int(os.environ.get('ITEM_SIMILARITY_MAX_USER_ITEMS', '1000'))
+
+# Itens processados por bloco da multiplicação (limita a memória do job)
+BLOCK_SIZE = int(os.environ.get('ITEM_SIMILARITY_BLOCK_SIZE', '1000'))
+
+# Linhas lidas por vez da tabela de favoritos e gravadas por comando
+READ_BATCH_SIZE = 50000
+WRITE_BATCH_SIZE = 1000
+
+ItemKey = Tuple[str, str]
+
+def build_cooccurrence(rows: Iterable[Tuple[int, str, str]]) -> Tuple[sparse.csr_matrix, List[ItemKey]]:
+    """Montar a matriz usuários x itens (binária) a partir de (usuário, tipo, id)"""
+    user_index: Dict[int, int] = {}
+    item_index: Dict[ItemKey, int] = {}
+    user_column, item_column = array('i'), array('i')
+
+    for user_id, content_type, content_id in rows:
+        user_column.append(user_index.setdefault(user_id, len(user_index)))
+        item_column.append(item_index.setdefault((content_type, content_id), len(item_index)))
+
+    users = np.frombuffer(user_column, dtype=np.intc)
+    items = np.frombuffer(item_column, dtype=np.intc)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(users), dtype=np.float32), (users, items)),
+        shape=(len(user_index), len(item_index))
+    )
+    # Favoritos duplicados não contam duas vezes
+    matrix.data[:] = 1
+
+    if MAX_USER_ITEMS:
+        user_items = np.diff(matrix.indptr)
+        matrix = sparse.diags((user_items <= MAX_USER_ITEMS).astype(np.float32)) @ matrix
+        matrix.eliminate_zeros()
+
+    keys = [None] * len(item_index)
+    for key, index in item_index.items():
+        keys[index] = key
+    return matrix.tocsr(), keys
+
+def top_k_neighbors(matrix: sparse.csr_matrix, top_k: int = TOP_K,
+                    min_cooccurrence: int = MIN_COOCCURRENCE,
+                    block_size: int = BLOCK_SIZE):
+    """Top-K itens mais similares (cosseno) para cada item.
+
+    Calcula a coocorrência item x item em blocos de linhas (Xᵀ[bloco] · X),
+    então a memória depende do bloco e não do total de itens. Gera
+    (item, índices dos vizinhos, scores) em ordem decrescente de score.
+    """
+    by_item = matrix.T.tocsr()
+    counts = np.diff(by_item.indptr).astype(np.float32)
+    norms = np.sqrt(counts)
+
+    for start in range(0, by_item.shape[0], block_size):
+        block = (by_item[start:start + block_size] @ matrix).tocsr()
+
+        for offset in range(block.shape[0]):
+            item = start + offset
+            row_start, row_end = block.indptr[offset], block.indptr[offset + 1]
+            columns = block.indices[row_start:row_end]
+            together = block.data[row_start:row_end]
+
+            keep = (columns != item) & (together >= min_cooccurrence)
+            columns, together = columns[keep], together[keep]
+            if not len(columns):
+                continue
+
+            scores = together / (norms[item] * norms[columns])
+            if len(scores) > top_k:
+                best = np.argpartition(-scores, top_k)[:top_k]
+                columns, scores = columns[best], scores[best]
+            order = np.argsort(-scores, kind='stable')
+            yield item, columns[order], scores[order]
+
+def _neighbor_entry(key: ItemKey, favorite) -> Dict:
+    """Dados de exibição de um item, a partir de um favorito"""
+    content_type, content_id = key
+    entry = {'id': int(content_id) if content_id.isdigit() else content_id, 'type': content_type}
+    if favorite is not None:
+        title, poster_url, rating, genres = favorite
+        try:
+            genre_list = json.loads(genres) if genres else []
+        except (TypeError, ValueError):
+            genre_list = []
+        entry.update({'title': title, 'poster_url': poster_url, 'rating': rating or 0, 'genres': genre_list})
+    return entry
+
+def rebuild_item_neighbors() -> Dict:
+    """Recalcular a tabela item_neighbors a partir de todos os favoritos"""
+    started = time.time()
+
+    # Uma única leitura dos favoritos: monta a matriz e guarda os dados de
+    # exibição do favorito mais recente de cada item
+    metadata = {}
+    query = db.session.query(
+        Favorite.user_id, Favorite.content_type, Favorite.content_id,
+        Favorite.title, Favorite.poster_url, Favorite.rating, Favorite.genres
+    ).order_by(Favorite.id).yield_per(READ_BATCH_SIZE)
+
+    def rows():
+        for user_id, content_type, content_id, *display in query:
+            metadata[(content_type, content_id)] = display
+            yield user_id, content_type, content_id
+
+    matrix, keys = build_cooccurrence(rows())
+
+    now = datetime.utcnow()
+    batch = []
+    written = 0
+
+    db.session.execute(delete(ItemNeighbors.__table__))
+    for item, columns, scores in top_k_neighbors(matrix):
+        neighbors = []
+        for column, score in zip(columns.tolist(), scores.tolist()):
+            neighbor = _neighbor_entry(keys[column], metadata.get(keys[column]))
+            neighbor['score'] = round(score, 4)
+            neighbors.append(neighbor)
+
+        content_type, content_id = keys[item]
+        batch.append({
+            'content_type': content_type,
+            'content_id': content_id,
+            'neighbors': json.dumps(neighbors),
+            'computed_at': now
+        })
+        if len(batch) >= WRITE_BATCH_SIZE:
+            db.session.execute(insert(ItemNeighbors.__table__), batch)
+            written += len(batch)
+            batch = []
+
+    if batch:
+        db.session.execute(insert(ItemNeighbors.__table__), batch)
+        written += len(batch)
+
+    # A troca da tabela é feita em uma única transação
+    db.session.commit()
+
+    return {
+        'users': matrix.shape[0],
+        'items': matrix.shape[1],
+        'favorites': int(matrix.nnz),
+        'items_with_neighbors': written,
+        'seconds': round(time.time() - started, 2)
+    }
+
+def neighbors_for(items: List[ItemKey]) -> Dict[ItemKey, List[Dict]]:
+    """Vizinhos pré-calculados dos itens, com uma leitura pela chave primária"""
+    if not items:
+        return {}
+
+    rows = ItemNeighbors.query.filter(or_(*[
+        and_(ItemNeighbors.content_type == content_type, ItemNeighbors.content_id == str(content_id))
+        for content_type, content_id in items
+    ])).all()
+
+    return {(row.content_type, row.content_id): json.loads(row.neighbors) for row in rows}
+
+@click.command('item-similarity')
+def item_similarity_command():
+    """Recalcular os itens similares (rodar periodicamente, ex.: cron diário)"""
+    stats = rebuild_item_neighbors()
+    click.echo(
+        f"✅ {stats['items_with_neighbors']} itens com vizinhos "
+        f"({stats['favorites']} favoritos de {stats['users']} usuários, {stats['seconds']}s)"
+    )
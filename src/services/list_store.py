@@ -0,0 +1,179 @@
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List
+
+from src.services.cache import response_cache
+
+# Tempo (em segundos) em que uma lista é considerada atual
+LIST_TTL = int(os.environ.get('CATALOG_LIST_TTL', '3600'))
+
+# Fração do TTL após a qual a lista é renovada, e variação aleatória aplicada
+# para que workers e listas não renovem todos ao mesmo tempo
+REFRESH_RATIO = 0.8
+REFRESH_JITTER = 0.1
+
+# Listas não lidas por este tempo deixam de ser renovadas e saem da memória
+IDLE_TIMEOUT = int(os.environ.get('CATALOG_LIST_IDLE_TIMEOUT', str(6 * 3600)))
+
+# Intervalo da thread de renovação e espera após uma falha
+TICK_SECONDS = 5
+RETRY_AFTER_FAILURE = 60
+
+# Espera de quem não obteve o lease antes de reler a lista do cache
+# compartilhado (maior que o TTL do cache local, para ler o valor novo)
+FOLLOWER_DELAY = 75
+
+class _Entry:
+    __slots__ = ('value', 'loader', 'ttl', 'fetched_at', 'refresh_at', 'last_access',
+                 'refreshes', 'failures', 'last_error', 'awaiting_leader')
+
+    def __init__(self, loader, ttl):
+        self.value = None
+        self.loader = loader
+        self.ttl = ttl
+        self.fetched_at = 0.0
+        self.refresh_at = 0.0
+        self.last_access = time.time()
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error = None
+        self.awaiting_leader = False
+
+class ListStore:
+    """Listas de catálogo mantidas em memória (stale-while-revalidate).
+
+    A leitura sempre devolve o valor em memória, mesmo que um pouco antigo.
+    Uma thread em segundo plano renova cada lista antes de expirar; um lease
+    no cache compartilhado garante que só um worker do host vá à API, e os
+    demais releem o resultado pelo cache compartilhado.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._thread_pid = None
+
+    def get(self, key: str, loader: Callable[[], List], ttl: int = LIST_TTL) -> List:
+        """Ler uma lista; a primeira leitura carrega de forma síncrona"""
+        self._ensure_refresher()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _Entry(loader, ttl)
+                self._entries[key] = entry
+            entry.last_access = time.time()
+
+        if entry.value is None:
+            self._load(key, entry)
+
+        return list(entry.value or [])
+
+    def stats(self) -> Dict:
+        """Idade e estado de cada lista em memória"""
+        now = time.time()
+        with self._lock:
+            items = list(self._entries.items())
+
+        lists = {}
+        for key, entry in items:
+            if entry.value is None:
+                continue
+            age = now - entry.fetched_at
+            lists[key] = {
+                'age_seconds': round(age, 1),
+                'stale': age > entry.ttl,
+                'staleness_seconds': round(max(0.0, age - entry.ttl), 1),
+                'refreshes': entry.refreshes,
+                'failures': entry.failures,
+                'last_error': entry.last_error
+            }
+
+        ages = [info['age_seconds'] for info in lists.values()]
+        return {
+            'count': len(lists),
+            'stale_count': sum(1 for info in lists.values() if info['stale']),
+            'max_age_seconds': max(ages) if ages else 0,
+            'lists': lists
+        }
+
+    def _schedule(self, entry: _Entry, delay: float) -> None:
+        jitter = 1 + random.uniform(-REFRESH_JITTER, REFRESH_JITTER)
+        entry.refresh_at = time.time() + delay * jitter
+
+    def _load(self, key: str, entry: _Entry, bypass_cache: bool = False) -> None:
+        try:
+            if bypass_cache:
+                with response_cache.bypass_reads():
+                    value = entry.loader()
+            else:
+                value = entry.loader()
+        except Exception as e:
+            entry.failures += 1
+            entry.last_error = str(e)
+            self._schedule(entry, RETRY_AFTER_FAILURE)
+            print(f"Erro ao carregar lista {key}: {e}")
+            if entry.value is None:
+                raise
+            return
+
+        if not value and entry.value:
+            # Lista vazia (ex.: limite de requisições) não substitui uma lista já carregada
+            entry.failures += 1
+            entry.last_error = 'Resposta vazia'
+            self._schedule(entry, RETRY_AFTER_FAILURE)
+            return
+
+        entry.value = value
+        entry.fetched_at = time.time()
+        entry.last_error = None
+        self._schedule(entry, entry.ttl * REFRESH_RATIO)
+
+    def _refresh(self, key: str, entry: _Entry) -> None:
+        if entry.awaiting_leader:
+            # Outro worker renovou; reler pelo cache compartilhado
+            entry.awaiting_leader = False
+            self._load(key, entry)
+            entry.refreshes += 1
+            return
+
+        lease_ttl = entry.ttl * REFRESH_RATIO * (1 - REFRESH_JITTER)
+        if response_cache.acquire_lease(f'list-refresh:{key}', lease_ttl):
+            self._load(key, entry, bypass_cache=True)
+            entry.refreshes += 1
+        else:
+            entry.awaiting_leader = True
+            entry.refresh_at = time.time() + FOLLOWER_DELAY
+
+    def _ensure_refresher(self) -> None:
+        """Iniciar a thread de renovação uma vez por processo (após o fork)"""
+        pid = os.getpid()
+        if self._thread_pid == pid:
+            return
+        with self._lock:
+            if self._thread_pid == pid:
+                return
+            threading.Thread(target=self._refresher_loop, name='list-refresher', daemon=True).start()
+            self._thread_pid = pid
+
+    def _refresher_loop(self) -> None:
+        while True:
+            time.sleep(TICK_SECONDS)
+            now = time.time()
+
+            with self._lock:
+                for key in [k for k, e in self._entries.items() if now - e.last_access > IDLE_TIMEOUT]:
+                    del self._entries[key]
+                due = [(k, e) for k, e in self._entries.items()
+                       if e.value is not None and e.refresh_at <= now]
+
+            for key, entry in due:
+                try:
+                    self._refresh(key, entry)
+                except Exception as e:
+                    print(f"Erro ao renovar lista {key}: {e}")
+
+# Instância compartilhada pelas rotas de conteúdo
+catalog_lists = ListStore()
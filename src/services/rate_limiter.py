@@ -0,0 +1,207 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+# Backend dos buckets: 'sqlite' (compartilhado pelos workers do host) ou 'local'
+BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'sqlite')
+
+# Arquivo SQLite com o estado dos buckets
+SHARED_PATH = os.environ.get(
+    'RATE_LIMIT_PATH',
+    os.path.join(tempfile.gettempdir(), 'myverse_rate_limits.sqlite3')
+)
+
+# Número de hosts que dividem o mesmo limite quando o backend não é
+# compartilhado entre eles; a taxa de cada host é dividida por este valor
+NODES = max(1, int(os.environ.get('RATE_LIMIT_NODES', '1')))
+
+class RateLimitExceeded(Exception):
+    """A espera por um token passaria do máximo permitido (carga descartada)"""
+
+class BucketBackend(ABC):
+    """Armazena o estado dos buckets.
+
+    Para vários hosts dividirem o mesmo limite, basta implementar `reserve`
+    sobre um armazenamento comum (ex.: Redis) e registrá-lo com
+    `set_backend`.
+    """
+
+    @abstractmethod
+    def reserve(self, name: str, rate: float, capacity: float, max_wait: float) -> Optional[float]:
+        """Reservar um token.
+
+        Retorna quanto tempo esperar antes de usá-lo (0 se disponível agora)
+        ou None se a espera passaria de `max_wait`; nesse caso nada é
+        consumido.
+        """
+
+def _take(tokens: float, updated_at: float, now: float, rate: float,
+          capacity: float, max_wait: float):
+    """Aplicar o token bucket: retorna (espera, novos tokens) ou None"""
+    tokens = min(capacity, tokens + (now - updated_at) * rate) - 1
+    wait = -tokens / rate if tokens < 0 else 0.0
+    if wait > max_wait:
+        return None
+    # Tokens negativos representam requisições já enfileiradas
+    return wait, tokens
+
+class LocalBucketBackend(BucketBackend):
+    """Buckets em memória, válidos apenas para o processo atual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, tuple] = {}
+
+    def reserve(self, name, rate, capacity, max_wait):
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(name, (capacity, now))
+            taken = _take(tokens, updated_at, now, rate, capacity, max_wait)
+            if taken is None:
+                return None
+            wait, tokens = taken
+            self._buckets[name] = (tokens, now)
+            return wait
+
+class SQLiteBucketBackend(BucketBackend):
+    """Buckets em um arquivo SQLite, compartilhados pelos workers do host"""
+
+    def __init__(self, path: str = SHARED_PATH):
+        self.path = path
+        self._thread_state = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Uma conexão por thread, reaberta após o fork do gunicorn
+        state = self._thread_state
+        if getattr(state, 'pid', None) != os.getpid() or state.conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            state.pid = os.getpid()
+            state.conn = conn
+        return state.conn
+
+    def reserve(self, name, rate, capacity, max_wait):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE name = ?', (name,)).fetchone()
+            tokens, updated_at = row if row is not None else (capacity, now)
+
+            taken = _take(tokens, updated_at, now, rate, capacity, max_wait)
+            if taken is None:
+                conn.execute('COMMIT')
+                return None
+
+            wait, tokens = taken
+            conn.execute(
+                'INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)',
+                (name, tokens, now)
+            )
+            conn.execute('COMMIT')
+            return wait
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+_backend: BucketBackend = LocalBucketBackend() if BACKEND == 'local' else SQLiteBucketBackend()
+
+def set_backend(backend: BucketBackend) -> None:
+    """Trocar o backend usado por todos os limitadores"""
+    global _backend
+    _backend = backend
+
+class RateLimiter:
+    """Token bucket por provedor.
+
+    Quando não há token disponível a chamada espera na fila por até
+    `max_wait` segundos; acima disso a requisição é descartada com
+    RateLimitExceeded.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float, max_wait: float):
+        self.name = name
+        self.rate = rate / NODES
+        self.capacity = max(1.0, capacity / NODES)
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._stats = {
+            'acquired': 0,
+            'delayed': 0,
+            'shed': 0,
+            'backend_errors': 0,
+            'total_wait_seconds': 0.0,
+            'max_wait_seconds': 0.0
+        }
+
+    def acquire(self) -> float:
+        """Obter um token, esperando se necessário; retorna o tempo esperado"""
+        try:
+            wait = _backend.reserve(self.name, self.rate, self.capacity, self.max_wait)
+        except Exception as e:
+            # Falha no backend não deve derrubar as requisições
+            print(f"Erro no rate limiter {self.name}: {e}")
+            with self._lock:
+                self._stats['backend_errors'] += 1
+            return 0.0
+
+        if wait is None:
+            with self._lock:
+                self._stats['shed'] += 1
+            raise RateLimitExceeded(f'Limite de requisições do {self.name} atingido')
+
+        if wait > 0:
+            time.sleep(wait)
+
+        with self._lock:
+            self._stats['acquired'] += 1
+            if wait > 0:
+                self._stats['delayed'] += 1
+                self._stats['total_wait_seconds'] += wait
+                self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], wait)
+
+        return wait
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['avg_wait_ms'] = round(stats['total_wait_seconds'] / stats['acquired'] * 1000, 2) if stats['acquired'] else 0.0
+        stats['total_wait_seconds'] = round(stats['total_wait_seconds'], 3)
+        stats['max_wait_seconds'] = round(stats['max_wait_seconds'], 3)
+        stats['rate_per_second'] = self.rate
+        stats['capacity'] = self.capacity
+        return stats
+
+# Limites por provedor (IGDB aceita ~4 req/s; TMDb, por volta de 40-50 req/s)
+tmdb_limiter = RateLimiter(
+    'tmdb',
+    rate=float(os.environ.get('TMDB_RATE_LIMIT', '40')),
+    capacity=float(os.environ.get('TMDB_RATE_BURST', '40')),
+    max_wait=float(os.environ.get('TMDB_RATE_MAX_WAIT', '0.5'))
+)
+
+igdb_limiter = RateLimiter(
+    'igdb',
+    rate=float(os.environ.get('IGDB_RATE_LIMIT', '4')),
+    capacity=float(os.environ.get('IGDB_RATE_BURST', '4')),
+    max_wait=float(os.environ.get('IGDB_RATE_MAX_WAIT', '1.0'))
+)
+
+def limiter_stats() -> Dict:
+    return {
+        'tmdb': tmdb_limiter.stats(),
+        'igdb': igdb_limiter.stats()
+    }
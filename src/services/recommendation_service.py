@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy.exc import IntegrityError
+from src.extensions import db
+from src.models.database import Favorite, UserRecommendation
+from src.services import favorite_genres
+from src.services.list_store import catalog_lists
+from src.services.records import CatalogJSONProvider
+
+# Idade (em segundos) a partir da qual as recomendações são recalculadas em
+# segundo plano, ainda servindo as atuais
+REFRESH_AFTER = int(os.environ.get('RECOMMENDATIONS_REFRESH_AFTER', '3600'))
+
+# Idade máxima servida: acima disso o cálculo é feito na própria requisição
+MAX_STALENESS = int(os.environ.get('RECOMMENDATIONS_MAX_STALENESS', str(24 * 3600)))
+
+# Quantidade de gêneros favoritos considerados e de recomendações guardadas
+TOP_GENRES = 3
+MAX_RECOMMENDATIONS = 20
+
+RECOMPUTE_QUEUE_SIZE = 1000
+
+class RecommendationService:
+    """Recomendações materializadas por usuário (tabela user_recommendations).
+
+    A leitura é uma busca pela chave primária. Mudanças nos favoritos marcam
+    a linha como suja na mesma transação e agendam o recálculo em uma thread
+    de segundo plano; as chamadas ao TMDb/IGDB só são refeitas quando o
+    perfil de gêneros muda.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._queue = None
+        self._pending = set()
+        self._worker_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+
+    def get(self, user_id: int, refresh: bool = False) -> Dict:
+        """Recomendações do usuário; `refresh` força o recálculo imediato"""
+        user_id = int(user_id)
+        row = db.session.get(UserRecommendation, user_id)
+
+        if row is not None and not refresh:
+            age = datetime.utcnow() - row.computed_at
+            if age <= timedelta(seconds=MAX_STALENESS):
+                if row.dirty or age > timedelta(seconds=REFRESH_AFTER):
+                    self.schedule(user_id)
+                return row.to_dict()
+
+        return self.recompute(user_id).to_dict()
+
+    def mark_dirty(self, user_id: int) -> None:
+        """Marcar as recomendações como desatualizadas (na transação atual)"""
+        user_id = int(user_id)
+        UserRecommendation.query.filter_by(user_id=user_id).update(
+            {'dirty': True}, synchronize_session=False
+        )
+
+    def schedule(self, user_id: int) -> None:
+        """Agendar o recálculo em segundo plano, sem bloquear o chamador"""
+        if self.app is None:
+            return
+
+        user_id = int(user_id)
+        # A fila é obtida antes: na primeira chamada do processo ela limpa _pending
+        pending_queue = self._worker_queue()
+        with self._lock:
+            if user_id in self._pending:
+                return
+            self._pending.add(user_id)
+
+        try:
+            pending_queue.put_nowait(user_id)
+        except queue.Full:
+            # A linha continua suja e será recalculada na próxima leitura
+            with self._lock:
+                self._pending.discard(user_id)
+
+    def recompute(self, user_id: int) -> UserRecommendation:
+        """Recalcular e gravar as recomendações do usuário"""
+        favorite_keys = db.session.query(Favorite.content_type, Favorite.content_id).filter(
+            Favorite.user_id == user_id
+        ).all()
+        favorite_ids = {f"{content_type}_{content_id}" for content_type, content_id in favorite_keys}
+        top_genres = [genre for genre, count in favorite_genres.top_genres(user_id, TOP_GENRES)]
+        signature = hashlib.sha1(json.dumps([bool(favorite_ids), top_genres]).encode('utf-8')).hexdigest()
+
+        row = db.session.get(UserRecommendation, user_id)
+        fresh = row is not None and datetime.utcnow() - row.computed_at <= timedelta(seconds=REFRESH_AFTER)
+
+        if fresh and row.genre_signature == signature:
+            # Mesmo perfil de gêneros: só retirar o que virou favorito
+            payload = json.loads(row.payload)
+            payload['recommendations'] = [
+                rec for rec in payload['recommendations']
+                if f"{rec['type']}_{rec['id']}" not in favorite_ids
+            ]
+            computed_at = row.computed_at
+        else:
+            payload = self._build(top_genres, favorite_ids)
+            computed_at = datetime.utcnow()
+
+        try:
+            row = db.session.merge(UserRecommendation(
+                user_id=user_id,
+                payload=json.dumps(payload, default=CatalogJSONProvider.default),
+                genre_signature=signature,
+                dirty=False,
+                computed_at=computed_at
+            ))
+            db.session.commit()
+        except IntegrityError:
+            # Outro worker gravou a mesma linha ao mesmo tempo
+            db.session.rollback()
+            row = db.session.get(UserRecommendation, user_id)
+        return row
+
+    def _build(self, top_genres: List[str], favorite_ids) -> Dict:
+        from src.routes.content import tmdb_service, igdb_service
+
+        if not favorite_ids:
+            # Sem favoritos: conteúdo popular
+            recommendations = []
+            for key, loader in (
+                ('tmdb:popular_movies', tmdb_service.get_popular_movies),
+                ('tmdb:popular_tv', tmdb_service.get_popular_tv_shows),
+                ('igdb:popular_games', igdb_service.get_popular_games)
+            ):
+                try:
+                    recommendations.extend(catalog_lists.get(key, loader)[:10])
+                except Exception as e:
+                    print(f"Erro ao carregar {key}: {e}")
+
+            return {
+                'recommendations': recommendations,
+                'based_on': 'popular_content'
+            }
+
+        # Buscar conteúdo similar aos gêneros favoritos
+        recommendations = []
+        for genre in top_genres:
+            for key, loader in (
+                (f'tmdb:movies_by_genre:{genre}', lambda genre=genre: tmdb_service.get_movies_by_genre(genre)),
+                (f'tmdb:tv_by_genre:{genre}', lambda genre=genre: tmdb_service.get_tv_shows_by_genre(genre))
+            ):
+                try:
+                    recommendations.extend(catalog_lists.get(key, loader)[:5])
+                except Exception as e:
+                    print(f"Erro ao carregar {key}: {e}")
+
+        # Remover duplicatas e favoritos já existentes
+        unique_recommendations = []
+        seen_ids = set()
+        for rec in recommendations:
+            rec_id = f"{rec['type']}_{rec['id']}"
+            if rec_id not in favorite_ids and rec_id not in seen_ids:
+                unique_recommendations.append(rec)
+                seen_ids.add(rec_id)
+
+        return {
+            'recommendations': unique_recommendations[:MAX_RECOMMENDATIONS],
+            'based_on': 'user_preferences',
+            'favorite_genres': top_genres
+        }
+
+    def _worker_queue(self) -> queue.Queue:
+        """Fila e thread de recálculo, criadas sob demanda em cada processo"""
+        pid = os.getpid()
+        if self._worker_pid != pid:
+            with self._lock:
+                if self._worker_pid != pid:
+                    self._queue = queue.Queue(maxsize=RECOMPUTE_QUEUE_SIZE)
+                    self._pending.clear()
+                    threading.Thread(
+                        target=self._worker_loop,
+                        args=(self._queue,),
+                        name='recommendations',
+                        daemon=True
+                    ).start()
+                    self._worker_pid = pid
+        return self._queue
+
+    def _worker_loop(self, pending_queue: queue.Queue) -> None:
+        while True:
+            user_id = pending_queue.get()
+            with self._lock:
+                self._pending.discard(user_id)
+
+            try:
+                with self.app.app_context():
+                    self.recompute(user_id)
+            except Exception as e:
+                print(f"Erro ao recalcular recomendações do usuário {user_id}: {e}")
+
+# Instância compartilhada
+recommendation_service = RecommendationService()
@@ -0,0 +1,75 @@
+from typing import Dict, Optional, Tuple
+
+from flask.json.provider import DefaultJSONProvider
+
+class CatalogRecord:
+    """Item normalizado do catálogo (filme, série ou jogo).
+
+    Substitui o dict por item: usa __slots__, guarda gêneros e plataformas em
+    tuplas (compartilhadas entre itens com a mesma combinação) e só vira dict
+    na serialização. Aceita `item['campo']` e `item.get('campo')`, então o
+    código que lia os dicts continua funcionando.
+    """
+
+    __slots__ = ('id', 'type', 'title', 'overview', 'release_date',
+                 'poster_url', 'rating', 'genres', 'platforms')
+
+    def __init__(self, id, type: str, title: str, overview: str, release_date: str,
+                 poster_url: Optional[str], rating: float, genres: Tuple[str, ...],
+                 platforms: Optional[Tuple[str, ...]] = None):
+        self.id = id
+        self.type = type
+        self.title = title
+        self.overview = overview
+        self.release_date = release_date
+        self.poster_url = poster_url
+        self.rating = rating
+        self.genres = genres
+        # Apenas jogos têm plataformas
+        self.platforms = platforms
+
+    def keys(self):
+        if self.platforms is None:
+            return self.__slots__[:-1]
+        return self.__slots__
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__ or (key == 'platforms' and self.platforms is None):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict:
+        data = {
+            'id': self.id,
+            'type': self.type,
+            'title': self.title,
+            'overview': self.overview,
+            'release_date': self.release_date,
+            'poster_url': self.poster_url,
+            'rating': self.rating,
+            'genres': list(self.genres)
+        }
+        if self.platforms is not None:
+            data['platforms'] = list(self.platforms)
+        return data
+
+    def __repr__(self):
+        return f'<CatalogRecord {self.type}:{self.id} {self.title!r}>'
+
+class CatalogJSONProvider(DefaultJSONProvider):
+    """Provider JSON do app: serializa CatalogRecord sem convertê-lo antes"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, CatalogRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
@@ -0,0 +1,84 @@
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Agrupa chamadas idênticas simultâneas em uma única execução.
+
+    A primeira thread a chamar `do` com uma chave executa a função; as
+    demais que chegam enquanto ela está em andamento esperam e recebem o
+    mesmo resultado (ou a mesma exceção).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats = {'executed': 0, 'coalesced': 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executed'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+# Grupo compartilhado pelos serviços de catálogo do processo
+catalog_flight = SingleFlight()
+
+
+def coalesce(method):
+    """Decorator que coalesce chamadas idênticas a um método de serviço.
+
+    A chave é formada pelo serviço, pelo nome do método e pelos argumentos.
+    Listas retornadas são copiadas para cada chamador, para que nenhum deles
+    altere o resultado visto pelos outros.
+    """
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (id(self), name, args, tuple(sorted(kwargs.items())))
+        result = catalog_flight.do(key, lambda: method(self, *args, **kwargs))
+        return list(result) if isinstance(result, list) else result
+
+    return wrapper
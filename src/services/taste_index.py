@@ -0,0 +1,385 @@
+import os
+import threading
+import time
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from src.extensions import db
+from src.models.database import Favorite, FavoriteGenre, Friendship, User
+from src.services.favorite_genres import parse_genres
+
+# Intervalo (em segundos) entre as sincronizações incrementais com o banco,
+# que trazem o que outros workers gravaram
+SYNC_INTERVAL = int(os.environ.get('TASTE_INDEX_SYNC_INTERVAL', '15'))
+
+# Intervalo entre as reconstruções completas (em segundo plano), que
+# refletem exclusões e usuários desativados em outros workers
+REBUILD_INTERVAL = int(os.environ.get('TASTE_INDEX_REBUILD_INTERVAL', '900'))
+
+# Gêneros do usuário usados na comparação e similaridade mínima (Jaccard)
+TOP_GENRES = 10
+MIN_SIMILARITY = 0.2
+
+READ_BATCH_SIZE = 50000
+
+class _State:
+    """Matriz usuários x gêneros e conexões de um momento do índice"""
+
+    def __init__(self, users: int = 1024, genres: int = 64):
+        self.size = 0
+        self.user_ids = np.zeros(users, dtype=np.int64)
+        self.active = np.zeros(users, dtype=bool)
+        self.favorite_totals = np.zeros(users, dtype=np.int32)
+        self.genre_totals = np.zeros(users, dtype=np.int32)
+        # Peso (ocorrências) de cada gênero nos favoritos e presença do gênero
+        self.counts = np.zeros((users, genres), dtype=np.int32)
+        self.has = np.zeros((users, genres), dtype=bool)
+
+        self.row_of: Dict[int, int] = {}
+        self.genre_index: Dict[str, int] = {}
+        self.genre_names: List[str] = []
+        # Usuários com qualquer amizade ou solicitação entre si (qualquer status)
+        self.connections: Dict[int, Set[int]] = {}
+
+        self.last_user_id = 0
+        self.last_favorite_id = 0
+        self.last_friendship_id = 0
+        # Favoritos aplicados localmente acima do último ID sincronizado
+        self.applied_favorites: Set[int] = set()
+        # Favoritos removidos localmente acima do último ID sincronizado (a
+        # leitura em andamento pode ainda trazê-los)
+        self.removed_favorites: Set[int] = set()
+
+    def row(self, user_id: int, active: bool = True) -> int:
+        row = self.row_of.get(user_id)
+        if row is not None:
+            return row
+
+        if self.size == len(self.user_ids):
+            self._grow_rows()
+        row = self.size
+        self.size += 1
+        self.row_of[user_id] = row
+        self.user_ids[row] = user_id
+        self.active[row] = active
+        return row
+
+    def column(self, genre: str) -> int:
+        column = self.genre_index.get(genre)
+        if column is not None:
+            return column
+
+        if len(self.genre_names) == self.counts.shape[1]:
+            self._grow_columns()
+        column = len(self.genre_names)
+        self.genre_index[genre] = column
+        self.genre_names.append(genre)
+        return column
+
+    def apply_favorite(self, user_id: int, genres: Iterable[str], sign: int) -> None:
+        row = self.row(user_id)
+        self.favorite_totals[row] = max(0, self.favorite_totals[row] + sign)
+        for genre in genres:
+            column = self.column(genre)
+            before = self.has[row, column]
+            self.counts[row, column] = max(0, self.counts[row, column] + sign)
+            after = self.counts[row, column] > 0
+            if before != after:
+                self.has[row, column] = after
+                self.genre_totals[row] += 1 if after else -1
+
+    def connect(self, user_a: int, user_b: int) -> None:
+        self.connections.setdefault(user_a, set()).add(user_b)
+        self.connections.setdefault(user_b, set()).add(user_a)
+
+    def disconnect(self, user_a: int, user_b: int) -> None:
+        self.connections.get(user_a, set()).discard(user_b)
+        self.connections.get(user_b, set()).discard(user_a)
+
+    def _grow_rows(self) -> None:
+        capacity = len(self.user_ids) * 2
+        for name in ('user_ids', 'active', 'favorite_totals', 'genre_totals'):
+            current = getattr(self, name)
+            grown = np.zeros(capacity, dtype=current.dtype)
+            grown[:len(current)] = current
+            setattr(self, name, grown)
+        for name in ('counts', 'has'):
+            current = getattr(self, name)
+            grown = np.zeros((capacity, current.shape[1]), dtype=current.dtype)
+            grown[:current.shape[0]] = current
+            setattr(self, name, grown)
+
+    def _grow_columns(self) -> None:
+        for name in ('counts', 'has'):
+            current = getattr(self, name)
+            grown = np.zeros((current.shape[0], current.shape[1] * 2), dtype=current.dtype)
+            grown[:, :current.shape[1]] = current
+            setattr(self, name, grown)
+
+class TasteIndex:
+    """Índice em memória de gostos (gêneros favoritos) por usuário.
+
+    Mantém uma matriz NumPy usuários x gêneros e o conjunto de conexões
+    (amizades e solicitações) de cada usuário, para que as sugestões de
+    amizade sejam um único cálculo vetorizado de Jaccard sobre todos os
+    candidatos. As mudanças feitas no worker são aplicadas na hora; as de
+    outros workers chegam pela sincronização incremental e pela
+    reconstrução periódica.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._state: Optional[_State] = None
+        self._lock = threading.RLock()
+        # Uma leitura do banco por vez; o _lock só é usado para aplicar o resultado
+        self._sync_lock = threading.Lock()
+        self._pid = None
+        self._synced_at = 0.0
+        self._built_at = 0.0
+        self._rebuilding = False
+        self._replay: List[Tuple] = []
+
+    def init_app(self, app):
+        self.app = app
+
+    def profile(self, user_id: int) -> Tuple[int, List[str]]:
+        """Total de favoritos do usuário e seus gêneros mais frequentes"""
+        self.ensure_synced()
+        user_id = int(user_id)
+        with self._lock:
+            state = self._state
+            row = state.row_of.get(user_id)
+            if row is None:
+                return 0, []
+            weights = state.counts[row, :len(state.genre_names)]
+            columns = [column for column in np.argsort(-weights, kind='stable')[:TOP_GENRES] if weights[column] > 0]
+            return int(state.favorite_totals[row]), [state.genre_names[column] for column in columns]
+
+    def similar_users(self, user_id: int, genres: List[str], limit: int = 10,
+                      min_similarity: float = MIN_SIMILARITY) -> Tuple[List[Dict], int]:
+        """Usuários mais parecidos (Jaccard entre os gêneros), sem conexões.
+
+        Retorna até `limit` resultados com user_id, score, gêneros em comum
+        e total de favoritos, e quantos candidatos passaram do mínimo.
+        """
+        self.ensure_synced()
+        user_id = int(user_id)
+        with self._lock:
+            state = self._state
+            size = state.size
+            columns = [state.genre_index[genre] for genre in genres if genre in state.genre_index]
+            if not size or not columns:
+                return [], 0
+
+            genre_totals = state.genre_totals[:size]
+            common = state.has[:size, columns].sum(axis=1, dtype=np.int32)
+            union = len(columns) + genre_totals - common
+            scores = common / np.maximum(union, 1)
+
+            candidates = state.active[:size] & (genre_totals > 0)
+            own_row = state.row_of.get(user_id)
+            if own_row is not None:
+                candidates[own_row] = False
+            connected = [state.row_of[other] for other in state.connections.get(user_id, ()) if other in state.row_of]
+            if connected:
+                candidates[connected] = False
+
+            matches = np.flatnonzero(candidates & (scores > min_similarity))
+            total = len(matches)
+            if total > limit:
+                matches = matches[np.argpartition(-scores[matches], limit)[:limit]]
+            matches = matches[np.argsort(-scores[matches], kind='stable')]
+
+            return [{
+                'user_id': int(state.user_ids[row]),
+                'score': float(scores[row]),
+                'common_genres': [state.genre_names[column] for column in columns if state.has[row, column]],
+                'total_favorites': int(state.favorite_totals[row])
+            } for row in matches], total
+
+    def add_favorite(self, favorite_id: int, user_id: int, genres: Optional[str]) -> None:
+        """Aplicar um favorito novo (`genres` é a coluna JSON do favorito)"""
+        self._apply(('favorite', favorite_id, int(user_id), parse_genres(genres), 1))
+
+    def remove_favorite(self, favorite_id: int, user_id: int, genres: Optional[str]) -> None:
+        self._apply(('favorite', favorite_id, int(user_id), parse_genres(genres), -1))
+
+    def add_connection(self, friendship_id: int, user_a: int, user_b: int) -> None:
+        self._apply(('connection', friendship_id, int(user_a), int(user_b), 1))
+
+    def remove_connection(self, friendship_id: int, user_a: int, user_b: int) -> None:
+        self._apply(('connection', friendship_id, int(user_a), int(user_b), -1))
+
+    def size(self) -> int:
+        with self._lock:
+            return self._state.size if self._state is not None else 0
+
+    def ensure_synced(self) -> None:
+        """Construir o índice no primeiro uso do processo e mantê-lo atualizado"""
+        pid = os.getpid()
+        if self._pid != pid:
+            # Depois do fork cada worker mantém o próprio índice
+            with self._lock:
+                if self._pid != pid:
+                    self._state = None
+                    self._rebuilding = False
+                    self._replay = []
+                    self._pid = pid
+
+        if self._state is None:
+            # Quem chega durante a carga espera por ela, mas sem segurar o
+            # _lock: as escritas (_apply) seguem livres enquanto o banco é lido
+            with self._sync_lock:
+                if self._state is None:
+                    state = self._build()
+                    with self._lock:
+                        if self._pid == pid:
+                            self._state = state
+                            self._built_at = self._synced_at = time.time()
+            return
+
+        now = time.time()
+        if now - self._built_at > REBUILD_INTERVAL and self.app is not None:
+            self._start_rebuild()
+
+        if now - self._synced_at >= SYNC_INTERVAL and self._sync_lock.acquire(blocking=False):
+            try:
+                if now - self._synced_at >= SYNC_INTERVAL:
+                    self._sync()
+                    self._synced_at = now
+            finally:
+                self._sync_lock.release()
+
+    def _apply(self, operation: Tuple) -> None:
+        with self._lock:
+            if self._state is None or self._pid != os.getpid():
+                return
+            if self._rebuilding:
+                self._replay.append(operation)
+            self._apply_to(self._state, operation)
+
+    @staticmethod
+    def _apply_to(state: _State, operation: Tuple) -> None:
+        kind, record_id, first, second, sign = operation
+
+        if kind == 'favorite':
+            # Só contar (ou descontar) favoritos que o índice já viu ou verá
+            # pela sincronização, nunca duas vezes
+            counted = record_id <= state.last_favorite_id or record_id in state.applied_favorites
+            if sign > 0 and not counted:
+                state.applied_favorites.add(record_id)
+                state.apply_favorite(first, second, 1)
+            elif sign < 0:
+                if record_id > state.last_favorite_id:
+                    state.removed_favorites.add(record_id)
+                if counted:
+                    state.applied_favorites.discard(record_id)
+                    state.apply_favorite(first, second, -1)
+        else:
+            if sign > 0:
+                state.connect(first, second)
+            else:
+                state.disconnect(first, second)
+
+    def _build(self) -> _State:
+        """Carregar usuários, favoritos e conexões em uma nova matriz"""
+        state = _State()
+        self._merge(state, *self._fetch(state))
+        return state
+
+    def _sync(self) -> None:
+        """Trazer o que outros workers gravaram: lê o banco sem o _lock e só o
+        segura para aplicar as mudanças"""
+        with self._lock:
+            state = self._state
+        changes = self._fetch(state)
+        with self._lock:
+            # Uma reconstrução trocou o estado durante a leitura: o novo já
+            # reflete o banco
+            if self._state is state:
+                self._merge(state, *changes)
+
+    @staticmethod
+    def _fetch(state: _State) -> Tuple[List, List, List]:
+        """Ler usuários, favoritos e amizades com ID acima do último visto"""
+        users = db.session.query(User.id, User.is_active).filter(
+            User.id > state.last_user_id
+        ).order_by(User.id).all()
+
+        # Gêneros já normalizados (uma linha por gênero), sem decodificar JSON
+        rows = db.session.query(Favorite.id, Favorite.user_id, FavoriteGenre.genre).outerjoin(
+            FavoriteGenre, FavoriteGenre.favorite_id == Favorite.id
+        ).filter(
+            Favorite.id > state.last_favorite_id
+        ).order_by(Favorite.id).yield_per(READ_BATCH_SIZE)
+        favorites = [
+            (favorite_id, user_id, [genre for _, _, genre in group if genre])
+            for (favorite_id, user_id), group in groupby(rows, key=lambda row: (row[0], row[1]))
+        ]
+
+        friendships = db.session.query(Friendship.id, Friendship.requester_id, Friendship.requested_id).filter(
+            Friendship.id > state.last_friendship_id
+        ).order_by(Friendship.id).all()
+
+        db.session.commit()
+        return users, favorites, friendships
+
+    @staticmethod
+    def _merge(state: _State, users: List, favorites: List, friendships: List) -> None:
+        """Aplicar ao estado o que foi lido por _fetch"""
+        for user_id, is_active in users:
+            state.active[state.row(user_id, bool(is_active))] = bool(is_active)
+            state.last_user_id = max(state.last_user_id, user_id)
+
+        for favorite_id, user_id, genres in favorites:
+            if favorite_id in state.removed_favorites:
+                state.removed_favorites.discard(favorite_id)
+                state.applied_favorites.discard(favorite_id)
+            elif favorite_id in state.applied_favorites:
+                state.applied_favorites.discard(favorite_id)
+            else:
+                state.apply_favorite(user_id, genres, 1)
+            state.last_favorite_id = max(state.last_favorite_id, favorite_id)
+        state.removed_favorites = {favorite_id for favorite_id in state.removed_favorites
+                                   if favorite_id > state.last_favorite_id}
+
+        for friendship_id, requester_id, requested_id in friendships:
+            state.connect(requester_id, requested_id)
+            state.last_friendship_id = max(state.last_friendship_id, friendship_id)
+
+    def _start_rebuild(self) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+            self._replay = []
+            self._built_at = time.time()
+        threading.Thread(target=self._rebuild, name='taste-index-rebuild', daemon=True).start()
+
+    def _rebuild(self) -> None:
+        try:
+            with self.app.app_context():
+                state = self._build()
+        except Exception as e:
+            print(f"Erro ao reconstruir índice de gostos: {e}")
+            with self._lock:
+                self._rebuilding = False
+                self._replay = []
+            return
+
+        with self._lock:
+            # Reaplicar o que mudou neste worker durante a reconstrução. Remoções
+            # de favoritos ficam de fora: não dá para saber se a leitura já as
+            # refletiu, e a próxima reconstrução as corrige
+            for operation in self._replay:
+                if operation[0] == 'favorite' and operation[4] < 0:
+                    continue
+                self._apply_to(state, operation)
+            self._state = state
+            self._rebuilding = False
+            self._replay = []
+            self._synced_at = time.time()
+
+# Instância compartilhada pelas rotas
+taste_index = TasteIndex()
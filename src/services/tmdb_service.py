@@ -1,6 +1,82 @@
-import requests
 import os
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
+from src.services.cache import response_cache
+from src.services.circuit_breaker import ProbeSkipped, get_breaker, is_provider_failure
+from src.services.http_client import SessionHolder
+from src.services.rate_limiter import RateLimitExceeded, tmdb_limiter
+from src.services.records import CatalogRecord
+from src.services.singleflight import coalesce
+
+# TTL (em segundos) das respostas em cache, pelo prefixo do endpoint.
+# Listas populares e descoberta por gênero são iguais para todos os usuários.
+CACHE_TTLS = {
+    'search/': 600,
+    'movie/popular': 3600,
+    'tv/popular': 3600,
+    'discover/': 3600
+}
+DEFAULT_CACHE_TTL = 600
+
+# Mapear nome do gênero para ID
+MOVIE_GENRE_IDS = {
+    'Action': 28, 'Adventure': 12, 'Animation': 16, 'Comedy': 35,
+    'Crime': 80, 'Documentary': 99, 'Drama': 18, 'Family': 10751,
+    'Fantasy': 14, 'History': 36, 'Horror': 27, 'Music': 10402,
+    'Mystery': 9648, 'Romance': 10749, 'Science Fiction': 878,
+    'TV Movie': 10770, 'Thriller': 53, 'War': 10752, 'Western': 37
+}
+
+TV_GENRE_IDS = {
+    'Action & Adventure': 10759, 'Animation': 16, 'Comedy': 35,
+    'Crime': 80, 'Documentary': 99, 'Drama': 18, 'Family': 10751,
+    'Kids': 10762, 'Mystery': 9648, 'News': 10763, 'Reality': 10764,
+    'Sci-Fi & Fantasy': 10765, 'Soap': 10766, 'Talk': 10767,
+    'War & Politics': 10768, 'Western': 37
+}
+
+# Mapear ID do gênero para nome
+MOVIE_GENRE_NAMES = {genre_id: name for name, genre_id in MOVIE_GENRE_IDS.items()}
+TV_GENRE_NAMES = {genre_id: name for name, genre_id in TV_GENRE_IDS.items()}
+
+# Tuplas de nomes por combinação de IDs de gênero, compartilhadas entre os
+# itens (as mesmas combinações se repetem muito nas listas)
+_GENRE_TUPLES: Dict[str, Dict[Tuple[int, ...], Tuple[str, ...]]] = {'movie': {}, 'tv': {}}
+GENRE_TUPLES_LIMIT = 4096
+
+def normalize_tmdb_results(results: List[Dict], media_type: str, image_base_url: str,
+                           limit: Optional[int] = None) -> List[CatalogRecord]:
+    """Converter uma lista de resultados do TMDb em registros, em uma passada"""
+    if media_type == 'movie':
+        genre_map, title_key, date_key = MOVIE_GENRE_NAMES, 'title', 'release_date'
+    else:
+        genre_map, title_key, date_key = TV_GENRE_NAMES, 'name', 'first_air_date'
+    genre_tuples = _GENRE_TUPLES[media_type]
+    
+    records = []
+    append = records.append
+    for item in results[:limit]:
+        genre_ids = tuple(item.get('genre_ids') or ())
+        genres = genre_tuples.get(genre_ids)
+        if genres is None:
+            genres = tuple(genre_map[genre_id] for genre_id in genre_ids if genre_id in genre_map)
+            if len(genre_tuples) < GENRE_TUPLES_LIMIT:
+                genre_tuples[genre_ids] = genres
+        
+        poster_path = item.get('poster_path')
+        append(CatalogRecord(
+            item['id'],
+            media_type,
+            item[title_key],
+            item.get('overview', ''),
+            item.get(date_key, ''),
+            image_base_url + poster_path if poster_path else None,
+            round(item.get('vote_average', 0), 1),
+            genres
+        ))
+    
+    return records
 
 class TMDbService:
     def __init__(self):
@@ -8,30 +84,116 @@ class TMDbService:
         self.base_url = 'https://api.themoviedb.org/3'
         self.image_base_url = 'https://image.tmdb.org/t/p/w500'
         
+        # Sessão keep-alive com pool de conexões, criada após o fork do gunicorn
+        self.http = SessionHolder()
+        
+        # Funções chamadas com cada lista de resultados normalizados
+        self.result_listeners = []
+        self._request_state = threading.local()
+        
     def _make_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
         """Fazer requisição para a API do TMDb"""
+        self._request_state.mock = False
+        
         if not self.api_key:
             # Retornar dados mock se não houver API key
             return self._get_mock_data(endpoint)
         
+        cached = response_cache.get('tmdb', endpoint, params)
+        if cached is not None:
+            return cached
+        
+        breaker = get_breaker('tmdb', endpoint.split('/')[0])
+        if not breaker.allow():
+            # Circuito aberto: resposta antiga do cache ou vazia, sem esperar
+            return response_cache.get_stale('tmdb', endpoint, params)
+        
         try:
-            url = f"{self.base_url}/{endpoint}"
-            default_params = {'api_key': self.api_key, 'language': 'pt-BR'}
+            tmdb_limiter.acquire()
+        except RateLimitExceeded as e:
+            # Sem token a tempo: resposta vazia em vez de dados mock
+            print(f"Requisição TMDb descartada: {e}")
+            return None
+        
+        started = time.time()
+        try:
+            read_timeout = breaker.read_timeout(self.http.timeout[1])
+            data = self.http.call(lambda: self._fetch(endpoint, params, read_timeout), tmdb_limiter.acquire)
+            breaker.record_success(time.time() - started)
+            return data
             
-            if params:
-                default_params.update(params)
+        except Exception as e:
+            print(f"Erro na requisição TMDb: {e}")
             
-            response = requests.get(url, params=default_params, timeout=10)
-            response.raise_for_status()
+            if is_provider_failure(e):
+                breaker.record_failure(
+                    time.time() - started,
+                    probe=lambda: self._probe(endpoint, params)
+                )
             
-            return response.json()
+            stale = response_cache.get_stale('tmdb', endpoint, params)
+            if stale is not None:
+                return stale
+            
+            # 429 mesmo após as novas tentativas: não mascarar com dados mock
+            if getattr(getattr(e, 'response', None), 'status_code', None) == 429:
+                return None
             
-        except Exception as e:
-            print(f"Erro na requisição TMDb: {e}")
             return self._get_mock_data(endpoint)
     
+    def _fetch(self, endpoint: str, params: Optional[Dict], read_timeout: float) -> Dict:
+        """Chamar a API e guardar a resposta no cache (erros são propagados)"""
+        url = f"{self.base_url}/{endpoint}"
+        default_params = {'api_key': self.api_key, 'language': 'pt-BR'}
+        
+        if params:
+            default_params.update(params)
+        
+        response = self.http.get().get(url, params=default_params, timeout=(self.http.timeout[0], read_timeout))
+        response.raise_for_status()
+        
+        data = response.json()
+        response_cache.set('tmdb', endpoint, data, self._cache_ttl(endpoint), params=params)
+        
+        return data
+    
+    def _probe(self, endpoint: str, params: Optional[Dict]) -> None:
+        """Sondagem do circuito: consome um token do rate limiter como as demais chamadas"""
+        try:
+            tmdb_limiter.acquire()
+        except RateLimitExceeded as e:
+            raise ProbeSkipped(str(e)) from e
+        self._fetch(endpoint, params, self.http.timeout[1])
+    
+    def add_result_listener(self, listener) -> None:
+        """Registrar uma função que recebe os resultados normalizados"""
+        self.result_listeners.append(listener)
+    
+    def _publish(self, items: List[Dict]) -> None:
+        if getattr(self._request_state, 'mock', False):
+            return
+        for listener in self.result_listeners:
+            try:
+                listener(items)
+            except Exception as e:
+                print(f"Erro ao repassar resultados: {e}")
+    
+    def _cache_ttl(self, endpoint: str) -> int:
+        """TTL do cache para o endpoint"""
+        for prefix, ttl in CACHE_TTLS.items():
+            if endpoint.startswith(prefix):
+                return ttl
+        return DEFAULT_CACHE_TTL
+    
+    def invalidate_cache(self, endpoint_prefix: str = None) -> int:
+        """Invalidar respostas do TMDb em cache (todas ou por prefixo)"""
+        return response_cache.invalidate('tmdb', endpoint_prefix)
+    
     def _get_mock_data(self, endpoint: str) -> Dict:
         """Retornar dados mock quando API não está disponível"""
+        # Dados mock nunca são repassados aos listeners (ex.: catálogo local)
+        self._request_state.mock = True
+        
         if 'search/movie' in endpoint:
             return {
                 'results': [
@@ -72,106 +234,62 @@ class TMDbService:
         else:
             return {'results': []}
     
-    def search_movies(self, query: str) -> List[Dict]:
+    @coalesce
+    def search_movies(self, query: str) -> List[CatalogRecord]:
         """Buscar filmes"""
         data = self._make_request('search/movie', {'query': query})
         
         if not data or 'results' not in data:
             return []
         
-        movies = []
-        for movie in data['results'][:10]:  # Limitar a 10 resultados
-            movies.append({
-                'id': movie['id'],
-                'type': 'movie',
-                'title': movie['title'],
-                'overview': movie.get('overview', ''),
-                'release_date': movie.get('release_date', ''),
-                'poster_url': f"{self.image_base_url}{movie['poster_path']}" if movie.get('poster_path') else None,
-                'rating': round(movie.get('vote_average', 0), 1),
-                'genres': self._get_genre_names(movie.get('genre_ids', []), 'movie')
-            })
+        movies = normalize_tmdb_results(data['results'], 'movie', self.image_base_url, limit=10)  # Limitar a 10 resultados
         
+        self._publish(movies)
         return movies
     
-    def search_tv_shows(self, query: str) -> List[Dict]:
+    @coalesce
+    def search_tv_shows(self, query: str) -> List[CatalogRecord]:
         """Buscar séries de TV"""
         data = self._make_request('search/tv', {'query': query})
         
         if not data or 'results' not in data:
             return []
         
-        tv_shows = []
-        for show in data['results'][:10]:  # Limitar a 10 resultados
-            tv_shows.append({
-                'id': show['id'],
-                'type': 'tv',
-                'title': show['name'],
-                'overview': show.get('overview', ''),
-                'release_date': show.get('first_air_date', ''),
-                'poster_url': f"{self.image_base_url}{show['poster_path']}" if show.get('poster_path') else None,
-                'rating': round(show.get('vote_average', 0), 1),
-                'genres': self._get_genre_names(show.get('genre_ids', []), 'tv')
-            })
+        tv_shows = normalize_tmdb_results(data['results'], 'tv', self.image_base_url, limit=10)  # Limitar a 10 resultados
         
+        self._publish(tv_shows)
         return tv_shows
     
-    def get_popular_movies(self) -> List[Dict]:
+    @coalesce
+    def get_popular_movies(self) -> List[CatalogRecord]:
         """Buscar filmes populares"""
         data = self._make_request('movie/popular')
         
         if not data or 'results' not in data:
             return []
         
-        movies = []
-        for movie in data['results'][:20]:
-            movies.append({
-                'id': movie['id'],
-                'type': 'movie',
-                'title': movie['title'],
-                'overview': movie.get('overview', ''),
-                'release_date': movie.get('release_date', ''),
-                'poster_url': f"{self.image_base_url}{movie['poster_path']}" if movie.get('poster_path') else None,
-                'rating': round(movie.get('vote_average', 0), 1),
-                'genres': self._get_genre_names(movie.get('genre_ids', []), 'movie')
-            })
+        movies = normalize_tmdb_results(data['results'], 'movie', self.image_base_url, limit=20)
         
+        self._publish(movies)
         return movies
     
-    def get_popular_tv_shows(self) -> List[Dict]:
+    @coalesce
+    def get_popular_tv_shows(self) -> List[CatalogRecord]:
         """Buscar séries populares"""
         data = self._make_request('tv/popular')
         
         if not data or 'results' not in data:
             return []
         
-        tv_shows = []
-        for show in data['results'][:20]:
-            tv_shows.append({
-                'id': show['id'],
-                'type': 'tv',
-                'title': show['name'],
-                'overview': show.get('overview', ''),
-                'release_date': show.get('first_air_date', ''),
-                'poster_url': f"{self.image_base_url}{show['poster_path']}" if show.get('poster_path') else None,
-                'rating': round(show.get('vote_average', 0), 1),
-                'genres': self._get_genre_names(show.get('genre_ids', []), 'tv')
-            })
+        tv_shows = normalize_tmdb_results(data['results'], 'tv', self.image_base_url, limit=20)
         
+        self._publish(tv_shows)
         return tv_shows
     
-    def get_movies_by_genre(self, genre_name: str) -> List[Dict]:
+    @coalesce
+    def get_movies_by_genre(self, genre_name: str) -> List[CatalogRecord]:
         """Buscar filmes por gênero"""
-        # Mapear nome do gênero para ID
-        genre_map = {
-            'Action': 28, 'Adventure': 12, 'Animation': 16, 'Comedy': 35,
-            'Crime': 80, 'Documentary': 99, 'Drama': 18, 'Family': 10751,
-            'Fantasy': 14, 'History': 36, 'Horror': 27, 'Music': 10402,
-            'Mystery': 9648, 'Romance': 10749, 'Science Fiction': 878,
-            'TV Movie': 10770, 'Thriller': 53, 'War': 10752, 'Western': 37
-        }
-        
-        genre_id = genre_map.get(genre_name)
+        genre_id = MOVIE_GENRE_IDS.get(genre_name)
         if not genre_id:
             return []
         
@@ -180,33 +298,15 @@ class TMDbService:
         if not data or 'results' not in data:
             return []
         
-        movies = []
-        for movie in data['results'][:10]:
-            movies.append({
-                'id': movie['id'],
-                'type': 'movie',
-                'title': movie['title'],
-                'overview': movie.get('overview', ''),
-                'release_date': movie.get('release_date', ''),
-                'poster_url': f"{self.image_base_url}{movie['poster_path']}" if movie.get('poster_path') else None,
-                'rating': round(movie.get('vote_average', 0), 1),
-                'genres': self._get_genre_names(movie.get('genre_ids', []), 'movie')
-            })
+        movies = normalize_tmdb_results(data['results'], 'movie', self.image_base_url, limit=10)
         
+        self._publish(movies)
         return movies
     
-    def get_tv_shows_by_genre(self, genre_name: str) -> List[Dict]:
+    @coalesce
+    def get_tv_shows_by_genre(self, genre_name: str) -> List[CatalogRecord]:
         """Buscar séries por gênero"""
-        # Mapear nome do gênero para ID
-        genre_map = {
-            'Action & Adventure': 10759, 'Animation': 16, 'Comedy': 35,
-            'Crime': 80, 'Documentary': 99, 'Drama': 18, 'Family': 10751,
-            'Kids': 10762, 'Mystery': 9648, 'News': 10763, 'Reality': 10764,
-            'Sci-Fi & Fantasy': 10765, 'Soap': 10766, 'Talk': 10767,
-            'War & Politics': 10768, 'Western': 37
-        }
-        
-        genre_id = genre_map.get(genre_name)
+        genre_id = TV_GENRE_IDS.get(genre_name)
         if not genre_id:
             return []
         
@@ -215,40 +315,7 @@ class TMDbService:
         if not data or 'results' not in data:
             return []
         
-        tv_shows = []
-        for show in data['results'][:10]:
-            tv_shows.append({
-                'id': show['id'],
-                'type': 'tv',
-                'title': show['name'],
-                'overview': show.get('overview', ''),
-                'release_date': show.get('first_air_date', ''),
-                'poster_url': f"{self.image_base_url}{show['poster_path']}" if show.get('poster_path') else None,
-                'rating': round(show.get('vote_average', 0), 1),
-                'genres': self._get_genre_names(show.get('genre_ids', []), 'tv')
-            })
+        tv_shows = normalize_tmdb_results(data['results'], 'tv', self.image_base_url, limit=10)
         
+        self._publish(tv_shows)
         return tv_shows
-    
-    def _get_genre_names(self, genre_ids: List[int], media_type: str) -> List[str]:
-        """Converter IDs de gênero para nomes"""
-        movie_genres = {
-            28: 'Action', 12: 'Adventure', 16: 'Animation', 35: 'Comedy',
-            80: 'Crime', 99: 'Documentary', 18: 'Drama', 10751: 'Family',
-            14: 'Fantasy', 36: 'History', 27: 'Horror', 10402: 'Music',
-            9648: 'Mystery', 10749: 'Romance', 878: 'Science Fiction',
-            10770: 'TV Movie', 53: 'Thriller', 10752: 'War', 37: 'Western'
-        }
-        
-        tv_genres = {
-            10759: 'Action & Adventure', 16: 'Animation', 35: 'Comedy',
-            80: 'Crime', 99: 'Documentary', 18: 'Drama', 10751: 'Family',
-            10762: 'Kids', 9648: 'Mystery', 10763: 'News', 10764: 'Reality',
-            10765: 'Sci-Fi & Fantasy', 10766: 'Soap', 10767: 'Talk',
-            10768: 'War & Politics', 37: 'Western'
-        }
-        
-        genre_map = movie_genres if media_type == 'movie' else tv_genres
-        
-        return [genre_map.get(genre_id, 'Unknown') for genre_id in genre_ids if genre_id in genre_map]
-
@@ -0,0 +1,143 @@
+from datetime import datetime
+from typing import Dict, Iterable
+
+import click
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from src.extensions import db
+from src.models.database import Favorite, ForumPost, Friendship, User, UserCounters
+
+# Coluna de contador de cada tipo de favorito
+FAVORITE_COLUMNS = {
+    'movie': 'favorites_movies',
+    'tv': 'favorites_tv',
+    'game': 'favorites_games'
+}
+
+COUNTER_COLUMNS = ('favorites_movies', 'favorites_tv', 'favorites_games', 'posts', 'friends', 'pending_requests')
+
+# Usuários recontados por consulta na reconciliação
+RECONCILE_BATCH_SIZE = 1000
+
+def favorite_column(content_type: str) -> str:
+    return FAVORITE_COLUMNS[content_type]
+
+def adjust(user_id: int, **deltas: int) -> None:
+    """Somar os deltas aos contadores do usuário, na transação atual.
+
+    O incremento é feito no banco (coluna = coluna + delta), então escritas
+    concorrentes não se sobrescrevem. Sem linha ainda para o usuário, ela é
+    criada com a contagem real (que já inclui a escrita em andamento).
+    """
+    user_id = int(user_id)
+    values = {column: getattr(UserCounters, column) + delta for column, delta in deltas.items() if delta}
+    if not values:
+        return
+    values['updated_at'] = datetime.utcnow()
+
+    if UserCounters.query.filter_by(user_id=user_id).update(values, synchronize_session=False):
+        return
+
+    db.session.flush()
+    try:
+        with db.session.begin_nested():
+            db.session.add(UserCounters(user_id=user_id, **count_users([user_id])[user_id]))
+    except IntegrityError:
+        # Outro worker criou a linha ao mesmo tempo: aplicar o incremento nela
+        UserCounters.query.filter_by(user_id=user_id).update(values, synchronize_session=False)
+
+def get(user_id: int) -> UserCounters:
+    """Contadores do usuário (busca pela chave primária)"""
+    user_id = int(user_id)
+    row = db.session.get(UserCounters, user_id)
+    if row is not None:
+        return row
+
+    # Primeira leitura: contar a partir das tabelas e guardar
+    try:
+        row = UserCounters(user_id=user_id, **count_users([user_id])[user_id])
+        db.session.add(row)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        row = db.session.get(UserCounters, user_id)
+    return row
+
+def count_users(user_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+    """Contagem real (a partir das tabelas de origem) para os usuários dados"""
+    user_ids = list(user_ids)
+    counts = {user_id: dict.fromkeys(COUNTER_COLUMNS, 0) for user_id in user_ids}
+
+    favorites = db.session.query(Favorite.user_id, Favorite.content_type, func.count(Favorite.id)).filter(
+        Favorite.user_id.in_(user_ids)
+    ).group_by(Favorite.user_id, Favorite.content_type)
+    for user_id, content_type, total in favorites:
+        if content_type in FAVORITE_COLUMNS:
+            counts[user_id][FAVORITE_COLUMNS[content_type]] = total
+
+    posts = db.session.query(ForumPost.author_id, func.count(ForumPost.id)).filter(
+        ForumPost.author_id.in_(user_ids),
+        ForumPost.is_active == True
+    ).group_by(ForumPost.author_id)
+    for user_id, total in posts:
+        counts[user_id]['posts'] = total
+
+    # Cada amizade aceita conta para os dois lados
+    for column in (Friendship.requester_id, Friendship.requested_id):
+        friends = db.session.query(column, func.count(Friendship.id)).filter(
+            column.in_(user_ids),
+            Friendship.status == 'accepted'
+        ).group_by(column)
+        for user_id, total in friends:
+            counts[user_id]['friends'] += total
+
+    pending = db.session.query(Friendship.requested_id, func.count(Friendship.id)).filter(
+        Friendship.requested_id.in_(user_ids),
+        Friendship.status == 'pending'
+    ).group_by(Friendship.requested_id)
+    for user_id, total in pending:
+        counts[user_id]['pending_requests'] = total
+
+    return counts
+
+def reconcile() -> Dict[str, int]:
+    """Recontar todos os usuários e corrigir os contadores divergentes"""
+    stats = {'users': 0, 'created': 0, 'repaired': 0}
+    last_id = 0
+
+    while True:
+        user_ids = [user_id for user_id, in db.session.query(User.id).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(RECONCILE_BATCH_SIZE)]
+        if not user_ids:
+            break
+
+        counts = count_users(user_ids)
+        rows = {row.user_id: row for row in UserCounters.query.filter(UserCounters.user_id.in_(user_ids))}
+        now = datetime.utcnow()
+
+        for user_id in user_ids:
+            row = rows.get(user_id)
+            if row is None:
+                db.session.add(UserCounters(user_id=user_id, updated_at=now, **counts[user_id]))
+                stats['created'] += 1
+            elif any(getattr(row, column) != value for column, value in counts[user_id].items()):
+                for column, value in counts[user_id].items():
+                    setattr(row, column, value)
+                row.updated_at = now
+                stats['repaired'] += 1
+
+        db.session.commit()
+        stats['users'] += len(user_ids)
+        last_id = user_ids[-1]
+
+    return stats
+
+@click.command('counters-reconcile')
+def counters_reconcile_command():
+    """Recontar os contadores por usuário e corrigir divergências (ex.: cron diário)"""
+    stats = reconcile()
+    click.echo(
+        f"✅ {stats['users']} usuários verificados: "
+        f"{stats['repaired']} corrigidos, {stats['created']} criados"
+    )